@@ -1,9 +1,20 @@
 """
 Specialized Agent implementations for the 5-step workflow
 """
+import asyncio
+import contextvars
+import json
 import logging
-from typing import Dict, Any, Optional, List
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Callable, Union, Tuple
 from base_agent import BaseAgent
+from config import Config
+from prompt_budget import output_text, extract_section, list_items, trim_to_tokens
+from metrics import collect_calls
+from tracing import span
+from digest import WorkflowDigest
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +33,7 @@ Your role is to:
 
 Always think step by step and ensure clarity before proceeding."""
         
-        super().__init__("Orchestrator", "Master Controller", instructions)
+        super().__init__("Orchestrator", "Master Controller", instructions, settings_key="ORCHESTRATOR")
     
     def initialize_task(self, task_description: str, context: Optional[Dict] = None) -> Dict[str, Any]:
         """
@@ -82,10 +93,10 @@ Your responsibilities:
 
 Be thorough and detailed. Ask clarifying questions if needed."""
         
-        super().__init__("Planning Agent", "Step 1 Specialist", instructions)
+        super().__init__("Planning Agent", "Step 1 Specialist", instructions, settings_key="PLANNING")
     
-    def process(self, task: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """Create a detailed plan for the task"""
+    def _build_prompt(self, task: str, context: Optional[Dict[str, Any]] = None) -> str:
+        """Build the prompt to create a detailed plan for the task"""
         
         prompt = f"""Create a comprehensive plan for this task:
 
@@ -116,12 +127,14 @@ Based on the 5-step workflow, create a detailed plan including:
 
 Format your response in clear markdown with proper headings, sections, lists, and formatting."""
         
-        response = self.call_llm(prompt)
-        
-        return self.format_output({
+        return prompt
+    
+    def _build_result(self, response: str) -> Dict[str, Any]:
+        """Wrap the plan as the Step 1 output"""
+        return {
             "plan": response,
             "step": 1
-        })
+        }
     
     def _format_context(self, context: Optional[Dict]) -> str:
         """Format context for prompt"""
@@ -148,23 +161,10 @@ Your responsibilities:
 
 Be thorough in gathering information and focus on what's relevant to the task."""
         
-        super().__init__("Research Agent", "Step 2 Specialist", instructions)
+        super().__init__("Research Agent", "Step 2 Specialist", instructions, settings_key="RESEARCH")
+        self.prompt_budget = Config.PROMPT_BUDGET_RESEARCH
     
-    def process(self, task: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """Gather and analyze information for the task"""
-        
-        plan = context.get("plan", "No plan provided") if context else "No plan provided"
-        information_needs = context.get("information_needs", "General research needed") if context else "General research needed"
-        
-        prompt = f"""Based on this plan, gather and analyze relevant information:
-
-Plan: {plan}
-
-Information Needs: {information_needs}
-
-Task: {task}
-
-Please provide:
+    REPORT_FORMAT = """Please provide:
 
 1. INFORMATION GATHERED:
    - Key facts and data relevant to the task
@@ -184,13 +184,157 @@ Please provide:
    - Structure your findings to support decision-making in Step 3
 
 Format your response in clear markdown with proper headings, sections, lists, and formatting."""
+    
+    def process(self, task: str, context: Optional[Dict[str, Any]] = None,
+                on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """
+        Research the task, fanning out over the plan's information needs
         
-        response = self.call_llm(prompt)
+        With RESEARCH_FANOUT of 2 or more and at least two listed information
+        needs, each need is researched by its own concurrent call (map) and
+        a final call merges the findings (reduce). Otherwise a single call
+        covers everything.
+        
+        Args:
+            task: The task description
+            context: Context holding the plan
+            on_token: Optional callback receiving the merge call's streamed deltas
+            
+        Returns:
+            Dictionary with results
+        """
+        sub_queries = self._split_information_needs(context)
+        if not sub_queries:
+            return super().process(task, context, on_token)
+        
+        with span(f"{self.name}.process", "agent", agent=self.name, sub_queries=len(sub_queries)), collect_calls() as calls:
+            prompts = [self._build_sub_query_prompt(task, context, need) for need in sub_queries]
+            with ThreadPoolExecutor(max_workers=min(Config.RESEARCH_FANOUT, len(prompts))) as executor:
+                # Each call runs in a copy of this context so its metrics (and spans) reach the collectors
+                futures = [executor.submit(contextvars.copy_context().run, self.call_llm, prompt) for prompt in prompts]
+                findings = [future.result() for future in futures]
+            response = self._complete(self._build_merge_prompt(task, context, sub_queries, findings), on_token)
+            output = self.format_output(self._build_result(response))
+        return self._annotate_output(output, calls)
+    
+    async def aprocess(self, task: str, context: Optional[Dict[str, Any]] = None,
+                       on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """Async variant of process"""
+        sub_queries = self._split_information_needs(context)
+        if not sub_queries:
+            return await super().aprocess(task, context, on_token)
+        
+        semaphore = asyncio.Semaphore(Config.RESEARCH_FANOUT)
+        
+        async def research(need: str) -> str:
+            async with semaphore:
+                return await self.acall_llm(self._build_sub_query_prompt(task, context, need))
+        
+        with span(f"{self.name}.process", "agent", agent=self.name, sub_queries=len(sub_queries)), collect_calls() as calls:
+            findings = await asyncio.gather(*(research(need) for need in sub_queries))
+            response = await self._acomplete(self._build_merge_prompt(task, context, sub_queries, findings), on_token)
+            output = self.format_output(self._build_result(response))
+        return self._annotate_output(output, calls)
+    
+    def _build_prompt(self, task: str, context: Optional[Dict[str, Any]] = None) -> str:
+        """Build the prompt to gather and analyze information for the task"""
         
-        return self.format_output({
+        plan, information_needs = self._research_inputs(context)
+        template = """Based on this plan, gather and analyze relevant information:
+
+Plan: {plan}
+
+Information Needs: {information_needs}
+
+Task: {task}
+
+""" + self.REPORT_FORMAT
+        
+        return self._fit_prompt(template, {"plan": plan, "information_needs": information_needs}, task=task)
+    
+    def _build_sub_query_prompt(self, task: str, context: Optional[Dict[str, Any]], need: str) -> str:
+        """Build the map prompt researching a single information need"""
+        plan, _ = self._research_inputs(context)
+        objectives, _ = trim_to_tokens(extract_section(plan, "OBJECTIVES") or plan, Config.RESEARCH_SUB_QUERY_PLAN_TOKENS)
+        
+        return f"""Research this one information need for the task below. Be concise and factual; your findings will be merged with research on the task's other information needs.
+
+Task: {task}
+
+Objectives: {objectives}
+
+Information Need: {need}
+
+Provide:
+- Key facts and data that answer the need
+- Insights, dependencies and potential issues
+- What is still unknown
+
+Format your response in concise markdown."""
+    
+    def _build_merge_prompt(self, task: str, context: Optional[Dict[str, Any]],
+                            sub_queries: List[str], findings: List[str]) -> str:
+        """Build the reduce prompt combining per-need findings into one research report"""
+        plan, _ = self._research_inputs(context)
+        blocks = "\n\n".join(
+            f"### Information Need {index + 1}: {{need_{index}}}\n{{finding_{index}}}" for index in range(len(findings))
+        )
+        template = """Merge these research findings, gathered separately for each information need, into one analysis:
+
+Task: {task}
+
+Plan: {plan}
+
+Findings:
+
+""" + blocks + """
+
+""" + self.REPORT_FORMAT
+        
+        sections = {"plan": plan}
+        sections.update({f"finding_{index}": finding for index, finding in enumerate(findings)})
+        needs = {f"need_{index}": need for index, need in enumerate(sub_queries)}
+        return self._fit_prompt(template, sections, task=task, **needs)
+    
+    def _research_inputs(self, context: Optional[Dict[str, Any]]) -> Tuple[str, str]:
+        """Get the plan focus (goals) and the information needs from the context"""
+        context = context or {}
+        plan = output_text(context.get("plan"), "plan")
+        
+        # The information needs get their own field, so with prompt budgets the plan only contributes its goals
+        information_needs = (
+            context.get("information_needs") or extract_section(plan, "INFORMATION NEEDS") or "General research needed"
+        )
+        if Config.PROMPT_BUDGET_ENABLED:
+            plan = extract_section(plan, "OBJECTIVES", "REQUIREMENTS", "SUB-TASKS") or plan
+        plan = plan or "No plan provided"
+        return plan, str(information_needs)
+    
+    def _split_information_needs(self, context: Optional[Dict[str, Any]]) -> List[str]:
+        """
+        Split the information needs into independent sub-queries for fan-out
+        
+        Returns:
+            At most RESEARCH_MAX_SUBQUERIES sub-queries (neighbouring needs are
+            grouped when there are more), or [] when fan-out is off or there
+            are fewer than two needs
+        """
+        if Config.RESEARCH_FANOUT < 2:
+            return []
+        
+        needs = list_items(self._research_inputs(context)[1])
+        if len(needs) < 2:
+            return []
+        
+        group_size = math.ceil(len(needs) / max(1, Config.RESEARCH_MAX_SUBQUERIES))
+        return ["; ".join(needs[start:start + group_size]) for start in range(0, len(needs), group_size)]
+    
+    def _build_result(self, response: str) -> Dict[str, Any]:
+        """Wrap the findings as the Step 2 output"""
+        return {
             "research": response,
             "step": 2
-        })
+        }
 
 
 class ExecutionAgent(BaseAgent):
@@ -207,15 +351,17 @@ Your responsibilities:
 
 Be thorough and ensure deliverables meet the plan's objectives."""
         
-        super().__init__("Execution Agent", "Step 3 Specialist", instructions)
+        super().__init__("Execution Agent", "Step 3 Specialist", instructions, settings_key="EXECUTION")
+        self.prompt_budget = Config.PROMPT_BUDGET_EXECUTION
     
-    def process(self, task: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """Execute the task and create deliverables"""
+    def _build_prompt(self, task: str, context: Optional[Dict[str, Any]] = None) -> str:
+        """Build the prompt to execute the task and create deliverables"""
         
-        plan = context.get("plan", "No plan provided") if context else "No plan provided"
-        research = context.get("research", "No research provided") if context else "No research provided"
+        context = context or {}
+        plan = output_text(context.get("plan"), "plan") or "No plan provided"
+        research = output_text(context.get("research"), "research") or "No research provided"
         
-        prompt = f"""Execute this task based on the plan and research:
+        template = """Execute this task based on the plan and research:
 
 Task: {task}
 
@@ -246,12 +392,14 @@ Please execute the task by:
 
 Provide your deliverables and documentation in clear markdown format with proper headings, sections, and formatting. If creating actual documents, present them in full with proper markdown structure."""
         
-        response = self.call_llm(prompt)
-        
-        return self.format_output({
+        return self._fit_prompt(template, {"plan": plan, "research": research}, task=task)
+    
+    def _build_result(self, response: str) -> Dict[str, Any]:
+        """Wrap the deliverables as the Step 3 output"""
+        return {
             "deliverables": response,
             "step": 3
-        })
+        }
 
 
 class QualityAssuranceAgent(BaseAgent):
@@ -268,20 +416,34 @@ Your responsibilities:
 
 Be thorough and objective in your review. Identify specific issues with clear descriptions."""
         
-        super().__init__("Quality Assurance Agent", "Step 4 Specialist", instructions)
+        super().__init__("Quality Assurance Agent", "Step 4 Specialist", instructions, settings_key="QA")
+        self.prompt_budget = Config.PROMPT_BUDGET_QA
+    
+    # Issue severities from most to least serious
+    SEVERITIES = ("critical", "major", "minor")
     
-    def process(self, task: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """Review and validate the deliverables"""
+    _VERDICT_BLOCK = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
+    
+    def _build_prompt(self, task: str, context: Optional[Dict[str, Any]] = None) -> str:
+        """Build the prompt to review and validate the deliverables"""
+        
+        context = context or {}
+        plan = output_text(context.get("plan"), "plan")
+        deliverables = (
+            output_text(context.get("deliverables"), "deliverables", "refined_deliverables") or "No deliverables provided"
+        )
         
-        plan = context.get("plan", "No plan provided") if context else "No plan provided"
-        deliverables = context.get("deliverables", "No deliverables provided") if context else "No deliverables provided"
-        success_criteria = context.get("success_criteria", "Check against plan objectives") if context else "Check against plan objectives"
+        # With prompt budgets the review only gets the plan's goals and checklist, not the whole plan
+        success_criteria = (
+            context.get("success_criteria") or extract_section(plan, "SUCCESS CRITERIA") or "Check against plan objectives"
+        )
+        objectives = (extract_section(plan, "OBJECTIVES") if Config.PROMPT_BUDGET_ENABLED else "") or plan or "No plan provided"
         
-        prompt = f"""Review and validate these deliverables against the plan:
+        template = """Review and validate these deliverables against the plan:
 
 Task: {task}
 
-Original Plan: {plan}
+Plan Objectives: {objectives}
 
 Success Criteria: {success_criteria}
 
@@ -308,14 +470,64 @@ Please provide:
    - What works well?
    - Is this ready for use or does it need refinement?
 
-Format your response in clear markdown with proper headings, sections, lists, and formatting."""
+Format your response in clear markdown with proper headings, sections, lists, and formatting.
+
+Finally, end your response with a machine-readable verdict in a fenced json block, counting every issue you listed under ISSUES IDENTIFIED by its priority:
+
+```json
+{{"ready": true, "issues": {{"critical": 0, "major": 0, "minor": 0}}}}
+```"""
         
-        response = self.call_llm(prompt)
+        sections = {
+            "objectives": objectives,
+            "success_criteria": str(success_criteria),
+            "deliverables": deliverables
+        }
+        return self._fit_prompt(template, sections, task=task)
+    
+    def _build_result(self, response: str) -> Dict[str, Any]:
+        """Wrap the review report and its parsed verdict as the Step 4 output"""
+        review, verdict = self.parse_verdict(response)
+        return {
+            "review": review,
+            "step": 4,
+            "verdict": verdict
+        }
+    
+    @classmethod
+    def parse_verdict(cls, response: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Split the machine-readable verdict off a review
         
-        return self.format_output({
-            "review": response,
-            "step": 4
-        })
+        Args:
+            response: Review text, ideally ending in a ```json verdict block
+            
+        Returns:
+            Tuple of (review text without the verdict block, verdict with
+            "ready" and per-severity "issues" counts), the verdict being None
+            when the model did not produce a usable one
+        """
+        matches = list(cls._VERDICT_BLOCK.finditer(response))
+        for match in reversed(matches):
+            try:
+                data = json.loads(match.group(1))
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(data, dict) or not isinstance(data.get("issues"), dict):
+                continue
+            
+            issues = {}
+            for severity in cls.SEVERITIES:
+                try:
+                    issues[severity] = max(0, int(data["issues"].get(severity, 0)))
+                except (TypeError, ValueError):
+                    issues[severity] = 0
+            verdict = {"ready": data.get("ready") if isinstance(data.get("ready"), bool) else None, "issues": issues}
+            review = (response[:match.start()] + response[match.end():]).strip()
+            return review, verdict
+        
+        logger.warning("QA review did not include a parseable verdict")
+        return response, None
 
 
 class RefinementAgent(BaseAgent):
@@ -332,16 +544,25 @@ Your responsibilities:
 
 Be thorough in addressing all feedback and ensuring high quality."""
         
-        super().__init__("Refinement Agent", "Step 5 Specialist", instructions)
+        super().__init__("Refinement Agent", "Step 5 Specialist", instructions, settings_key="REFINEMENT")
+        self.prompt_budget = Config.PROMPT_BUDGET_REFINEMENT
     
-    def process(self, task: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """Refine the deliverables based on review feedback"""
+    def _build_prompt(self, task: str, context: Optional[Dict[str, Any]] = None) -> str:
+        """Build the prompt to refine the deliverables based on review feedback"""
+        
+        context = context or {}
+        deliverables = (
+            output_text(context.get("deliverables"), "deliverables", "refined_deliverables") or "No deliverables provided"
+        )
+        review = output_text(context.get("review"), "review")
         
-        deliverables = context.get("deliverables", "No deliverables provided") if context else "No deliverables provided"
-        review = context.get("review", "No review provided") if context else "No review provided"
-        issues = context.get("issues", "No specific issues identified") if context else "No specific issues identified"
+        # Issues are passed on their own, so with prompt budgets the review contributes only its verdict
+        issues = context.get("issues") or extract_section(review, "ISSUES") or "No specific issues identified"
+        if Config.PROMPT_BUDGET_ENABLED:
+            review = extract_section(review, "VALIDATION", "OVERALL ASSESSMENT") or review
+        review = review or "No review provided"
         
-        prompt = f"""Refine these deliverables based on the review:
+        template = """Refine these deliverables based on the review:
 
 Task: {task}
 
@@ -373,13 +594,15 @@ Please:
 
 IMPORTANT: Format your response as a complete, readable markdown document with proper headings, sections, and formatting. If the task was to create a document, provide the FULL FINAL DOCUMENT in markdown format at the top, followed by any additional notes or refinements. The final document should be ready for sharing and use."""
         
-        response = self.call_llm(prompt)
-        
-        return self.format_output({
+        return self._fit_prompt(template, {"deliverables": deliverables, "review": review, "issues": str(issues)}, task=task)
+    
+    def _build_result(self, response: str) -> Dict[str, Any]:
+        """Wrap the refined deliverables as the Step 5 output"""
+        return {
             "refined_deliverables": response,
             "step": 5,
             "status": "complete"
-        })
+        }
 
 
 class CommunicationAgent(BaseAgent):
@@ -395,7 +618,7 @@ Your responsibilities:
 
 Focus on clarity and professional presentation."""
         
-        super().__init__("Communication Agent", "Documentation Specialist", instructions)
+        super().__init__("Communication Agent", "Documentation Specialist", instructions, settings_key="COMMUNICATION")
     
     def format_for_presentation(self, content: Any, format_type: str = "summary") -> str:
         """Format content for presentation"""
@@ -407,11 +630,40 @@ Make it clear, professional, and easy to understand."""
         
         return self.call_llm(prompt)
     
-    def create_summary(self, workflow_results: Dict[str, Any]) -> str:
-        """Create a summary of workflow results"""
-        prompt = f"""Create a comprehensive summary of this workflow execution:
+    def create_summary(self, workflow_results: Union[WorkflowDigest, Dict[str, Any]],
+                       on_token: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Create a summary of workflow results
+        
+        Args:
+            workflow_results: A WorkflowDigest, or a workflow_context dict
+                which is condensed into one first
+            on_token: Optional callback receiving streamed content deltas
+            
+        Returns:
+            Summary text
+        """
+        with span(f"{self.name}.create_summary", "agent", agent=self.name):
+            with span("build_prompt", "prompt"):
+                prompt = self._build_summary_prompt(workflow_results)
+            return self._complete(prompt, on_token)
+    
+    async def acreate_summary(self, workflow_results: Union[WorkflowDigest, Dict[str, Any]],
+                              on_token: Optional[Callable[[str], None]] = None) -> str:
+        """Async variant of create_summary"""
+        with span(f"{self.name}.create_summary", "agent", agent=self.name):
+            with span("build_prompt", "prompt"):
+                prompt = self._build_summary_prompt(workflow_results)
+            return await self._acomplete(prompt, on_token)
+    
+    def _build_summary_prompt(self, workflow_results: Union[WorkflowDigest, Dict[str, Any]]) -> str:
+        """Build the summary prompt from a compact digest of the workflow results"""
+        if not isinstance(workflow_results, WorkflowDigest):
+            workflow_results = WorkflowDigest.from_context(workflow_results)
+        
+        return f"""Create a comprehensive summary of this workflow execution:
 
-{workflow_results}
+{workflow_results.render()}
 
 Include:
 - Task overview
@@ -420,5 +672,3 @@ Include:
 - Outcomes and results
 
 Make it concise but informative."""
-        
-        return self.call_llm(prompt)
@@ -3,12 +3,18 @@ Flask web application for AI Agent Workflow System
 """
 import os
 import json
+import queue
 import logging
-from flask import Flask, render_template, request, jsonify, stream_with_context, Response
+from flask import Flask, render_template, request, jsonify, stream_with_context, Response, send_from_directory
 from flask_cors import CORS
 from dotenv import load_dotenv
 from config import Config
 from workflow import WorkflowOrchestrator
+from llm_cache import get_llm_cache
+from rate_limiter import get_rate_limiter
+from job_queue import JobQueue, QueueFullError
+from result_format import format_results
+from task_index import get_task_index
 
 # Load environment variables
 load_dotenv()
@@ -26,6 +32,48 @@ try:
 except ValueError as e:
     logger.warning(f"Configuration warning: {str(e)}")
 
+# Background executor for /api/jobs; workflows never run on request threads
+job_queue = JobQueue(Config.JOB_WORKERS, Config.JOB_QUEUE_SIZE, retention=Config.JOB_RETENTION)
+
+# Largest number of matches /api/similar returns
+MAX_SIMILAR_LIMIT = 50
+
+
+def requested_format() -> str:
+    """Result format asked for with ?format= ("compact" or "full"), else API_RESULT_FORMAT"""
+    return (request.args.get('format') or Config.API_RESULT_FORMAT).strip().lower()
+
+
+def invalid_format_response(result_format: str):
+    """400 response for an unknown result format, or None if the format is valid"""
+    if result_format in ('compact', 'full'):
+        return None
+    return jsonify({
+        'success': False,
+        'error': f"Unknown result format: {result_format} (expected 'compact' or 'full')"
+    }), 400
+
+
+def run_workflow_job(task: str, context: dict, reuse: str = None, result_format: str = None) -> dict:
+    """Execute one workflow on a job queue worker"""
+    orchestrator = WorkflowOrchestrator()
+    return format_results(orchestrator.execute_workflow(task, context, reuse=reuse), result_format)
+
+
+def run_streamed_job(orchestrator: WorkflowOrchestrator, task: str, context: dict, reuse: str,
+                     events: "queue.Queue", result_format: str = None) -> dict:
+    """Execute one workflow on a job queue worker, putting its progress events on a queue"""
+    try:
+        results = format_results(orchestrator.execute_workflow(
+            task, context, on_event=lambda event, payload: events.put((event, payload)), reuse=reuse
+        ), result_format)
+    except Exception as e:
+        logger.error(f"Error executing streamed workflow: {str(e)}", exc_info=True)
+        events.put(('error', {'success': False, 'error': str(e)}))
+        raise
+    events.put(('complete', {'success': True, 'results': results}))
+    return results
+
 
 @app.route('/')
 def index():
@@ -35,10 +83,18 @@ def index():
 
 @app.route('/api/execute', methods=['POST'])
 def execute_workflow():
-    """Execute workflow via API"""
+    """
+    Execute workflow via API and wait for the results
+    
+    The workflow runs on the background job queue, not on the request thread,
+    so it counts against the same admission limit as /api/jobs (429 with
+    Retry-After when the queue is full) while the request waits for it.
+    Results come in API_RESULT_FORMAT (full by default); pass
+    ``?format=compact`` for the compact format.
+    """
     try:
-        data = request.json
-        task = data.get('task', '').strip()
+        data = request.get_json(silent=True) or {}
+        task = (data.get('task') or '').strip()
         context = data.get('context', {})
         
         if not task:
@@ -56,13 +112,33 @@ def execute_workflow():
                 'error': str(e)
             }), 400
         
-        # Initialize orchestrator and execute workflow
-        orchestrator = WorkflowOrchestrator()
-        results = orchestrator.execute_workflow(task, context)
+        result_format = requested_format()
+        invalid = invalid_format_response(result_format)
+        if invalid:
+            return invalid
+        
+        try:
+            job = job_queue.submit(run_workflow_job, task, context, data.get('reuse'), result_format)
+        except QueueFullError as e:
+            response = jsonify({
+                'success': False,
+                'error': str(e),
+                'retry_after': e.retry_after
+            })
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 429
+        
+        job = job_queue.wait(job['job_id'])
+        if job is None or job['status'] != 'completed':
+            error = job['error'] if job else 'Job expired before completing'
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 500
         
         return jsonify({
             'success': True,
-            'results': results
+            'results': job['result']
         })
     
     except Exception as e:
@@ -73,11 +149,225 @@ def execute_workflow():
         }), 500
 
 
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """Queue a workflow for background execution; poll GET /api/jobs/<id> for the result"""
+    data = request.get_json(silent=True) or {}
+    task = (data.get('task') or '').strip()
+    context = data.get('context', {})
+    
+    if not task:
+        return jsonify({
+            'success': False,
+            'error': 'Task is required'
+        }), 400
+    
+    try:
+        Config.validate()
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    result_format = requested_format()
+    invalid = invalid_format_response(result_format)
+    if invalid:
+        return invalid
+    
+    try:
+        job = job_queue.submit(run_workflow_job, task, context, data.get('reuse'), result_format)
+    except QueueFullError as e:
+        response = jsonify({
+            'success': False,
+            'error': str(e),
+            'retry_after': e.retry_after
+        })
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
+    
+    response = jsonify({
+        'success': True,
+        'job': job,
+        'status_url': f"/api/jobs/{job['job_id']}"
+    })
+    response.headers['Location'] = f"/api/jobs/{job['job_id']}"
+    return response, 202
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get the status of a queued job, including its results once completed"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'job': job
+    })
+
+
+@app.route('/api/jobs', methods=['GET'])
+def get_job_queue_stats():
+    """Get job queue depth and wait times"""
+    return jsonify({
+        'success': True,
+        'queue': job_queue.stats()
+    })
+
+
+@app.route('/api/execute/stream', methods=['GET', 'POST'])
+def execute_workflow_stream():
+    """
+    Execute workflow and stream progress as Server-Sent Events
+    
+    Emits a queued event with the job ID, then step_start, token and
+    step_complete events while the workflow runs, then a final complete
+    event carrying the full results. Accepts a JSON body (POST) or a
+    ``task`` query parameter (GET, for EventSource).
+    
+    The workflow runs on the job queue, so streams count against the same
+    admission limit as /api/jobs (429 with Retry-After when full). When the
+    client disconnects, the workflow is cancelled. ``?format=`` selects the
+    result format as for /api/execute.
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+    else:
+        data = {'task': request.args.get('task', '')}
+    task = (data.get('task') or '').strip()
+    context = data.get('context', {})
+    
+    if not task:
+        return jsonify({
+            'success': False,
+            'error': 'Task is required'
+        }), 400
+    
+    try:
+        Config.validate()
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    result_format = requested_format()
+    invalid = invalid_format_response(result_format)
+    if invalid:
+        return invalid
+    
+    events: "queue.Queue" = queue.Queue()
+    orchestrator = WorkflowOrchestrator()
+    try:
+        job = job_queue.submit(run_streamed_job, orchestrator, task, context, data.get('reuse'), events, result_format)
+    except QueueFullError as e:
+        response = jsonify({
+            'success': False,
+            'error': str(e),
+            'retry_after': e.retry_after
+        })
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
+    
+    def generate():
+        finished = False
+        try:
+            # Flush headers immediately so clients see the first byte right away
+            yield ": stream opened\n\n"
+            queued = {'job_id': job['job_id'], 'status_url': f"/api/jobs/{job['job_id']}"}
+            yield f"event: queued\ndata: {json.dumps(queued)}\n\n"
+            while True:
+                try:
+                    event, payload = events.get(timeout=Config.STREAM_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    # Keep-alives also reveal a disconnected client while the job waits or runs
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+                if event in ('complete', 'error'):
+                    finished = True
+                    break
+        finally:
+            if not finished:
+                logger.info(f"Stream client disconnected; cancelling job {job['job_id']}")
+                orchestrator.cancel()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/api/similar', methods=['POST'])
+def find_similar_tasks():
+    """
+    Find completed runs whose tasks are near-duplicates of a task
+    
+    Clients can offer the matches before executing, then pass ``reuse``
+    ("result" or "seed") to /api/execute, /api/jobs or /api/execute/stream.
+    Only runs started with the same ``context`` match. ``limit`` (default 5)
+    is capped at MAX_SIMILAR_LIMIT.
+    """
+    data = request.get_json(silent=True) or {}
+    task = (data.get('task') or '').strip()
+    
+    if not task:
+        return jsonify({
+            'success': False,
+            'error': 'Task is required'
+        }), 400
+    
+    try:
+        limit = int(data.get('limit', 5))
+    except (TypeError, ValueError):
+        limit = 0
+    if limit < 1:
+        return jsonify({
+            'success': False,
+            'error': 'limit must be a positive integer'
+        }), 400
+    
+    orchestrator = WorkflowOrchestrator()
+    return jsonify({
+        'success': True,
+        'matches': orchestrator.find_similar_tasks(task, limit=min(limit, MAX_SIMILAR_LIMIT),
+                                                   initial_context=data.get('context')),
+        'result_threshold': Config.TASK_REUSE_RESULT_THRESHOLD
+    })
+
+
+@app.route('/api/traces/<run_id>', methods=['GET'])
+def get_trace(run_id):
+    """
+    Download a run's Chrome trace-event file
+    
+    Written when TRACE_ENABLED is on and TRACE_EXPORTERS includes "chrome";
+    open it in chrome://tracing or https://ui.perfetto.dev.
+    """
+    path = os.path.join(Config.TRACE_DIR, f"{run_id}.json")
+    if not run_id.isalnum() or not os.path.isfile(path):
+        return jsonify({
+            'success': False,
+            'error': 'Trace not found'
+        }), 404
+    
+    return send_from_directory(os.path.abspath(Config.TRACE_DIR), f"{run_id}.json", mimetype='application/json')
+
+
 @app.route('/api/status', methods=['GET'])
 def get_status():
     """Get API status and configuration"""
     try:
         api_key_set = bool(Config.OPENROUTER_API_KEY and Config.OPENROUTER_API_KEY.strip())
+        cache = get_llm_cache()
+        limiter = get_rate_limiter()
+        task_index = get_task_index()
         api_key_valid = api_key_set and Config.OPENROUTER_API_KEY.strip() != "your-api-key-here"
         
         return jsonify({
@@ -85,7 +375,12 @@ def get_status():
             'api_configured': api_key_set,
             'api_key_valid': api_key_valid,
             'model': Config.MODEL_NAME,
-            'api_key_format_valid': api_key_valid and Config.OPENROUTER_API_KEY.startswith("sk-or-") if api_key_valid else False
+            'api_key_format_valid': api_key_valid and Config.OPENROUTER_API_KEY.startswith("sk-or-") if api_key_valid else False,
+            'llm_cache': cache.stats() if cache else None,
+            'rate_limiter': limiter.stats() if limiter else None,
+            'job_queue': job_queue.stats(),
+            'task_index': task_index.stats() if task_index else None,
+            'tracing': Config.TRACE_EXPORTERS if Config.TRACE_ENABLED else None
         })
     except Exception as e:
         return jsonify({
@@ -2,19 +2,42 @@
 Base Agent class with OpenRouter integration
 """
 import json
+import time
+import asyncio
+import threading
+import httpx
 import requests
 import logging
-from typing import Dict, Any, Optional, List
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed
+from typing import Dict, Any, Optional, List, Callable, Iterator, AsyncIterator, Union, Tuple
 from config import Config
+from http_client import get_session, get_async_client
+from llm_cache import get_llm_cache
+from resilience import LLMAPIError, RetryPolicy, latency_tracker, hedge_delay, parse_retry_after
+from rate_limiter import get_rate_limiter
+from tokens import estimate_tokens, estimate_message_tokens
+from prompt_budget import PromptBudget
+from metrics import start_call, finish_call, collect_calls, summarize_calls
+from run_budget import get_run_budget
+from tracing import span, start_span, finish_span
 
 logging.basicConfig(level=getattr(logging, Config.LOG_LEVEL))
 logger = logging.getLogger(__name__)
 
+# Runs primary and hedged duplicate requests for the blocking client. The hedge
+# timer only starts once the primary is running, so time queued here is never
+# mistaken for a slow upstream
+_hedge_executor = ThreadPoolExecutor(max_workers=Config.HTTP_POOL_MAXSIZE, thread_name_prefix="llm-hedge")
+
+# Prompt size report of the prompt most recently built in this thread/task
+_prompt_report: contextvars.ContextVar = contextvars.ContextVar("prompt_report", default=None)
+
 
 class BaseAgent:
     """Base class for all AI agents with OpenRouter integration"""
     
-    def __init__(self, name: str, role: str, instructions: str):
+    def __init__(self, name: str, role: str, instructions: str, settings_key: Optional[str] = None):
         """
         Initialize agent
         
@@ -22,12 +45,22 @@ class BaseAgent:
             name: Agent name
             role: Agent role description
             instructions: System instructions for the agent
+            settings_key: Prefix of the agent's model override variables
+                (e.g. "PLANNING" for PLANNING_MODEL), see Config.agent_settings
         """
         self.name = name
         self.role = role
         self.instructions = instructions
         self.config = Config
         
+        settings = Config.agent_settings(settings_key)
+        self.model: str = settings["model"]
+        self.temperature: float = settings["temperature"]
+        self.max_tokens: int = settings["max_tokens"]
+        self.fallback_models: List[str] = settings["fallback_models"]
+        self.retry_policy = RetryPolicy.from_config()
+        self.prompt_budget: Optional[int] = None  # prompt token budget; set by agents that use _fit_prompt
+        
         if not self.config.OPENROUTER_API_KEY:
             raise ValueError("OPENROUTER_API_KEY not set in environment variables")
         
@@ -35,24 +68,654 @@ class BaseAgent:
         if self.config.OPENROUTER_API_KEY:
             self.config.OPENROUTER_API_KEY = self.config.OPENROUTER_API_KEY.strip()
     
-    def call_llm(self, prompt: str, context: Optional[List[Dict[str, str]]] = None) -> str:
+    def call_llm(self, prompt: str, context: Optional[List[Dict[str, str]]] = None,
+                 stream: bool = False) -> Union[str, Iterator[str]]:
         """
         Call OpenRouter API with the specified model
         
+        Transient failures (timeouts, 429, 5xx) move the call to the agent's
+        next fallback model; on the last model they are retried with
+        exponential backoff, honouring Retry-After. With HEDGE_ENABLED a duplicate request
+        is fired when the first one is slower than the recent p95 latency.
+        Timing and token usage of the call are recorded (see metrics.py).
+        
         Args:
             prompt: The user prompt
             context: Optional conversation history
+            stream: If True, return a generator yielding content deltas as
+                they arrive instead of the complete text
+            
+        Returns:
+            Response text from the model, or a generator of text deltas
+        """
+        with span("call_llm", "llm", agent=self.name, stream=stream) as llm_span:
+            with span("build_payload", "prompt"):
+                payload = self._build_payload(self._build_messages(prompt, context))
+            llm_span.set(model=payload["model"], max_tokens=payload["max_tokens"])
+            call = start_call(self.name, payload["model"], streamed=stream)
+            cached = self._cache_lookup(payload)
+            if cached is not None:
+                llm_span.set(cache_hit=True)
+                finish_call(call, cache_hit=True)
+                return iter([cached]) if stream else cached
+            if stream:
+                return self._stream_llm(payload, call)
+            
+            logger.info(f"{self.name} calling OpenRouter API with model {payload['model']}")
+            try:
+                self._validate_api_key()
+                while True:
+                    try:
+                        result = self._send_hedged(payload, call)
+                        break
+                    except LLMAPIError as e:
+                        delay = self._retry_delay(e, call, payload)
+                        if delay is None:
+                            continue
+                        logger.warning(f"{self.name} attempt {call['retries'] + 1} failed ({str(e)}); retrying in {delay:.1f}s")
+                        with span("retry_backoff", "retry", attempt=call["retries"] + 1, error=str(e)):
+                            time.sleep(delay)
+                        call["retries"] += 1
+                with span("parse", "parse"):
+                    content = self._parse_completion(result)
+            except Exception as e:
+                finish_call(call, error=str(e))
+                raise
             
+            finish_call(call, result)
+            llm_span.set(model=call["model"], retries=call["retries"], prompt_tokens=call["prompt_tokens"],
+                         completion_tokens=call["completion_tokens"])
+            self._cache_store(payload, content)
+            return content
+    
+    async def acall_llm(self, prompt: str, context: Optional[List[Dict[str, str]]] = None,
+                        stream: bool = False) -> Union[str, AsyncIterator[str]]:
+        """
+        Async variant of call_llm using the event loop's pooled client
+        
+        Args:
+            prompt: The user prompt
+            context: Optional conversation history
+            stream: If True, return an async generator of content deltas
+            
+        Returns:
+            Response text from the model, or an async generator of text deltas
+        """
+        with span("call_llm", "llm", agent=self.name, stream=stream) as llm_span:
+            with span("build_payload", "prompt"):
+                payload = self._build_payload(self._build_messages(prompt, context))
+            llm_span.set(model=payload["model"], max_tokens=payload["max_tokens"])
+            call = start_call(self.name, payload["model"], streamed=stream)
+            cached = self._cache_lookup(payload)
+            if cached is not None:
+                llm_span.set(cache_hit=True)
+                finish_call(call, cache_hit=True)
+                return self._aiter_cached(cached) if stream else cached
+            if stream:
+                return self._astream_llm(payload, call)
+            
+            logger.info(f"{self.name} calling OpenRouter API (async) with model {payload['model']}")
+            try:
+                self._validate_api_key()
+                while True:
+                    try:
+                        result = await self._asend_hedged(payload, call)
+                        break
+                    except LLMAPIError as e:
+                        delay = self._retry_delay(e, call, payload)
+                        if delay is None:
+                            continue
+                        logger.warning(f"{self.name} attempt {call['retries'] + 1} failed ({str(e)}); retrying in {delay:.1f}s")
+                        with span("retry_backoff", "retry", attempt=call["retries"] + 1, error=str(e)):
+                            await asyncio.sleep(delay)
+                        call["retries"] += 1
+                with span("parse", "parse"):
+                    content = self._parse_completion(result)
+            except Exception as e:
+                finish_call(call, error=str(e))
+                raise
+            
+            finish_call(call, result)
+            llm_span.set(model=call["model"], retries=call["retries"], prompt_tokens=call["prompt_tokens"],
+                         completion_tokens=call["completion_tokens"])
+            self._cache_store(payload, content)
+            return content
+    
+    def _send(self, payload: Dict[str, Any], call: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Make a single chat completion request
+        
+        Args:
+            payload: Request body
+            call: Call record; time spent waiting for the rate limiter is added to it
+        
+        Returns:
+            Parsed JSON response body
+        """
+        reserved = self._throttle(payload, call)
+        result = None
+        try:
+            result = self._post(payload, {"hedge": False})
+        finally:
+            self._settle_tokens(result, reserved)
+        return result
+    
+    async def _asend(self, payload: Dict[str, Any], call: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of _send"""
+        reserved = await self._athrottle(payload, call)
+        result = None
+        try:
+            result = await self._apost(payload, {"hedge": False})
+        finally:
+            self._settle_tokens(result, reserved)
+        return result
+    
+    def _post(self, payload: Dict[str, Any], attempt: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Post one completion request, without rate limiting
+        
+        Args:
+            payload: Request body
+            attempt: Record of this attempt alone (hedged requests run two at
+                once); receives its status and seconds
+        
         Returns:
-            Response text from the model
+            Parsed JSON response body
         """
-        headers = {
+        start = time.monotonic()
+        try:
+            with span("http_wait", "http", model=payload["model"], hedge=attempt["hedge"]) as wait_span:
+                response = get_session().post(
+                    f"{self.config.OPENROUTER_BASE_URL}/chat/completions",
+                    headers=self._build_headers(),
+                    json=payload,
+                    timeout=self._request_timeout()
+                )
+                wait_span.set(status=response.status_code)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"{self.name} API call failed: {str(e)}")
+            raise LLMAPIError(f"Failed to call OpenRouter API: {str(e)}", retryable=True) from e
+        
+        attempt["status"] = response.status_code
+        self._observe_rate_limits(response)
+        self._check_status(response)
+        with span("decode_response", "parse"):
+            result = response.json()
+        attempt["seconds"] = time.monotonic() - start
+        latency_tracker.record(attempt["seconds"])
+        return result
+    
+    async def _apost(self, payload: Dict[str, Any], attempt: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of _post"""
+        start = time.monotonic()
+        try:
+            with span("http_wait", "http", model=payload["model"], hedge=attempt["hedge"]) as wait_span:
+                response = await get_async_client().post(
+                    f"{self.config.OPENROUTER_BASE_URL}/chat/completions",
+                    headers=self._build_headers(),
+                    json=payload,
+                    timeout=self._request_timeout()
+                )
+                wait_span.set(status=response.status_code)
+        except httpx.HTTPError as e:
+            logger.error(f"{self.name} API call failed: {str(e)}")
+            raise LLMAPIError(f"Failed to call OpenRouter API: {str(e)}", retryable=True) from e
+        
+        attempt["status"] = response.status_code
+        self._observe_rate_limits(response)
+        self._check_status(response)
+        with span("decode_response", "parse"):
+            result = response.json()
+        attempt["seconds"] = time.monotonic() - start
+        latency_tracker.record(attempt["seconds"])
+        return result
+    
+    def _send_hedged(self, payload: Dict[str, Any], call: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Send a request, firing a duplicate if the first one straggles
+        
+        The first response to succeed wins. The rate limiter is charged once
+        for the pair, and each attempt writes only its own record; the call
+        record gets the winner's outcome. The hedge delay is measured from
+        when the first request actually starts on the worker pool. A losing
+        request that has started cannot be aborted on the blocking client; it
+        finishes in the background and its response is discarded.
+        """
+        delay = hedge_delay()
+        if delay is None:
+            return self._send(payload, call)
+        
+        reserved = self._throttle(payload, call)
+        result = None
+        try:
+            attempts = [{"hedge": False, "started": threading.Event()}]
+            futures = [self._submit_attempt(payload, attempts[0])]
+            # Wait out any queueing on the pool first, then the hedge delay
+            attempts[0]["started"].wait()
+            done, _ = wait(futures, timeout=delay)
+            if done:
+                result = futures[0].result()
+            else:
+                logger.info(f"{self.name} request exceeded {delay:.1f}s; sending hedged duplicate")
+                attempts.append({"hedge": True, "started": threading.Event()})
+                futures.append(self._submit_attempt(payload, attempts[1]))
+                try:
+                    result = self._first_success(futures, attempts, call)
+                finally:
+                    # A duplicate still waiting for a worker is not sent at all
+                    for future in futures:
+                        future.cancel()
+        finally:
+            self._settle_tokens(result, reserved)
+        return result
+    
+    def _submit_attempt(self, payload: Dict[str, Any], attempt: Dict[str, Any]) -> Any:
+        """Run _post on the hedge pool, setting attempt["started"] once a worker picks it up"""
+        def run():
+            attempt["started"].set()
+            return self._post(payload, attempt)
+        # Worker threads run in a copy of this context so they see the run budget
+        return _hedge_executor.submit(contextvars.copy_context().run, run)
+    
+    async def _asend_hedged(self, payload: Dict[str, Any], call: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of _send_hedged; the losing request is cancelled"""
+        delay = hedge_delay()
+        if delay is None:
+            return await self._asend(payload, call)
+        
+        reserved = await self._athrottle(payload, call)
+        result = None
+        attempts = [{"hedge": False}]
+        tasks = [asyncio.ensure_future(self._apost(payload, attempts[0]))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                result = tasks[0].result()
+            else:
+                logger.info(f"{self.name} request exceeded {delay:.1f}s; sending hedged duplicate")
+                attempts.append({"hedge": True})
+                tasks.append(asyncio.ensure_future(self._apost(payload, attempts[1])))
+                result = await self._afirst_success(tasks, attempts, call)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._settle_tokens(result, reserved)
+        return result
+    
+    @staticmethod
+    def _first_success(futures: List[Any], attempts: List[Dict[str, Any]], call: Dict[str, Any]) -> Dict[str, Any]:
+        """Result of the first hedged attempt to succeed (the last error if all fail); records the winner"""
+        error: Optional[BaseException] = None
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                error = e
+                continue
+            BaseAgent._record_hedge(call, attempts[futures.index(future)])
+            return result
+        raise error
+    
+    @staticmethod
+    async def _afirst_success(tasks: List[asyncio.Future], attempts: List[Dict[str, Any]],
+                              call: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of _first_success"""
+        error: Optional[BaseException] = None
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    BaseAgent._record_hedge(call, attempts[tasks.index(task)])
+                    return task.result()
+                error = task.exception()
+        raise error
+    
+    @staticmethod
+    def _record_hedge(call: Dict[str, Any], winner: Dict[str, Any]):
+        """Merge the winning attempt of a hedged request into the call record"""
+        call["hedged"] = True
+        call["hedge_won"] = winner["hedge"]
+    
+    def _stream_llm(self, payload: Dict[str, Any], call: Dict[str, Any]) -> Iterator[str]:
+        """
+        Post a streaming completion request and yield content deltas
+        
+        Opening the stream is retried like call_llm; failures after the
+        first delta has been yielded are raised to the caller.
+        """
+        payload = dict(payload, stream=True)
+        logger.info(f"{self.name} streaming from OpenRouter API with model {payload['model']}")
+        # Open across yields, so these spans are not made current (see tracing.start_span)
+        stream_span = start_span("stream_llm", "llm", agent=self.name, model=payload["model"])
+        
+        final: Dict[str, Any] = {}
+        try:
+            self._validate_api_key()
+            while True:
+                try:
+                    with span("open_stream", "http", parent=stream_span):
+                        response, reserved = self._open_stream(payload, call)
+                    break
+                except LLMAPIError as e:
+                    delay = self._retry_delay(e, call, payload)
+                    if delay is None:
+                        continue
+                    logger.warning(f"{self.name} stream attempt {call['retries'] + 1} failed ({str(e)}); retrying in {delay:.1f}s")
+                    with span("retry_backoff", "retry", parent=stream_span, attempt=call["retries"] + 1, error=str(e)):
+                        time.sleep(delay)
+                    call["retries"] += 1
+            
+            read_span = start_span("read_stream", "http", parent=stream_span)
+            opened = time.monotonic()
+            try:
+                response.encoding = "utf-8"
+                chunks = []
+                for line in response.iter_lines(decode_unicode=True):
+                    delta = self._read_stream_chunk(self._parse_stream_line(line), final, call)
+                    if delta:
+                        if not chunks:
+                            read_span.set(first_token_seconds=round(time.monotonic() - opened, 3))
+                        chunks.append(delta)
+                        yield delta
+            except requests.exceptions.RequestException as e:
+                logger.error(f"{self.name} streaming API call failed: {str(e)}")
+                raise LLMAPIError(f"Failed to call OpenRouter API: {str(e)}") from e
+            finally:
+                response.close()
+                finish_span(read_span)
+        except Exception as e:
+            finish_call(call, final, error=str(e))
+            finish_span(stream_span, error=str(e))
+            raise
+        except BaseException:
+            # Closed before the end (client disconnect, cancellation): still record the call
+            finish_call(call, final, error="cancelled")
+            finish_span(stream_span, error="cancelled")
+            raise
+        
+        finish_call(call, final)
+        stream_span.set(model=call["model"], retries=call["retries"], prompt_tokens=call["prompt_tokens"],
+                        completion_tokens=call["completion_tokens"])
+        finish_span(stream_span)
+        self._settle_tokens(final, reserved)
+        self._cache_store(payload, "".join(chunks))
+    
+    def _open_stream(self, payload: Dict[str, Any], call: Dict[str, Any]) -> Tuple[Any, int]:
+        """
+        Send a streaming request and return the response once its status is OK
+        
+        Returns:
+            Tuple of (open response, prompt tokens reserved from the rate limiter)
+        """
+        reserved = self._throttle(payload, call)
+        try:
+            with span("http_wait", "http", model=payload["model"], stream=True) as wait_span:
+                response = get_session().post(
+                    f"{self.config.OPENROUTER_BASE_URL}/chat/completions",
+                    headers=self._build_headers(),
+                    json=payload,
+                    timeout=self._request_timeout(),
+                    stream=True
+                )
+                wait_span.set(status=response.status_code)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"{self.name} streaming API call failed: {str(e)}")
+            raise LLMAPIError(f"Failed to call OpenRouter API: {str(e)}", retryable=True) from e
+        
+        try:
+            self._observe_rate_limits(response)
+            self._check_status(response)
+        except Exception:
+            response.close()
+            raise
+        return response, reserved
+    
+    async def _astream_llm(self, payload: Dict[str, Any], call: Dict[str, Any]) -> AsyncIterator[str]:
+        """Async variant of _stream_llm"""
+        payload = dict(payload, stream=True)
+        logger.info(f"{self.name} streaming from OpenRouter API (async) with model {payload['model']}")
+        # Open across yields, so these spans are not made current (see tracing.start_span)
+        stream_span = start_span("stream_llm", "llm", agent=self.name, model=payload["model"])
+        
+        final: Dict[str, Any] = {}
+        try:
+            self._validate_api_key()
+            while True:
+                try:
+                    with span("open_stream", "http", parent=stream_span):
+                        response, reserved = await self._aopen_stream(payload, call)
+                    break
+                except LLMAPIError as e:
+                    delay = self._retry_delay(e, call, payload)
+                    if delay is None:
+                        continue
+                    logger.warning(f"{self.name} stream attempt {call['retries'] + 1} failed ({str(e)}); retrying in {delay:.1f}s")
+                    with span("retry_backoff", "retry", parent=stream_span, attempt=call["retries"] + 1, error=str(e)):
+                        await asyncio.sleep(delay)
+                    call["retries"] += 1
+            
+            read_span = start_span("read_stream", "http", parent=stream_span)
+            opened = time.monotonic()
+            try:
+                chunks = []
+                async for line in response.aiter_lines():
+                    delta = self._read_stream_chunk(self._parse_stream_line(line), final, call)
+                    if delta:
+                        if not chunks:
+                            read_span.set(first_token_seconds=round(time.monotonic() - opened, 3))
+                        chunks.append(delta)
+                        yield delta
+            except httpx.HTTPError as e:
+                logger.error(f"{self.name} streaming API call failed: {str(e)}")
+                raise LLMAPIError(f"Failed to call OpenRouter API: {str(e)}") from e
+            finally:
+                await response.aclose()
+                finish_span(read_span)
+        except Exception as e:
+            finish_call(call, final, error=str(e))
+            finish_span(stream_span, error=str(e))
+            raise
+        except BaseException:
+            # Closed before the end (client disconnect, cancellation): still record the call
+            finish_call(call, final, error="cancelled")
+            finish_span(stream_span, error="cancelled")
+            raise
+        
+        finish_call(call, final)
+        stream_span.set(model=call["model"], retries=call["retries"], prompt_tokens=call["prompt_tokens"],
+                        completion_tokens=call["completion_tokens"])
+        finish_span(stream_span)
+        self._settle_tokens(final, reserved)
+        self._cache_store(payload, "".join(chunks))
+    
+    async def _aopen_stream(self, payload: Dict[str, Any], call: Dict[str, Any]) -> Tuple[httpx.Response, int]:
+        """Async variant of _open_stream"""
+        reserved = await self._athrottle(payload, call)
+        client = get_async_client()
+        request = client.build_request(
+            "POST",
+            f"{self.config.OPENROUTER_BASE_URL}/chat/completions",
+            headers=self._build_headers(),
+            json=payload,
+            timeout=self._request_timeout()
+        )
+        try:
+            with span("http_wait", "http", model=payload["model"], stream=True) as wait_span:
+                response = await client.send(request, stream=True)
+                wait_span.set(status=response.status_code)
+        except httpx.HTTPError as e:
+            logger.error(f"{self.name} streaming API call failed: {str(e)}")
+            raise LLMAPIError(f"Failed to call OpenRouter API: {str(e)}", retryable=True) from e
+        
+        try:
+            if response.status_code >= 400:
+                await response.aread()
+            self._observe_rate_limits(response)
+            self._check_status(response)
+        except Exception:
+            await response.aclose()
+            raise
+        return response, reserved
+    
+    def _read_stream_chunk(self, chunk: Optional[Dict[str, Any]], final: Dict[str, Any],
+                           call: Dict[str, Any]) -> Optional[str]:
+        """
+        Take the content delta of a stream chunk, keeping its usage and model
+        
+        Args:
+            chunk: Parsed chunk, or None for lines without data
+            final: Receives the usage block and model name as they appear
+            call: Call record; gets the time to the first content delta
+            
+        Returns:
+            The content delta, if any
+        """
+        if chunk is None:
+            return None
+        if chunk.get("usage"):
+            final["usage"] = chunk["usage"]
+        if chunk.get("model"):
+            final["model"] = chunk["model"]
+        
+        choices = chunk.get("choices") or []
+        delta = choices[0].get("delta", {}).get("content") if choices else None
+        if delta and "first_token_seconds" not in call:
+            call["first_token_seconds"] = round(time.monotonic() - call["_start"], 3)
+        return delta
+    
+    def _retry_delay(self, error: LLMAPIError, call: Dict[str, Any], payload: Dict[str, Any]) -> Optional[float]:
+        """
+        Prepare the next attempt after a failed one
+        
+        A retryable failure switches the payload to the next fallback model
+        straight away. Once the fallbacks are used up, the last model is
+        retried with backoff. Re-raises the error when it should not be
+        retried, including when the wait would outlast the run budget.
+        
+        Returns:
+            Seconds to wait before retrying, or None to send to the fallback model now
+        """
+        models = [self.model] + self.fallback_models
+        position = models.index(payload["model"]) if payload["model"] in models else len(models) - 1
+        if error.retryable and position + 1 < len(models):
+            payload["model"] = models[position + 1]
+            call.setdefault("failed_models", []).append(models[position])
+            call["model"] = payload["model"]
+            logger.warning(f"{self.name} model {models[position]} failed ({str(error)}); falling back to {payload['model']}")
+            return None
+        
+        if not self.retry_policy.should_retry(error, call["retries"]):
+            raise error
+        delay = self.retry_policy.delay(error, call["retries"])
+        budget = get_run_budget()
+        remaining = budget.remaining_seconds() if budget else None
+        if remaining is not None and delay >= remaining:
+            raise error
+        return delay
+    
+    def _request_timeout(self) -> float:
+        """HTTP timeout for a request, shortened to what is left of the run budget"""
+        budget = get_run_budget()
+        return budget.request_timeout(self.config.TIMEOUT) if budget else self.config.TIMEOUT
+    
+    def _throttle(self, payload: Dict[str, Any], call: Dict[str, Any]) -> int:
+        """
+        Wait for the shared rate limiter before sending a request
+        
+        Args:
+            payload: Request body
+            call: Call record receiving the time spent waiting
+        
+        Returns:
+            Prompt tokens reserved from the token bucket (0 when disabled)
+        """
+        limiter = get_rate_limiter()
+        if limiter is None:
+            return 0
+        tokens = estimate_message_tokens(payload["messages"])
+        with span("rate_limit_wait", "queue", tokens=tokens):
+            call["queue_seconds"] += limiter.acquire(tokens)
+        return tokens
+    
+    async def _athrottle(self, payload: Dict[str, Any], call: Dict[str, Any]) -> int:
+        """Async variant of _throttle"""
+        limiter = get_rate_limiter()
+        if limiter is None:
+            return 0
+        tokens = estimate_message_tokens(payload["messages"])
+        with span("rate_limit_wait", "queue", tokens=tokens):
+            call["queue_seconds"] += await limiter.aacquire(tokens)
+        return tokens
+    
+    def _observe_rate_limits(self, response: Any):
+        """Feed x-ratelimit-* headers and 429 Retry-After back into the rate limiter"""
+        limiter = get_rate_limiter()
+        if limiter is None:
+            return
+        limiter.update_from_headers(response.headers)
+        if response.status_code == 429:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after:
+                limiter.block_for(min(retry_after, self.config.RETRY_AFTER_MAX))
+    
+    def _settle_tokens(self, result: Optional[Dict[str, Any]], reserved: int):
+        """
+        Charge the rate limiter for actual usage beyond the reserved prompt estimate
+        
+        Args:
+            result: Response body, or None if the request failed, which
+                returns the reserved tokens
+            reserved: Prompt tokens taken from the rate limiter before sending
+        """
+        limiter = get_rate_limiter()
+        if limiter is None:
+            return
+        if result is None:
+            limiter.adjust_tokens(-reserved)
+            return
+        total = (result.get("usage") or {}).get("total_tokens")
+        if total is not None:
+            limiter.adjust_tokens(int(total) - reserved)
+    
+    def _cache_lookup(self, payload: Dict[str, Any]) -> Optional[str]:
+        """Return a cached response for the request, if caching is enabled and it hits"""
+        cache = get_llm_cache()
+        if cache is None:
+            return None
+        
+        cached = cache.get(payload)
+        if cached is not None:
+            logger.info(f"{self.name} served response from LLM cache")
+        return cached
+    
+    def _cache_store(self, payload: Dict[str, Any], content: str):
+        """Store a fresh response in the cache, if caching is enabled"""
+        cache = get_llm_cache()
+        if cache is not None and content:
+            cache.put(payload, content)
+    
+    @staticmethod
+    async def _aiter_cached(content: str) -> AsyncIterator[str]:
+        """Replay a cached response as a single-delta async stream"""
+        yield content
+    
+    def _validate_api_key(self):
+        """Raise if the API key is missing or empty"""
+        if not self.config.OPENROUTER_API_KEY or not self.config.OPENROUTER_API_KEY.strip():
+            raise ValueError("OPENROUTER_API_KEY is missing or empty")
+    
+    def _build_headers(self) -> Dict[str, str]:
+        """Build request headers for OpenRouter"""
+        return {
             "Authorization": f"Bearer {self.config.OPENROUTER_API_KEY}",
             "Content-Type": "application/json",
             "HTTP-Referer": "https://github.com/testing-agents",  # Optional
             "X-Title": "AI Agent Workflow"  # Optional
         }
-        
+    
+    def _build_messages(self, prompt: str, context: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+        """Build the chat message list from instructions, history and prompt"""
         messages = []
         
         # Add system instruction
@@ -72,88 +735,184 @@ class BaseAgent:
             "content": prompt
         })
         
-        payload = {
-            "model": self.config.MODEL_NAME,
+        return messages
+    
+    def _build_payload(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        """Build the chat completion request body, capping max_tokens to the run budget"""
+        max_tokens = self.max_tokens
+        budget = get_run_budget()
+        if budget is not None:
+            max_tokens = budget.completion_tokens(max_tokens, estimate_message_tokens(messages))
+        return {
+            "model": self.model,
             "messages": messages,
-            "max_tokens": self.config.MAX_TOKENS,
-            "temperature": self.config.TEMPERATURE
+            "max_tokens": max_tokens,
+            "temperature": self.temperature
         }
+    
+    def _check_status(self, response: Any):
+        """
+        Raise a descriptive error for a failed OpenRouter HTTP response
         
-        try:
-            logger.info(f"{self.name} calling OpenRouter API with model {self.config.MODEL_NAME}")
-            
-            # Validate API key is present
-            if not self.config.OPENROUTER_API_KEY or not self.config.OPENROUTER_API_KEY.strip():
-                raise ValueError("OPENROUTER_API_KEY is missing or empty")
-            
-            response = requests.post(
-                f"{self.config.OPENROUTER_BASE_URL}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=self.config.TIMEOUT
+        Args:
+            response: HTTP response object exposing status_code and text
+        """
+        # Handle 401 Unauthorized specifically
+        if response.status_code == 401:
+            error_msg = (
+                "401 Unauthorized: Authentication failed.\n"
+                "Possible causes:\n"
+                "  1. Invalid or expired API key\n"
+                "  2. API key doesn't have access to this model\n"
+                "  3. API key format is incorrect\n\n"
+                f"Please verify your API key at: https://openrouter.ai/keys\n"
+                f"Current API key (first 10 chars): {self.config.OPENROUTER_API_KEY[:10]}...\n"
+                f"Model: {self.model}"
             )
-            
-            # Handle 401 Unauthorized specifically
-            if response.status_code == 401:
-                error_msg = (
-                    "401 Unauthorized: Authentication failed.\n"
-                    "Possible causes:\n"
-                    "  1. Invalid or expired API key\n"
-                    "  2. API key doesn't have access to this model\n"
-                    "  3. API key format is incorrect\n\n"
-                    f"Please verify your API key at: https://openrouter.ai/keys\n"
-                    f"Current API key (first 10 chars): {self.config.OPENROUTER_API_KEY[:10]}...\n"
-                    f"Model: {self.config.MODEL_NAME}"
-                )
-                logger.error(error_msg)
-                raise ValueError(error_msg)
-            
-            response.raise_for_status()
-            result = response.json()
-            
-            if "choices" in result and len(result["choices"]) > 0:
-                content = result["choices"][0]["message"]["content"]
-                logger.debug(f"{self.name} received response: {content[:100]}...")
-                return content
-            else:
-                raise ValueError("Unexpected response format from OpenRouter API")
-                
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 401:
-                error_msg = (
-                    "401 Unauthorized: Authentication failed.\n"
-                    "Possible causes:\n"
-                    "  1. Invalid or expired API key\n"
-                    "  2. API key doesn't have access to this model\n"
-                    "  3. API key format is incorrect\n\n"
-                    f"Please verify your API key at: https://openrouter.ai/keys\n"
-                    f"Current API key (first 10 chars): {self.config.OPENROUTER_API_KEY[:10]}...\n"
-                    f"Model: {self.config.MODEL_NAME}"
-                )
-                logger.error(error_msg)
-                raise ValueError(error_msg) from e
-            else:
-                logger.error(f"{self.name} API call failed with status {e.response.status_code}: {str(e)}")
-                raise Exception(f"Failed to call OpenRouter API (HTTP {e.response.status_code}): {str(e)}")
-        except requests.exceptions.RequestException as e:
-            logger.error(f"{self.name} API call failed: {str(e)}")
-            raise Exception(f"Failed to call OpenRouter API: {str(e)}")
-        except ValueError as e:
-            # Re-raise ValueError as-is
-            raise
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        
+        if response.status_code >= 400:
+            logger.error(f"{self.name} API call failed with status {response.status_code}: {response.text[:200]}")
+            raise LLMAPIError.from_status(
+                f"Failed to call OpenRouter API (HTTP {response.status_code}): {response.text[:200]}",
+                response.status_code,
+                response.headers.get("Retry-After")
+            )
+    
+    def _parse_completion(self, result: Dict[str, Any]) -> str:
+        """Extract the message content from a chat completion body"""
+        if "choices" in result and len(result["choices"]) > 0:
+            content = result["choices"][0]["message"]["content"]
+            logger.debug(f"{self.name} received response: {content[:100]}...")
+            return content
+        else:
+            raise ValueError("Unexpected response format from OpenRouter API")
     
-    def process(self, task: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    def _parse_stream_line(self, line: str) -> Optional[Dict[str, Any]]:
+        """
+        Parse one Server-Sent-Events line of a streaming completion
+        
+        Returns:
+            The JSON chunk carried by the line, or None for comments,
+            keep-alives and the [DONE] marker
         """
-        Process a task - to be implemented by subclasses
+        if not line or not line.startswith("data:"):
+            return None
+        
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return None
+        
+        chunk = json.loads(data)
+        if "error" in chunk:
+            raise Exception(f"OpenRouter stream error: {chunk['error']}")
+        return chunk
+    
+    def process(self, task: str, context: Optional[Dict[str, Any]] = None,
+                on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """
+        Process a task with a single LLM call
         
         Args:
             task: The task description
             context: Additional context from previous steps
+            on_token: Optional callback; when given the response is streamed
+                and each content delta is passed to it as it arrives
             
         Returns:
             Dictionary with results
         """
-        raise NotImplementedError("Subclasses must implement process method")
+        _prompt_report.set(None)
+        with span(f"{self.name}.process", "agent", agent=self.name), collect_calls() as calls:
+            with span("build_prompt", "prompt"):
+                prompt = self._build_prompt(task, context)
+            response = self._complete(prompt, on_token)
+            with span("build_result", "parse"):
+                output = self.format_output(self._build_result(response))
+        return self._annotate_output(output, calls)
+    
+    async def aprocess(self, task: str, context: Optional[Dict[str, Any]] = None,
+                       on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """Async variant of process"""
+        _prompt_report.set(None)
+        with span(f"{self.name}.process", "agent", agent=self.name), collect_calls() as calls:
+            with span("build_prompt", "prompt"):
+                prompt = self._build_prompt(task, context)
+            response = await self._acomplete(prompt, on_token)
+            with span("build_result", "parse"):
+                output = self.format_output(self._build_result(response))
+        return self._annotate_output(output, calls)
+    
+    def _fit_prompt(self, template: str, sections: Dict[str, str], **fixed: str) -> str:
+        """
+        Fill a prompt template, trimming sections to the agent's prompt budget
+        
+        Args:
+            template: str.format template with a field per section and fixed value
+            sections: Variable material (earlier step outputs) that may be trimmed
+            fixed: Values inserted verbatim, such as the task
+            
+        Returns:
+            The prompt; its size report is attached to the process() output
+        """
+        if not self.config.PROMPT_BUDGET_ENABLED or not self.prompt_budget:
+            prompt = template.format(**sections, **fixed)
+            _prompt_report.set({"prompt_tokens": estimate_tokens(self.instructions) + estimate_tokens(prompt)})
+            return prompt
+        
+        skeleton = template.format(**{name: "" for name in sections}, **fixed)
+        reserved = estimate_tokens(self.instructions) + estimate_tokens(skeleton)
+        fitted, report = PromptBudget(self.prompt_budget).fit(sections, reserved)
+        prompt = template.format(**fitted, **fixed)
+        
+        report["prompt_tokens"] = estimate_tokens(self.instructions) + estimate_tokens(prompt)
+        if report["trimmed_tokens"]:
+            logger.info(
+                f"{self.name} prompt trimmed by ~{report['trimmed_tokens']} tokens "
+                f"to ~{report['prompt_tokens']} (budget {self.prompt_budget})"
+            )
+        _prompt_report.set(report)
+        return prompt
+    
+    def _annotate_output(self, output: Dict[str, Any], calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Attach the model used, the LLM call metrics and the prompt size report (if one was recorded)"""
+        output["model"] = calls[-1]["model"] if calls else self.model
+        output["metrics"] = {"calls": calls, "totals": summarize_calls(calls)}
+        report = _prompt_report.get()
+        if report is not None:
+            output["prompt_stats"] = report
+        return output
+    
+    def _complete(self, prompt: str, on_token: Optional[Callable[[str], None]] = None) -> str:
+        """Get the full response text, streaming deltas to on_token if given"""
+        if on_token is None:
+            return self.call_llm(prompt)
+        
+        chunks = []
+        for delta in self.call_llm(prompt, stream=True):
+            chunks.append(delta)
+            on_token(delta)
+        return "".join(chunks)
+    
+    async def _acomplete(self, prompt: str, on_token: Optional[Callable[[str], None]] = None) -> str:
+        """Async variant of _complete"""
+        if on_token is None:
+            return await self.acall_llm(prompt)
+        
+        chunks = []
+        async for delta in await self.acall_llm(prompt, stream=True):
+            chunks.append(delta)
+            on_token(delta)
+        return "".join(chunks)
+    
+    def _build_prompt(self, task: str, context: Optional[Dict[str, Any]] = None) -> str:
+        """Build the prompt for a task - to be implemented by subclasses"""
+        raise NotImplementedError("Subclasses must implement _build_prompt or override process")
+    
+    def _build_result(self, response: str) -> Dict[str, Any]:
+        """Wrap the raw model response - to be implemented by subclasses"""
+        raise NotImplementedError("Subclasses must implement _build_result or override process")
     
     def format_output(self, result: Any) -> Dict[str, Any]:
         """Format agent output in a standard structure"""
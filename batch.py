@@ -0,0 +1,181 @@
+"""
+Bulk JSONL batch execution with bounded concurrency
+
+Tasks are streamed from an input JSONL file and run through
+WorkflowOrchestrator on a single event loop, with at most ``workers``
+workflows in flight. Each result is appended to the output JSONL as soon as
+it finishes (completion order), and IDs that already completed in the
+output file are skipped, so an interrupted batch can simply be rerun.
+run_tasks is the underlying runner for callers that store results
+elsewhere (e.g. the GitHub Actions runner).
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, Any, Iterator, Iterable, Optional, Set, Callable
+
+from workflow import WorkflowOrchestrator
+from result_format import format_results
+
+logger = logging.getLogger(__name__)
+
+
+def iter_batch_tasks(input_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream task records from a JSONL file
+    
+    Each line is a JSON object with a ``task`` (or ``title``/``body``) and an
+    optional ``request_id`` / ``id``; lines without an ID are keyed by their
+    line number. An optional ``context`` object is passed to the workflow.
+    
+    Yields:
+        Dicts with request_id, task and context
+    """
+    with open(input_path, "r") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning(f"Skipping invalid JSON on line {line_number} of {input_path}: {str(e)}")
+                continue
+            
+            task = record.get("task") or "\n\n".join(
+                part for part in (record.get("title"), record.get("body")) if part
+            )
+            if not task:
+                logger.warning(f"Skipping line {line_number} of {input_path}: no task")
+                continue
+            
+            yield {
+                "request_id": str(record.get("request_id") or record.get("id") or f"line-{line_number}"),
+                "task": task,
+                "context": record.get("context") or {}
+            }
+
+
+def load_finished_ids(output_path: str) -> Set[str]:
+    """Get the IDs that already completed successfully in an output JSONL file"""
+    finished: Set[str] = set()
+    if not os.path.exists(output_path):
+        return finished
+    
+    with open(output_path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn final line from an interrupted run; that task reruns
+                continue
+            if record.get("status") == "completed":
+                finished.add(record["request_id"])
+    return finished
+
+
+async def run_batch(input_path: str, output_path: str, workers: int,
+                    on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Run every pending task of a JSONL file with bounded concurrency
+    
+    Args:
+        input_path: JSONL file of tasks
+        output_path: JSONL file results are appended to in completion order
+        workers: Maximum number of workflows running at once
+        on_result: Optional callback receiving each output record
+    
+    Returns:
+        Batch counts (completed, failed, skipped) and elapsed seconds
+    """
+    with open(output_path, "a") as output:
+        def write_record(record: Dict[str, Any]):
+            # Appends happen on the loop thread, so lines never interleave
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            if on_result:
+                on_result(record)
+        
+        return await run_tasks(
+            iter_batch_tasks(input_path), workers, on_result=write_record,
+            finished=load_finished_ids(output_path)
+        )
+
+
+async def run_tasks(items: Iterable[Dict[str, Any]], workers: int,
+                    on_result: Callable[[Dict[str, Any]], None],
+                    on_start: Optional[Callable[[Dict[str, Any]], None]] = None,
+                    finished: Optional[Set[str]] = None) -> Dict[str, Any]:
+    """
+    Run task items on one event loop with at most ``workers`` in flight
+    
+    Args:
+        items: Dicts with request_id, task and context (e.g. from iter_batch_tasks);
+            consumed lazily, so reading pauses while all workers are busy
+        workers: Maximum number of workflows running at once
+        on_result: Callback receiving each output record as it finishes
+        on_start: Optional callback receiving each item as it starts
+        finished: Request IDs to skip
+    
+    Returns:
+        Counts (completed, failed, skipped) and elapsed seconds
+    """
+    finished = finished or set()
+    semaphore = asyncio.Semaphore(max(1, workers))
+    counts = {"completed": 0, "failed": 0, "skipped": 0}
+    running: Set[asyncio.Task] = set()
+    started = time.monotonic()
+    
+    async def run_one(item: Dict[str, Any]):
+        try:
+            if on_start:
+                on_start(item)
+            record = await _execute_item(item)
+            counts["completed" if record["status"] == "completed" else "failed"] += 1
+            on_result(record)
+        finally:
+            semaphore.release()
+    
+    for item in items:
+        if item["request_id"] in finished:
+            counts["skipped"] += 1
+            continue
+        
+        # Reading pauses here while all workers are busy
+        await semaphore.acquire()
+        task = asyncio.create_task(run_one(item))
+        running.add(task)
+        task.add_done_callback(running.discard)
+    
+    if running:
+        await asyncio.gather(*running)
+    
+    counts["elapsed_seconds"] = round(time.monotonic() - started, 3)
+    logger.info(f"Batch finished: {counts}")
+    return counts
+
+
+async def _execute_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one batch item and build its output record"""
+    started_at = datetime.now().isoformat()
+    start = time.monotonic()
+    try:
+        results = await WorkflowOrchestrator().execute_workflow_async(item["task"], item["context"])
+        status = results.get("status", "failed")
+        error = results.get("error")
+    except Exception as e:
+        logger.error(f"Batch item {item['request_id']} failed: {str(e)}", exc_info=True)
+        results, status, error = None, "failed", str(e)
+    
+    return {
+        "request_id": item["request_id"],
+        "status": status,
+        "error": error,
+        "started_at": started_at,
+        "completed_at": datetime.now().isoformat(),
+        "duration_seconds": round(time.monotonic() - start, 3),
+        "results": format_results(results)
+    }
@@ -0,0 +1,226 @@
+"""
+End-to-end workflow benchmark against the local mock OpenRouter
+
+Runs complete workflows through WorkflowOrchestrator at several concurrency
+levels, with every LLM call answered by mock_openrouter.py instead of the
+real API, and reports per level:
+
+- workflows/sec and the workflow latency p50/p95/p99
+- LLM calls, retries and failed workflows
+- per step: its duration and the overhead spent outside LLM calls (step
+  time minus the time a call of the step was in flight), p50 and p95
+
+The LLM response cache, checkpoints and the task index are switched off so
+every run does the same work; the rest of the configuration (.env/env vars,
+e.g. RESEARCH_FANOUT or RATE_LIMIT_ENABLED) applies as usual.
+
+Usage:
+    python benchmark.py --concurrency 1,4,16 --workflows 32 --latency-mean 0.5
+    python benchmark.py --mode sync --error-rate-5xx 0.05 --seed 7 --json bench.json
+    python benchmark.py --base-url http://127.0.0.1:8765/api/v1  # use a separately started mock
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from dotenv import load_dotenv
+from config import Config
+from http_client import aclose_async_client
+from metrics import percentile
+from mock_openrouter import add_mock_arguments, mock_from_arguments
+from workflow import WorkflowOrchestrator
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TASK = (
+    "Write a proposal to the city council for a new public library branch with extended "
+    "weekend hours, a maker space and free tutoring for high school students"
+)
+
+# Graph node -> label under which the orchestrator reports the node's LLM calls
+STEP_LABELS = {
+    "step1_plan": "Step 1",
+    "step2_research": "Step 2",
+    "step3_execution": "Step 3",
+    "step4_review": "Step 4",
+    "step5_refinement": "Step 5",
+    "final_review": "Final Review",
+    "summary": "Summary"
+}
+
+
+async def run_level(concurrency: int, workflows: int, mode: str, task: str) -> Dict[str, Any]:
+    """
+    Run a number of workflows with at most ``concurrency`` in flight
+    
+    Args:
+        concurrency: Workflows running at once
+        workflows: Workflows to run in total
+        mode: "async" (execute_workflow_async on this loop) or "sync"
+            (execute_workflow on a thread per in-flight workflow)
+        task: Task given to every workflow
+    
+    Returns:
+        Elapsed seconds and one record per workflow (seconds, status, error, metrics)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    executor = ThreadPoolExecutor(max_workers=concurrency) if mode == "sync" else None
+    loop = asyncio.get_running_loop()
+    
+    async def run_one() -> Dict[str, Any]:
+        async with semaphore:
+            orchestrator = WorkflowOrchestrator()
+            started = time.monotonic()
+            try:
+                if executor is not None:
+                    results = await loop.run_in_executor(executor, orchestrator.execute_workflow, task)
+                else:
+                    results = await orchestrator.execute_workflow_async(task)
+            except Exception as e:
+                results = {"status": "failed", "error": str(e)}
+            return {
+                "seconds": time.monotonic() - started,
+                "status": results.get("status", "failed"),
+                "error": results.get("error"),
+                "metrics": results.get("metrics")
+            }
+    
+    started = time.monotonic()
+    try:
+        records = await asyncio.gather(*(run_one() for _ in range(workflows)))
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+        await aclose_async_client()
+    return {"elapsed_seconds": time.monotonic() - started, "records": records}
+
+
+def summarize_level(concurrency: int, run: Dict[str, Any], server: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Reduce one level's workflow records to throughput, latency and per-step overhead"""
+    records = run["records"]
+    completed = [record for record in records if record["status"] == "completed"]
+    latencies = [record["seconds"] for record in completed]
+    measured = [record["metrics"] for record in records if record["metrics"]]
+    
+    step_seconds: Dict[str, List[float]] = {}
+    step_overhead: Dict[str, List[float]] = {}
+    for metrics in measured:
+        nodes = (metrics.get("schedule") or {}).get("nodes", {})
+        for name, node in nodes.items():
+            llm = metrics["by_step"].get(STEP_LABELS.get(name, name), {})
+            step_seconds.setdefault(name, []).append(node["seconds"])
+            step_overhead.setdefault(name, []).append(max(0.0, node["seconds"] - llm.get("busy_seconds", 0.0)))
+    
+    return {
+        "concurrency": concurrency,
+        "workflows": len(records),
+        "completed": len(completed),
+        "failed": len(records) - len(completed),
+        "errors": sorted({record["error"] for record in records if record["error"]})[:5],
+        "elapsed_seconds": round(run["elapsed_seconds"], 3),
+        "workflows_per_second": round(len(completed) / run["elapsed_seconds"], 3) if run["elapsed_seconds"] else 0.0,
+        "latency_seconds": {
+            "mean": round(statistics.mean(latencies), 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(max(latencies), 3) if latencies else 0.0
+        },
+        "llm_calls": sum(metrics["totals"]["calls"] for metrics in measured),
+        "retries": sum(metrics["totals"]["retries"] for metrics in measured),
+        "steps": {
+            name: {
+                "p50_seconds": round(percentile(step_seconds[name], 50), 4),
+                "p95_seconds": round(percentile(step_seconds[name], 95), 4),
+                "p50_overhead_seconds": round(percentile(step_overhead[name], 50), 4),
+                "p95_overhead_seconds": round(percentile(step_overhead[name], 95), 4)
+            }
+            for name in step_seconds
+        },
+        "server": server
+    }
+
+
+def print_report(levels: List[Dict[str, Any]]):
+    """Print the per-level summary and per-step overhead tables"""
+    print(f"\n{'conc':>5} {'done':>6} {'fail':>5} {'wf/s':>8} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} "
+          f"{'calls':>6} {'retries':>7}")
+    for level in levels:
+        latency = level["latency_seconds"]
+        print(f"{level['concurrency']:>5} {level['completed']:>6} {level['failed']:>5} "
+              f"{level['workflows_per_second']:>8.3f} {latency['p50']:>8.3f} {latency['p95']:>8.3f} "
+              f"{latency['p99']:>8.3f} {level['llm_calls']:>6} {level['retries']:>7}")
+    
+    for level in levels:
+        print(f"\nPer-step time at concurrency {level['concurrency']} (overhead = outside LLM calls, in ms)")
+        print(f"  {'step':<18} {'p50 ms':>9} {'p95 ms':>9} {'ovh p50':>9} {'ovh p95':>9}")
+        for name, step in level["steps"].items():
+            print(f"  {name:<18} {step['p50_seconds'] * 1000:>9.1f} {step['p95_seconds'] * 1000:>9.1f} "
+                  f"{step['p50_overhead_seconds'] * 1000:>9.1f} {step['p95_overhead_seconds'] * 1000:>9.1f}")
+        if level["errors"]:
+            print(f"  errors: {'; '.join(level['errors'])}")
+
+
+def main(argv: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    parser = argparse.ArgumentParser(description="Benchmark complete workflows against a mock OpenRouter")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels (default: 1,4,16)")
+    parser.add_argument("--workflows", type=int, default=0,
+                        help="Workflows per level (default: 4 x concurrency, at least 8)")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured workflows before the first level")
+    parser.add_argument("--mode", choices=("async", "sync"), default="async",
+                        help="Native async execution or the blocking API on threads (default: async)")
+    parser.add_argument("--task", default=DEFAULT_TASK, help="Task given to every workflow")
+    parser.add_argument("--base-url", help="Use an already running mock at this URL instead of starting one")
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this JSON file")
+    add_mock_arguments(parser)
+    args = parser.parse_args(argv)
+    
+    # base_agent configures INFO logging on import; keep the report readable
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', force=True)
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    
+    mock = None if args.base_url else mock_from_arguments(args)
+    Config.OPENROUTER_BASE_URL = args.base_url or mock.start()
+    Config.OPENROUTER_API_KEY = Config.OPENROUTER_API_KEY or "sk-or-mock"
+    Config.LLM_CACHE_ENABLED = False
+    Config.CHECKPOINT_ENABLED = False
+    Config.TASK_INDEX_ENABLED = False
+    
+    print(f"Benchmarking {args.mode} workflows against {Config.OPENROUTER_BASE_URL}")
+    if mock is not None:
+        print(f"Mock: {args.latency} latency, mean {args.latency_mean}s, {args.tokens_per_second or 'instant'} tokens/s, "
+              f"429 rate {args.error_rate_429}, 5xx rate {args.error_rate_5xx}")
+    
+    report = []
+    try:
+        if args.warmup:
+            asyncio.run(run_level(1, args.warmup, args.mode, args.task))
+        for concurrency in levels:
+            workflows = args.workflows or max(8, 4 * concurrency)
+            if mock is not None:
+                mock.reset_stats()
+            print(f"  concurrency {concurrency}: {workflows} workflows...", flush=True)
+            run = asyncio.run(run_level(concurrency, workflows, args.mode, args.task))
+            report.append(summarize_level(concurrency, run, mock.stats() if mock is not None else None))
+    finally:
+        if mock is not None:
+            mock.stop()
+    
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"mode": args.mode, "base_url": Config.OPENROUTER_BASE_URL, "levels": report}, f, indent=2)
+        print(f"\nReport written to {args.json_path}")
+    return report
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,77 @@
+"""
+Checkpoint storage for resumable workflow runs
+
+The orchestrator saves its context, history and completed step results
+after every step so that a run failing late in the pipeline can resume from
+the last completed step instead of starting over.
+"""
+import json
+import logging
+import os
+import tempfile
+from datetime import datetime
+from typing import Dict, Any, Optional, List
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointStore:
+    """Stores one JSON checkpoint file per workflow run"""
+    
+    def __init__(self, directory: str):
+        """
+        Initialize checkpoint store
+        
+        Args:
+            directory: Directory holding <run_id>.json checkpoint files
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+    
+    def save(self, run_id: str, state: Dict[str, Any]):
+        """
+        Atomically write the checkpoint for a run
+        
+        Args:
+            run_id: Workflow run identifier
+            state: JSON-serializable run state
+        """
+        state = dict(state, run_id=run_id, updated_at=datetime.now().isoformat())
+        
+        # Write to a temp file and rename so a crash never leaves a torn checkpoint
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{run_id}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self._path(run_id))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    
+    def load(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Load the checkpoint for a run, or None if there is none"""
+        path = self._path(run_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+    
+    def delete(self, run_id: str):
+        """Remove the checkpoint for a run, if present"""
+        path = self._path(run_id)
+        if os.path.exists(path):
+            os.remove(path)
+    
+    def list_runs(self) -> List[str]:
+        """List run IDs that have a checkpoint"""
+        return sorted(
+            name[:-len(".json")] for name in os.listdir(self.directory)
+            if name.endswith(".json") and not name.startswith(".")
+        )
+    
+    def _path(self, run_id: str) -> str:
+        """Checkpoint file path for a run"""
+        if os.sep in run_id or (os.altsep and os.altsep in run_id) or run_id.startswith("."):
+            raise ValueError(f"Invalid run_id: {run_id}")
+        return os.path.join(self.directory, f"{run_id}.json")
@@ -2,26 +2,160 @@
 Configuration settings for AI Agent Workflow
 """
 import os
-from typing import Optional
+from typing import Optional, Dict, Any
 
 class Config:
     """Configuration class for agent system"""
     
     # OpenRouter API Configuration
     OPENROUTER_API_KEY: Optional[str] = os.getenv("OPENROUTER_API_KEY")
-    OPENROUTER_BASE_URL: str = "https://openrouter.ai/api/v1"
+    OPENROUTER_BASE_URL: str = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
     MODEL_NAME: str = "xiaomi/mimo-v2-flash:free"
     
     # API Settings
-    MAX_RETRIES: int = 3
+    MAX_RETRIES: int = int(os.getenv("MAX_RETRIES", "3"))
+    RETRY_BACKOFF_BASE: float = float(os.getenv("RETRY_BACKOFF_BASE", "1.0"))  # seconds, doubled per attempt
+    RETRY_BACKOFF_MAX: float = float(os.getenv("RETRY_BACKOFF_MAX", "30.0"))
+    RETRY_AFTER_MAX: float = float(os.getenv("RETRY_AFTER_MAX", "120.0"))  # cap on server Retry-After
     TIMEOUT: int = 60
     MAX_TOKENS: int = 4000
     TEMPERATURE: float = 0.7
     
+    # Model Routing: models tried in order when a call fails with 429, 5xx or a timeout.
+    # <AGENT>_MODEL, <AGENT>_TEMPERATURE, <AGENT>_MAX_TOKENS and <AGENT>_FALLBACK_MODELS
+    # override the defaults for one agent, AGENT being ORCHESTRATOR, PLANNING, RESEARCH,
+    # EXECUTION, QA, REFINEMENT or COMMUNICATION
+    FALLBACK_MODELS: str = os.getenv("FALLBACK_MODELS", "")  # comma-separated
+    
+    # Hedged Requests: duplicate a call that runs past the recent latency percentile
+    HEDGE_ENABLED: bool = os.getenv("HEDGE_ENABLED", "False").lower() == "true"
+    HEDGE_PERCENTILE: float = float(os.getenv("HEDGE_PERCENTILE", "95"))
+    HEDGE_MIN_SAMPLES: int = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+    HEDGE_MIN_DELAY: float = float(os.getenv("HEDGE_MIN_DELAY", "2.0"))
+    
+    # HTTP Connection Pool Settings (shared by all agents)
+    HTTP_POOL_CONNECTIONS: int = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))
+    HTTP_POOL_MAXSIZE: int = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+    HTTP_POOL_BLOCK: bool = os.getenv("HTTP_POOL_BLOCK", "False").lower() == "true"
+    HTTP2_ENABLED: bool = os.getenv("HTTP2_ENABLED", "False").lower() == "true"  # async client only, needs 'h2'
+    
+    # Prompt Budgets: estimated prompt tokens per agent; earlier step outputs are narrowed to the
+    # sections each agent needs and trimmed to fit. Off by default, since it changes what agents see
+    PROMPT_BUDGET_ENABLED: bool = os.getenv("PROMPT_BUDGET_ENABLED", "False").lower() == "true"
+    PROMPT_BUDGET_RESEARCH: int = int(os.getenv("PROMPT_BUDGET_RESEARCH", "3000"))
+    PROMPT_BUDGET_EXECUTION: int = int(os.getenv("PROMPT_BUDGET_EXECUTION", "6000"))
+    PROMPT_BUDGET_QA: int = int(os.getenv("PROMPT_BUDGET_QA", "6000"))
+    PROMPT_BUDGET_REFINEMENT: int = int(os.getenv("PROMPT_BUDGET_REFINEMENT", "7000"))
+    
+    # Research Fan-out: research each information need of the plan concurrently, then merge
+    RESEARCH_FANOUT: int = int(os.getenv("RESEARCH_FANOUT", "0"))  # concurrent sub-queries; below 2 disables
+    RESEARCH_MAX_SUBQUERIES: int = int(os.getenv("RESEARCH_MAX_SUBQUERIES", "6"))
+    RESEARCH_SUB_QUERY_PLAN_TOKENS: int = int(os.getenv("RESEARCH_SUB_QUERY_PLAN_TOKENS", "500"))
+    
+    # Refinement Gate: refine when the QA verdict counts enough issues at this severity or worse
+    QA_REFINE_SEVERITY: str = os.getenv("QA_REFINE_SEVERITY", "major")  # critical, major or minor
+    QA_REFINE_MIN_ISSUES: int = int(os.getenv("QA_REFINE_MIN_ISSUES", "1"))
+    
+    # Summary Digest: the summary step sees a capped outline/excerpt per step instead of the full context
+    SUMMARY_DIGEST_STEP_TOKENS: int = int(os.getenv("SUMMARY_DIGEST_STEP_TOKENS", "300"))
+    SUMMARY_DIGEST_INCREMENTAL: bool = os.getenv("SUMMARY_DIGEST_INCREMENTAL", "True").lower() == "true"
+    
+    # Client-side Rate Limiting (shared by all agents, threads and processes on this machine)
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "False").lower() == "true"
+    RATE_LIMIT_RPM: int = int(os.getenv("RATE_LIMIT_RPM", "20"))  # 0 disables the request bucket
+    RATE_LIMIT_TPM: int = int(os.getenv("RATE_LIMIT_TPM", "0"))  # 0 disables the token bucket
+    RATE_LIMIT_STATE_PATH: str = os.getenv("RATE_LIMIT_STATE_PATH", ".cache/rate_limit.sqlite3")
+    
+    # Run Budget: default wall-clock and token limits for a whole workflow run (0 = unlimited)
+    RUN_DEADLINE_SECONDS: float = float(os.getenv("RUN_DEADLINE_SECONDS", "0"))
+    RUN_MAX_TOKENS: int = int(os.getenv("RUN_MAX_TOKENS", "0"))
+    RUN_BUDGET_MIN_COMPLETION_TOKENS: int = int(os.getenv("RUN_BUDGET_MIN_COMPLETION_TOKENS", "256"))
+    
+    # LLM Response Cache
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "False").lower() == "true"
+    LLM_CACHE_PATH: str = os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite3")
+    LLM_CACHE_MAX_BYTES: int = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    LLM_CACHE_TTL: int = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+    LLM_CACHE_ALLOW_NONZERO_TEMPERATURE: bool = os.getenv("LLM_CACHE_ALLOW_NONZERO_TEMPERATURE", "False").lower() == "true"
+    
+    # Workflow Checkpointing
+    CHECKPOINT_ENABLED: bool = os.getenv("CHECKPOINT_ENABLED", "False").lower() == "true"
+    CHECKPOINT_DIR: str = os.getenv("CHECKPOINT_DIR", "checkpoints")
+    CHECKPOINT_KEEP_COMPLETED: bool = os.getenv("CHECKPOINT_KEEP_COMPLETED", "False").lower() == "true"
+    
+    # Result Format: "compact" stores each step output once in serialized results, "full" repeats it.
+    # RESULT_FORMAT applies to results saved to disk; API responses use API_RESULT_FORMAT unless
+    # the request asks for ?format=compact or ?format=full
+    RESULT_FORMAT: str = os.getenv("RESULT_FORMAT", "compact")
+    API_RESULT_FORMAT: str = os.getenv("API_RESULT_FORMAT", "full")
+    
+    # Results Store: "filesystem" (results/<id>.json plus index.json) or "sqlite" (indexed, compressed)
+    RESULTS_BACKEND: str = os.getenv("RESULTS_BACKEND", "filesystem")
+    RESULTS_DIR: str = os.getenv("RESULTS_DIR", "results")
+    RESULTS_DB_PATH: str = os.getenv("RESULTS_DB_PATH", "results/results.sqlite3")
+    # Most recently updated requests listed in results/manifest.json, which the Pages frontend polls
+    RESULTS_MANIFEST_MAX_ENTRIES: int = int(os.getenv("RESULTS_MANIFEST_MAX_ENTRIES", "500"))
+    
+    # Task Index: near-duplicate matching of new tasks against completed runs (local MinHash/LSH).
+    # Off by default, since it keeps a copy of every completed run's results
+    TASK_INDEX_ENABLED: bool = os.getenv("TASK_INDEX_ENABLED", "False").lower() == "true"
+    TASK_INDEX_PATH: str = os.getenv("TASK_INDEX_PATH", ".cache/task_index.sqlite3")
+    TASK_INDEX_NUM_PERM: int = int(os.getenv("TASK_INDEX_NUM_PERM", "128"))
+    TASK_INDEX_BANDS: int = int(os.getenv("TASK_INDEX_BANDS", "32"))
+    TASK_INDEX_MAX_ENTRIES: int = int(os.getenv("TASK_INDEX_MAX_ENTRIES", "10000"))
+    # "off", "seed" (reuse a close match's plan and research) or "result" (return a
+    # near-identical match's results, else seed)
+    TASK_REUSE_MODE: str = os.getenv("TASK_REUSE_MODE", "off")
+    TASK_REUSE_RESULT_THRESHOLD: float = float(os.getenv("TASK_REUSE_RESULT_THRESHOLD", "0.9"))
+    TASK_REUSE_SEED_THRESHOLD: float = float(os.getenv("TASK_REUSE_SEED_THRESHOLD", "0.7"))
+    TASK_REUSE_SEED_STEPS: str = os.getenv("TASK_REUSE_SEED_STEPS", "step1_plan,step2_research")
+    
+    # Tracing: span tree of each run (steps, agent calls, prompt build, HTTP wait, parse).
+    # TRACE_EXPORTERS is comma-separated: "chrome" writes <TRACE_DIR>/<run_id>.json (Chrome
+    # trace-event JSON for chrome://tracing or ui.perfetto.dev), "otlp" posts OTLP/HTTP JSON
+    TRACE_ENABLED: bool = os.getenv("TRACE_ENABLED", "False").lower() == "true"
+    TRACE_EXPORTERS: str = os.getenv("TRACE_EXPORTERS", "chrome")
+    TRACE_DIR: str = os.getenv("TRACE_DIR", "traces")
+    TRACE_OTLP_ENDPOINT: str = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+    TRACE_SERVICE_NAME: str = os.getenv("TRACE_SERVICE_NAME", "testing-agents")
+    
+    # Batch Mode
+    BATCH_WORKERS: int = int(os.getenv("BATCH_WORKERS", "4"))
+    
+    # Background Job Queue (/api/jobs)
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "4"))
+    JOB_QUEUE_SIZE: int = int(os.getenv("JOB_QUEUE_SIZE", "20"))
+    JOB_RETENTION: int = int(os.getenv("JOB_RETENTION", "1000"))
+    STREAM_KEEPALIVE_SECONDS: float = float(os.getenv("STREAM_KEEPALIVE_SECONDS", "15"))  # SSE comment while idle
+    
     # Agent Settings
     ENABLE_LOGGING: bool = True
     LOG_LEVEL: str = "INFO"
     
+    @classmethod
+    def agent_settings(cls, agent_key: Optional[str]) -> Dict[str, Any]:
+        """
+        Resolve the model settings of one agent
+        
+        Args:
+            agent_key: Agent prefix of the override variables, e.g. "PLANNING"
+        
+        Returns:
+            Dict with model, temperature, max_tokens and fallback_models
+        """
+        def override(name: str) -> Optional[str]:
+            return os.getenv(f"{agent_key}_{name}") if agent_key else None
+        
+        fallbacks = override("FALLBACK_MODELS")
+        if fallbacks is None:
+            fallbacks = cls.FALLBACK_MODELS
+        return {
+            "model": override("MODEL") or cls.MODEL_NAME,
+            "temperature": float(override("TEMPERATURE") or cls.TEMPERATURE),
+            "max_tokens": int(override("MAX_TOKENS") or cls.MAX_TOKENS),
+            "fallback_models": [model.strip() for model in fallbacks.split(",") if model.strip()]
+        }
+    
     @classmethod
     def validate(cls) -> bool:
         """Validate configuration"""
@@ -0,0 +1,182 @@
+"""
+Dependency-graph scheduler for workflow steps
+
+A workflow is a list of DagNode objects, each declaring the artifacts it
+reads (inputs) and writes (outputs). A node depends on the nodes producing
+its inputs and starts as soon as they have finished, so independent nodes
+run concurrently on the event loop. After the run the scheduler reports
+per-node timings and the critical path, the chain of dependent nodes that
+bounded the total wall time.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Iterable, Set
+
+logger = logging.getLogger(__name__)
+
+
+class DagNode:
+    """One schedulable step of a workflow graph"""
+    
+    def __init__(self, name: str, run: Callable[[], Awaitable[Any]],
+                 inputs: Iterable[str] = (), outputs: Iterable[str] = (),
+                 condition: Optional[Callable[[], bool]] = None,
+                 skip: Optional[Callable[[], Awaitable[Any]]] = None):
+        """
+        Initialize node
+        
+        Args:
+            name: Unique node name
+            run: Coroutine function executing the node; its return value is the node result
+            inputs: Artifacts the node reads; each must be an initial artifact or another node's output
+            outputs: Artifacts the node writes
+            condition: Optional check made when the node becomes ready; if it
+                returns False the node is skipped
+            skip: Optional coroutine function run instead of ``run`` when the
+                node is skipped (e.g. to record a placeholder result)
+        """
+        self.name = name
+        self.run = run
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.condition = condition
+        self.skip = skip
+
+
+class DagScheduler:
+    """Runs a graph of DagNodes with maximal concurrency"""
+    
+    def __init__(self, nodes: List[DagNode], initial_artifacts: Iterable[str] = ()):
+        """
+        Initialize scheduler and resolve node dependencies
+        
+        Args:
+            nodes: Graph nodes
+            initial_artifacts: Artifacts available before any node runs
+        
+        Raises:
+            ValueError: On duplicate names, missing inputs or dependency cycles
+        """
+        self.nodes = {node.name: node for node in nodes}
+        if len(self.nodes) != len(nodes):
+            raise ValueError("Workflow graph has duplicate node names")
+        
+        producers: Dict[str, str] = {}
+        for node in nodes:
+            for artifact in node.outputs:
+                if artifact in producers:
+                    raise ValueError(f"Artifact '{artifact}' is produced by both {producers[artifact]} and {node.name}")
+                producers[artifact] = node.name
+        
+        initial = set(initial_artifacts)
+        self.dependencies: Dict[str, Set[str]] = {}
+        for node in nodes:
+            missing = [artifact for artifact in node.inputs if artifact not in producers and artifact not in initial]
+            if missing:
+                raise ValueError(f"Node {node.name} needs inputs nobody produces: {', '.join(missing)}")
+            self.dependencies[node.name] = {producers[artifact] for artifact in node.inputs if artifact in producers}
+        
+        self._check_acyclic()
+    
+    async def run(self) -> Dict[str, Any]:
+        """
+        Execute every node once its dependencies have finished
+        
+        The first node failure cancels the nodes still running and is re-raised.
+        
+        Returns:
+            Dict with "results" (node name to result) and "schedule" (timing report)
+        """
+        pending = dict(self.nodes)
+        running: Dict[asyncio.Task, str] = {}
+        finished: Set[str] = set()
+        results: Dict[str, Any] = {}
+        timings: Dict[str, Dict[str, Any]] = {}
+        order: List[str] = []
+        started = time.monotonic()
+        
+        try:
+            while pending or running:
+                for name in [name for name in pending if self.dependencies[name] <= finished]:
+                    node = pending.pop(name)
+                    skipped = node.condition is not None and not node.condition()
+                    timings[name] = {"status": "skipped" if skipped else "completed", "start": time.monotonic() - started}
+                    running[asyncio.create_task(self._run_node(node, skipped))] = name
+                
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = running.pop(task)
+                    results[name] = task.result()
+                    timings[name]["end"] = time.monotonic() - started
+                    finished.add(name)
+                    order.append(name)
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+        
+        return {"results": results, "schedule": self._schedule_report(timings, order, time.monotonic() - started)}
+    
+    async def _run_node(self, node: DagNode, skipped: bool) -> Any:
+        """Run a node, or its skip handler when its condition failed"""
+        if not skipped:
+            return await node.run()
+        logger.info(f"Skipping {node.name}: condition not met")
+        return await node.skip() if node.skip else None
+    
+    def _schedule_report(self, timings: Dict[str, Dict[str, Any]], order: List[str], wall_seconds: float) -> Dict[str, Any]:
+        """
+        Summarize node timings and find the critical path
+        
+        Args:
+            timings: Per-node status, start and end offsets in seconds
+            order: Node names in completion order (a topological order)
+            wall_seconds: Total run time
+        
+        Returns:
+            Report with wall time, summed node time, critical path and per-node timings
+        """
+        longest: Dict[str, float] = {}
+        previous: Dict[str, Optional[str]] = {}
+        for name in order:
+            duration = timings[name]["end"] - timings[name]["start"]
+            predecessor = max(self.dependencies[name], key=lambda dep: longest[dep], default=None)
+            longest[name] = duration + (longest[predecessor] if predecessor else 0.0)
+            previous[name] = predecessor
+        
+        path: List[str] = []
+        node = max(longest, key=longest.get, default=None)
+        while node is not None:
+            path.append(node)
+            node = previous[node]
+        path.reverse()
+        
+        return {
+            "wall_seconds": round(wall_seconds, 3),
+            "sum_seconds": round(sum(timing["end"] - timing["start"] for timing in timings.values()), 3),
+            "critical_path": path,
+            "critical_path_seconds": round(longest[path[-1]], 3) if path else 0.0,
+            "nodes": {
+                name: {
+                    "status": timing["status"],
+                    "start": round(timing["start"], 3),
+                    "end": round(timing["end"], 3),
+                    "seconds": round(timing["end"] - timing["start"], 3)
+                }
+                for name, timing in timings.items()
+            }
+        }
+    
+    def _check_acyclic(self):
+        """Raise ValueError if the dependencies contain a cycle"""
+        resolved: Set[str] = set()
+        remaining = dict(self.dependencies)
+        while remaining:
+            ready = [name for name, deps in remaining.items() if deps <= resolved]
+            if not ready:
+                raise ValueError(f"Workflow graph has a dependency cycle among: {', '.join(sorted(remaining))}")
+            for name in ready:
+                resolved.add(name)
+                del remaining[name]
@@ -0,0 +1,103 @@
+"""
+Compact workflow digest used as input for the final summary
+
+Instead of the full workflow context, the summary step receives a digest
+holding, per step, the outline of its output (headings) and a short excerpt
+of the sections that matter for a summary: objectives, key insights,
+decisions and the QA verdict. Every entry is capped, so the summary prompt
+stays small and roughly constant no matter how long the step outputs or how
+many refinement rounds ran.
+"""
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from config import Config
+from prompt_budget import output_text, extract_section, list_headings, trim_to_tokens
+
+# (step key, workflow_context key, title, result text keys, sections excerpted)
+DIGEST_STEPS = (
+    ("step1_plan", "plan", "Plan", ("plan",), ("OBJECTIVES", "SUCCESS CRITERIA")),
+    ("step2_research", "research", "Research", ("research",), ("KEY INSIGHTS", "INFORMATION GAPS")),
+    ("step3_execution", "deliverables", "Execution", ("deliverables",), ("DECISIONS", "PROGRESS")),
+    ("step4_review", "review", "Review", ("review",), ("VALIDATION", "OVERALL ASSESSMENT")),
+    ("step5_refinement", "refined_deliverables", "Refinement", ("refined_deliverables", "result"), ("LESSONS",)),
+    ("final_review", None, "Final Review", ("review",), ("VALIDATION", "OVERALL ASSESSMENT"))
+)
+
+# Headings listed per step in the outline
+MAX_OUTLINE_HEADINGS = 12
+
+
+class WorkflowDigest:
+    """Per-step outline and key excerpts of a workflow run"""
+    
+    def __init__(self, task: str, step_tokens: Optional[int] = None):
+        """
+        Initialize digest
+        
+        Args:
+            task: Task description
+            step_tokens: Estimated token cap per step entry (and for the task)
+        """
+        self.step_tokens = step_tokens or Config.SUMMARY_DIGEST_STEP_TOKENS
+        self.task, _ = trim_to_tokens(task, self.step_tokens)
+        self.entries: "OrderedDict[str, str]" = OrderedDict()
+    
+    def add_step(self, key: str, output: Any):
+        """
+        Add or replace the entry for a finished step
+        
+        Args:
+            key: Step key, e.g. "step1_plan"
+            output: The step's output (agent output dict, result dict or text)
+        """
+        spec = _STEP_SPECS.get(key)
+        if spec is None:
+            return
+        _, _, _, text_keys, sections = spec
+        
+        text = output_text(output, *text_keys)
+        if not text:
+            return
+        
+        headings = list_headings(text)
+        outline = "; ".join(headings[:MAX_OUTLINE_HEADINGS])
+        if len(headings) > MAX_OUTLINE_HEADINGS:
+            outline += f"; (+{len(headings) - MAX_OUTLINE_HEADINGS} more)"
+        excerpt = extract_section(text, *sections) or text
+        
+        entry = f"Outline: {outline}\n{excerpt}" if outline else excerpt
+        result = output.get("result", output) if isinstance(output, dict) else None
+        verdict = result.get("verdict") if isinstance(result, dict) else None
+        if isinstance(verdict, dict) and verdict.get("issues"):
+            counts = ", ".join(f"{count} {severity}" for severity, count in verdict["issues"].items())
+            entry = f"Verdict: {'ready' if verdict.get('ready') else 'needs work'} ({counts})\n{entry}"
+        self.entries[key], _ = trim_to_tokens(entry, self.step_tokens)
+    
+    def render(self) -> str:
+        """Render the digest as prompt text, steps in workflow order"""
+        parts = [f"Task: {self.task}"]
+        for key, _, title, _, _ in DIGEST_STEPS:
+            if key in self.entries:
+                parts.append(f"### {title}\n{self.entries[key]}")
+        return "\n\n".join(parts)
+    
+    @classmethod
+    def from_steps(cls, task: str, step_results: Dict[str, Any]) -> "WorkflowDigest":
+        """Build a digest from step results keyed by step key"""
+        digest = cls(task)
+        for key, output in step_results.items():
+            digest.add_step(key, output)
+        return digest
+    
+    @classmethod
+    def from_context(cls, workflow_context: Dict[str, Any]) -> "WorkflowDigest":
+        """Build a digest from a workflow_context dict (plan, research, deliverables, ...)"""
+        digest = cls(str(workflow_context.get("task", "")))
+        for key, context_key, _, _, _ in DIGEST_STEPS:
+            if context_key and workflow_context.get(context_key):
+                digest.add_step(key, workflow_context[context_key])
+        return digest
+
+
+_STEP_SPECS = {spec[0]: spec for spec in DIGEST_STEPS}
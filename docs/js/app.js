@@ -3,8 +3,9 @@
 // Configuration - GitHub Pages version
 const GITHUB_REPO = window.GITHUB_REPO || 'your-username/your-repo';
 const GITHUB_TOKEN = localStorage.getItem('github_token') || '';
-const POLL_INTERVAL = 3000; // 3 seconds
-const MAX_POLL_ATTEMPTS = 60; // 2 minutes total
+const POLL_INTERVAL = 3000; // first poll delay: 3 seconds
+const MAX_POLL_INTERVAL = 30000; // backoff cap: 30 seconds
+const POLL_TIMEOUT = 10 * 60 * 1000; // give up after 10 minutes
 
 // State management
 let currentResults = null;
@@ -169,42 +170,60 @@ async function triggerWorkflow(task) {
 }
 
 // Poll for results
+// Polls the single results/manifest.json (request ID -> status, size, digest)
+// instead of one status and one result file per request. cache: 'no-cache'
+// makes the browser revalidate with If-None-Match, so an unchanged manifest
+// costs a 304; its ETag is compared to skip parsing it again. Delays back off
+// exponentially with jitter. The result file is fetched when the manifest
+// reports the request finished, keyed by its digest; the manifest's ETag is
+// only remembered once there is nothing left to fetch, so a result that is
+// not on the CDN yet is retried on the next poll.
 async function pollForResults(requestId) {
     const [owner, repo] = GITHUB_REPO.split('/');
-    const resultUrl = `https://raw.githubusercontent.com/${owner}/${repo}/main/results/${requestId}.json`;
-    const statusUrl = `https://raw.githubusercontent.com/${owner}/${repo}/main/results/${requestId}.status.json`;
+    const resultsBase = `https://raw.githubusercontent.com/${owner}/${repo}/main/results`;
+    const manifestUrl = `${resultsBase}/manifest.json`;
+    const startedAt = Date.now();
     
-    let attempts = 0;
+    let delay = POLL_INTERVAL;
+    let lastTag = null;
+    let resultAttempts = 0;
     
     return new Promise((resolve, reject) => {
-        pollInterval = setInterval(async () => {
-            attempts++;
-            
+        const poll = async () => {
             try {
-                // Check status first
-                const statusResponse = await fetch(statusUrl, { cache: 'no-cache' });
-                if (statusResponse.ok) {
-                    const status = await statusResponse.json();
-                    updateWorkflowStatus(status);
-                }
-                
-                // Check for results
-                const resultResponse = await fetch(resultUrl, { cache: 'no-cache' });
-                if (resultResponse.ok) {
-                    const data = await resultResponse.json();
-                    clearInterval(pollInterval);
-                    resolve(data);
-                    return;
+                const response = await fetch(manifestUrl, { cache: 'no-cache' });
+                const tag = response.headers.get('ETag');
+                if (response.ok && (!tag || tag !== lastTag)) {
+                    const manifest = await response.json();
+                    const entry = (manifest.results || {})[requestId];
+                    if (entry) {
+                        updateWorkflowStatus(entry);
+                    }
+                    if (entry && ['completed', 'failed', 'cancelled'].includes(entry.status)) {
+                        resultAttempts += 1;
+                        const resultResponse = await fetch(`${resultsBase}/${requestId}.json?v=${entry.digest || Date.now()}&attempt=${resultAttempts}`);
+                        if (resultResponse.ok) {
+                            resolve(await resultResponse.json());
+                            return;
+                        }
+                        console.warn(`Result for ${requestId} not available yet (HTTP ${resultResponse.status}), retrying`);
+                    } else {
+                        lastTag = tag;
+                    }
                 }
             } catch (error) {
                 console.error('Polling error:', error);
             }
             
-            if (attempts >= MAX_POLL_ATTEMPTS) {
-                clearInterval(pollInterval);
+            if (Date.now() - startedAt >= POLL_TIMEOUT) {
                 reject(new Error('Timeout waiting for results. The workflow may still be running.'));
+                return;
             }
-        }, POLL_INTERVAL);
+            
+            delay = Math.min(delay * 1.5, MAX_POLL_INTERVAL);
+            pollInterval = setTimeout(poll, delay * (0.8 + Math.random() * 0.4));
+        };
+        pollInterval = setTimeout(poll, POLL_INTERVAL);
     });
 }
 
@@ -285,8 +304,8 @@ async function handleFormSubmit(e) {
         const data = await pollForResults(currentRequestId);
         
         if (data.success) {
-            currentResults = data.results;
-            displayResults(data.results);
+            currentResults = expandResults(data.results);
+            displayResults(currentResults);
             if (statusMsg) {
                 statusMsg.textContent = 'Workflow completed successfully!';
                 setTimeout(() => statusMsg.style.display = 'none', 3000);
@@ -308,11 +327,56 @@ async function handleFormSubmit(e) {
         }
         
         if (pollInterval) {
-            clearInterval(pollInterval);
+            clearTimeout(pollInterval);
         }
     }
 }
 
+// Rebuild the full results shape from the compact format ("compact/1"), where
+// each step output is stored once in results.bodies and referenced by ID from
+// steps, workflow_context and history. Other results are returned unchanged.
+function expandResults(results) {
+    if (!results || results.format !== 'compact/1') {
+        return results;
+    }
+    
+    const bodies = results.bodies || {};
+    const expanded = Object.assign({}, results);
+    delete expanded.format;
+    delete expanded.bodies;
+    
+    if (results.steps) {
+        expanded.steps = {};
+        Object.keys(results.steps).forEach(name => {
+            expanded.steps[name] = bodies[results.steps[name]];
+        });
+    }
+    
+    if (results.history) {
+        expanded.history = results.history.map(entry => {
+            const copy = Object.assign({}, entry);
+            copy.result = bodies[entry.ref];
+            delete copy.ref;
+            return copy;
+        });
+    }
+    
+    if (results.workflow_context) {
+        expanded.workflow_context = {};
+        Object.keys(results.workflow_context).forEach(key => {
+            const value = results.workflow_context[key];
+            if (value && typeof value === 'object' && '$ref' in value) {
+                const target = bodies[value.$ref];
+                expanded.workflow_context[key] = value.$path && target ? target[value.$path] : target;
+            } else {
+                expanded.workflow_context[key] = value;
+            }
+        });
+    }
+    
+    return expanded;
+}
+
 // Display results
 function displayResults(results) {
     // Mark all steps as completed
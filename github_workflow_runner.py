@@ -2,12 +2,111 @@
 """
 GitHub Actions workflow runner script
 Executes the AI workflow and saves results
+
+One job can run several requests concurrently, sharing the checkout and
+dependency install. Requests come from the triggering event:
+
+- workflow_dispatch inputs or repository_dispatch client_payload with a
+  single ``task`` and ``request_id``
+- client_payload ``requests``: a list of {"task", "request_id", "context"}
+- a ``queue_file`` (event input/payload or RUNNER_QUEUE_FILE): a JSONL file
+  in batch format that is drained; processed lines are removed from it.
+  It must be a path inside the repository checkout
 """
+import asyncio
 import json
 import os
 import sys
 from datetime import datetime
-from workflow import WorkflowOrchestrator
+from typing import Dict, Any, List, Optional, Tuple, Set
+from config import Config
+from batch import iter_batch_tasks, run_tasks
+from results_store import get_results_store
+
+# Queue files must live inside the checkout the runner was started from
+REPO_ROOT = os.path.dirname(os.path.realpath(__file__))
+
+
+def resolve_queue_file(path: str) -> Optional[str]:
+    """
+    Resolve a queue file path from an event, refusing anything outside the repository or in .git
+    
+    Returns:
+        Absolute path, or None if it points outside the repository
+    """
+    resolved = os.path.realpath(os.path.join(REPO_ROOT, path))
+    if resolved == REPO_ROOT or os.path.commonpath([resolved, REPO_ROOT]) != REPO_ROOT:
+        return None
+    if ".git" in os.path.relpath(resolved, REPO_ROOT).split(os.sep):
+        return None
+    return resolved
+
+
+def requests_from_event(event: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Collect the requests to run from a GitHub event
+    
+    Returns:
+        Tuple of (request items with request_id, task and context, queue file path or None)
+    """
+    payload = dict(event.get('client_payload') or {})
+    # workflow_dispatch inputs take precedence over repository_dispatch payload fields
+    payload.update({key: value for key, value in (event.get('inputs') or {}).items() if value})
+    
+    items = []
+    for request in payload.get('requests') or []:
+        if request.get('task') and request.get('request_id'):
+            items.append({
+                'request_id': str(request['request_id']),
+                'task': request['task'],
+                'context': request.get('context') or {}
+            })
+        else:
+            print(f"Skipping request without task or request_id: {json.dumps(request)[:200]}")
+    
+    if payload.get('task') and payload.get('request_id'):
+        items.append({
+            'request_id': str(payload['request_id']),
+            'task': payload['task'],
+            'context': payload.get('context') or {}
+        })
+    
+    queue_file = payload.get('queue_file') or os.environ.get('RUNNER_QUEUE_FILE') or None
+    if queue_file:
+        resolved = resolve_queue_file(queue_file)
+        if resolved is None:
+            print(f"Refusing queue file outside the repository: {queue_file}")
+        queue_file = resolved
+    
+    if queue_file and os.path.exists(queue_file):
+        items.extend(iter_batch_tasks(queue_file))
+    elif queue_file:
+        print(f"Queue file {queue_file} not found; nothing queued")
+        queue_file = None
+    
+    return items, queue_file
+
+
+def drain_queue(queue_file: str, processed: Set[str]):
+    """Remove the lines of processed requests from a queue file, keeping the rest"""
+    kept = []
+    with open(queue_file, 'r') as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                kept.append(line)
+                continue
+            request_id = str(record.get('request_id') or record.get('id') or f"line-{line_number}")
+            if request_id not in processed:
+                kept.append(line)
+    
+    with open(queue_file, 'w') as f:
+        f.writelines(line if line.endswith('\n') else line + '\n' for line in kept)
+    print(f"Drained {queue_file}: {len(kept)} request(s) left")
+
 
 def main():
     # Get event path (GitHub Actions provides this)
@@ -21,91 +120,57 @@ def main():
     with open(event_path, 'r') as f:
         event = json.load(f)
     
-    # Extract task and request_id
-    task = None
-    request_id = None
-    
-    # Try workflow_dispatch inputs first
-    if 'inputs' in event:
-        task = event['inputs'].get('task', '')
-        request_id = event['inputs'].get('request_id', '')
-    
-    # Try repository_dispatch client_payload
-    if not task and 'client_payload' in event:
-        task = event['client_payload'].get('task', '')
-        request_id = event['client_payload'].get('request_id', '')
+    items, queue_file = requests_from_event(event)
     
-    if not task or not request_id:
-        print("Error: Missing task or request_id in event")
+    if not items:
+        print("Error: No requests in event (need task and request_id, requests or queue_file)")
         print(f"Event data: {json.dumps(event, indent=2)}")
         sys.exit(1)
     
-    print(f"Executing workflow for request: {request_id}")
-    print(f"Task: {task}")
+    store = get_results_store()
+    # Queued requests that already completed (e.g. in an earlier, interrupted job) are not rerun
+    finished = {entry['request_id'] for entry in store.list_results(status='completed')} if queue_file else set()
+    processed: Set[str] = set()
     
-    # Create results directory
-    os.makedirs('results', exist_ok=True)
+    def on_start(item: Dict[str, Any]):
+        print(f"Executing workflow for request: {item['request_id']}")
+        print(f"Task: {item['task']}")
+        store.save_status(item['request_id'], 'running', task=item['task'], started_at=datetime.now().isoformat())
     
-    try:
-        # Save initial status
-        status_file = f'results/{request_id}.status.json'
-        with open(status_file, 'w') as f:
-            json.dump({
-                'status': 'running',
-                'request_id': request_id,
-                'started_at': datetime.now().isoformat(),
-                'task': task
-            }, f, indent=2)
-        
-        # Execute workflow
-        orchestrator = WorkflowOrchestrator()
-        results = orchestrator.execute_workflow(task, {})
+    def on_result(record: Dict[str, Any]):
+        request_id = record['request_id']
+        processed.add(request_id)
         
-        # Save results
-        result_file = f'results/{request_id}.json'
-        with open(result_file, 'w') as f:
-            json.dump({
+        if record['status'] == 'completed':
+            store.save_result(request_id, {
                 'success': True,
                 'request_id': request_id,
-                'completed_at': datetime.now().isoformat(),
-                'results': results
-            }, f, indent=2)
-        
-        # Update status
-        with open(status_file, 'w') as f:
-            json.dump({
-                'status': 'completed',
-                'request_id': request_id,
-                'completed_at': datetime.now().isoformat()
-            }, f, indent=2)
-        
-        print(f"Workflow completed successfully. Results saved to {result_file}")
-        
-    except Exception as e:
-        import traceback
-        error_msg = str(e)
-        traceback.print_exc()
-        
-        # Save error
-        error_file = f'results/{request_id}.json'
-        with open(error_file, 'w') as f:
-            json.dump({
+                'completed_at': record['completed_at'],
+                'results': record['results']
+            })
+            store.save_status(request_id, 'completed', completed_at=record['completed_at'])
+            print(f"Workflow {request_id} completed in {record['duration_seconds']}s")
+        else:
+            error_msg = record.get('error') or 'Workflow failed'
+            store.save_result(request_id, {
                 'success': False,
                 'request_id': request_id,
                 'error': error_msg,
-                'completed_at': datetime.now().isoformat()
-            }, f, indent=2)
-        
-        status_file = f'results/{request_id}.status.json'
-        with open(status_file, 'w') as f:
-            json.dump({
-                'status': 'failed',
-                'request_id': request_id,
-                'error': error_msg,
-                'completed_at': datetime.now().isoformat()
-            }, f, indent=2)
-        
-        print(f"Error: {error_msg}")
+                'completed_at': record['completed_at'],
+                'results': record['results']
+            })
+            store.save_status(request_id, 'failed', error=error_msg, completed_at=record['completed_at'])
+            print(f"Error in {request_id}: {error_msg}")
+    
+    print(f"Running {len(items)} request(s) with up to {Config.BATCH_WORKERS} at once")
+    counts = asyncio.run(run_tasks(items, Config.BATCH_WORKERS, on_result, on_start=on_start, finished=finished))
+    print(f"Completed: {counts['completed']}  Failed: {counts['failed']}  "
+          f"Skipped (already done): {counts['skipped']}  Elapsed: {counts['elapsed_seconds']}s")
+    
+    if queue_file:
+        drain_queue(queue_file, processed | finished)
+    
+    if counts['failed']:
         sys.exit(1)
 
 if __name__ == '__main__':
@@ -0,0 +1,111 @@
+"""
+Shared HTTP client layer for OpenRouter API calls
+
+All agents share one keep-alive connection pool per process so that the
+LLM calls of a workflow (and of concurrent workflows) reuse TCP/TLS
+connections instead of paying a fresh handshake on every request.
+
+The async path uses one httpx.AsyncClient per event loop, with optional
+HTTP/2 multiplexing when the ``h2`` package is installed.
+"""
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def get_session() -> requests.Session:
+    """
+    Get the process-wide pooled session, creating it on first use
+
+    Returns:
+        Shared requests session with a keep-alive connection pool
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _create_session()
+    return _session
+
+
+def close_session():
+    """Close the shared session and release its pooled connections"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def _create_session() -> requests.Session:
+    """Create a session with a connection pool sized from Config"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=Config.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=Config.HTTP_POOL_MAXSIZE,
+        pool_block=Config.HTTP_POOL_BLOCK
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    logger.info(
+        f"Created shared HTTP session (pool_connections={Config.HTTP_POOL_CONNECTIONS}, "
+        f"pool_maxsize={Config.HTTP_POOL_MAXSIZE})"
+    )
+    return session
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Get the pooled async client for the running event loop
+    
+    httpx clients are bound to the loop they were first used on, so one
+    client is kept per loop and shared by every coroutine running on it.
+    
+    Returns:
+        Shared httpx async client for the current loop
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = _create_async_client()
+        _async_clients[loop] = client
+    return client
+
+
+async def aclose_async_client():
+    """Close the async client of the running event loop, if any"""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def _create_async_client() -> httpx.AsyncClient:
+    """Create an async client with limits sized from Config"""
+    http2 = Config.HTTP2_ENABLED
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("HTTP2_ENABLED is set but the 'h2' package is not installed; using HTTP/1.1")
+            http2 = False
+    
+    limits = httpx.Limits(
+        max_connections=Config.HTTP_POOL_MAXSIZE,
+        max_keepalive_connections=Config.HTTP_POOL_MAXSIZE
+    )
+    logger.info(f"Created async HTTP client (max_connections={Config.HTTP_POOL_MAXSIZE}, http2={http2})")
+    return httpx.AsyncClient(limits=limits, http2=http2)
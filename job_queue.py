@@ -0,0 +1,187 @@
+"""
+Bounded background job queue for long-running workflow executions
+
+Jobs run on a fixed-size thread pool so workflow executions never hold web
+request threads. Admission control rejects new jobs once the number waiting
+to start reaches a limit, with an estimate of when to retry.
+"""
+import logging
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+    
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class JobQueue:
+    """Thread-pool backed job queue with a bounded backlog"""
+    
+    def __init__(self, max_workers: int, max_queued: int, retention: int = 1000):
+        """
+        Initialize job queue
+        
+        Args:
+            max_workers: Jobs executed concurrently
+            max_queued: Jobs allowed to wait for a worker before submissions are rejected
+            retention: Finished jobs kept for polling before the oldest are dropped
+        """
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.retention = retention
+        
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="workflow-job")
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._queued = 0
+        self._running = 0
+        self._rejected = 0
+        self._recent_waits: deque = deque(maxlen=100)
+        self._recent_runs: deque = deque(maxlen=100)
+    
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Dict[str, Any]:
+        """
+        Queue a job for background execution
+        
+        Args:
+            fn: Callable run on a worker thread; its return value becomes the job result
+        
+        Returns:
+            Snapshot of the queued job
+        
+        Raises:
+            QueueFullError: If max_queued jobs are already waiting
+        """
+        with self._lock:
+            if self._queued >= self.max_queued:
+                self._rejected += 1
+                raise QueueFullError(
+                    f"Job queue is full ({self._queued} jobs waiting)", self._estimate_retry_after()
+                )
+            
+            job_id = uuid.uuid4().hex
+            job = {
+                "job_id": job_id,
+                "status": "queued",
+                "submitted_at": datetime.now().isoformat(),
+                "started_at": None,
+                "completed_at": None,
+                "wait_seconds": None,
+                "run_seconds": None,
+                "result": None,
+                "error": None,
+                "_submitted": time.monotonic(),
+                "_done": threading.Event()
+            }
+            self._jobs[job_id] = job
+            self._queued += 1
+        
+        self._executor.submit(self._run, job, fn, args)
+        return self._snapshot(job)
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a snapshot of a job, or None if unknown or expired"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job else None
+    
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Block until a job has finished
+        
+        Args:
+            job_id: Job to wait for
+            timeout: Maximum seconds to wait (None waits indefinitely)
+        
+        Returns:
+            Snapshot of the job (still queued or running if the timeout expired),
+            or None if unknown or expired
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        job["_done"].wait(timeout)
+        with self._lock:
+            return self._snapshot(job)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get queue depth, utilization and wait-time statistics"""
+        with self._lock:
+            now = time.monotonic()
+            waiting = [now - job["_submitted"] for job in self._jobs.values() if job["status"] == "queued"]
+            waits = list(self._recent_waits)
+            return {
+                "workers": self.max_workers,
+                "running": self._running,
+                "queued": self._queued,
+                "max_queued": self.max_queued,
+                "rejected": self._rejected,
+                "oldest_wait_seconds": round(max(waiting), 3) if waiting else 0.0,
+                "avg_wait_seconds": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "max_wait_seconds": round(max(waits), 3) if waits else 0.0
+            }
+    
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work and optionally wait for running jobs"""
+        self._executor.shutdown(wait=wait)
+    
+    def _run(self, job: Dict[str, Any], fn: Callable[..., Any], args: tuple):
+        """Execute a job on a worker thread and record its outcome"""
+        started = time.monotonic()
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            job["status"] = "running"
+            job["started_at"] = datetime.now().isoformat()
+            job["wait_seconds"] = round(started - job["_submitted"], 3)
+            self._recent_waits.append(started - job["_submitted"])
+        
+        try:
+            result = fn(*args)
+            status, error = "completed", None
+        except Exception as e:
+            logger.error(f"Job {job['job_id']} failed: {str(e)}", exc_info=True)
+            result, status, error = None, "failed", str(e)
+        
+        finished = time.monotonic()
+        with self._lock:
+            self._running -= 1
+            job["status"] = status
+            job["result"] = result
+            job["error"] = error
+            job["completed_at"] = datetime.now().isoformat()
+            job["run_seconds"] = round(finished - started, 3)
+            self._recent_runs.append(finished - started)
+            self._prune()
+        job["_done"].set()
+    
+    def _prune(self):
+        """Drop the oldest finished jobs beyond the retention limit"""
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] in ("completed", "failed")]
+        for job_id in finished[:max(0, len(finished) - self.retention)]:
+            del self._jobs[job_id]
+    
+    def _estimate_retry_after(self) -> int:
+        """Seconds until a queue slot is likely to free up, from recent run times"""
+        if not self._recent_runs:
+            return 30
+        avg_run = sum(self._recent_runs) / len(self._recent_runs)
+        return max(1, math.ceil(avg_run / self.max_workers))
+    
+    @staticmethod
+    def _snapshot(job: Dict[str, Any]) -> Dict[str, Any]:
+        """Public copy of a job without internal bookkeeping fields"""
+        return {key: value for key, value in job.items() if not key.startswith("_")}
@@ -0,0 +1,200 @@
+"""
+Persistent content-addressed cache for LLM responses
+
+Responses are stored in a SQLite file keyed by a hash of the request
+(model, messages, temperature and max_tokens). Entries expire after a TTL
+and the least recently used entries are evicted once the total stored size
+exceeds a limit. The file can be shared by several processes.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Iterator
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_cache: Optional["LLMCache"] = None
+_cache_lock = threading.Lock()
+
+
+class LLMCache:
+    """SQLite-backed LLM response cache with TTL and LRU-by-size eviction"""
+    
+    def __init__(self, path: str, max_bytes: int, ttl_seconds: int, allow_nonzero_temperature: bool = False):
+        """
+        Initialize cache
+
+        Args:
+            path: SQLite database file
+            max_bytes: Maximum total size of stored responses
+            ttl_seconds: Age after which an entry is treated as expired
+            allow_nonzero_temperature: Cache sampled (temperature > 0) responses too
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.allow_nonzero_temperature = allow_nonzero_temperature
+        
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self._counter_lock = threading.Lock()
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed_at)")
+    
+    @staticmethod
+    def make_key(payload: Dict[str, Any]) -> str:
+        """Hash the response-determining fields of a chat completion request"""
+        material = {
+            "model": payload.get("model"),
+            "messages": payload.get("messages"),
+            "temperature": payload.get("temperature"),
+            "max_tokens": payload.get("max_tokens")
+        }
+        encoded = json.dumps(material, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+    
+    def is_cacheable(self, payload: Dict[str, Any]) -> bool:
+        """Sampled responses are only cached when explicitly allowed"""
+        return self.allow_nonzero_temperature or not payload.get("temperature")
+    
+    def get(self, payload: Dict[str, Any]) -> Optional[str]:
+        """
+        Look up a cached response for a request
+
+        Returns:
+            Cached response text, or None on a miss or bypass
+        """
+        if not self.is_cacheable(payload):
+            self._count("bypasses")
+            return None
+        
+        key = self.make_key(payload)
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT response, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        
+        if row is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return row[0]
+    
+    def put(self, payload: Dict[str, Any], response: str):
+        """Store a response and evict entries beyond the TTL or size limit"""
+        if not self.is_cacheable(payload):
+            return
+        
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, model, response, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.make_key(payload), payload.get("model", ""), response, size, now, now)
+            )
+            self._evict(conn, now)
+    
+    def clear(self):
+        """Remove every entry and reset the counters"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries")
+        with self._counter_lock:
+            self.hits = self.misses = self.bypasses = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and storage usage"""
+        with self._connect() as conn:
+            entries, total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "total_bytes": total_bytes,
+            "max_bytes": self.max_bytes
+        }
+    
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired entries, then least recently used ones until under max_bytes"""
+        conn.execute("DELETE FROM entries WHERE created_at < ?", (now - self.ttl_seconds,))
+        
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        
+        evicted = 0
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed_at ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        logger.debug(f"LLM cache evicted {evicted} entries to stay under {self.max_bytes} bytes")
+    
+    def _count(self, counter: str):
+        """Increment a hit/miss/bypass counter"""
+        with self._counter_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+    
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection that commits on success and is always closed"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """
+    Get the process-wide response cache
+
+    Returns:
+        Shared LLMCache, or None when LLM_CACHE_ENABLED is off
+    """
+    global _cache
+    if not Config.LLM_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache(
+                    Config.LLM_CACHE_PATH,
+                    max_bytes=Config.LLM_CACHE_MAX_BYTES,
+                    ttl_seconds=Config.LLM_CACHE_TTL,
+                    allow_nonzero_temperature=Config.LLM_CACHE_ALLOW_NONZERO_TEMPERATURE
+                )
+                logger.info(f"LLM response cache enabled at {Config.LLM_CACHE_PATH}")
+    return _cache
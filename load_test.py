@@ -0,0 +1,497 @@
+"""
+Open-loop load test of the Flask API against a mocked LLM
+
+Starts the app (app.py) in its own process, under Flask's development
+server or a production WSGI server, pointed at an in-process
+mock_openrouter.py, then offers requests at fixed arrival rates:
+
+- Arrivals are open-loop (Poisson or evenly spaced): requests are sent on
+  schedule whether or not earlier ones have finished, so a saturated server
+  shows up as growing latency and errors instead of a quietly lower rate.
+- The request mix (``--mix execute=1,status=4,jobs=1``) covers POST
+  /api/execute, GET /api/status and POST /api/jobs.
+
+For each rate it reports throughput, error rate and status codes, latency
+percentiles and a histogram per endpoint, and the server process's peak
+thread and socket counts (read from /proc, so Linux only). The saturation
+point is the first rate at which errors exceed 1%, p95 latency grows past
+3x that of the lowest rate, or the backlog left when sending stops takes
+more than twice the lowest rate's p95 to drain (requests queue up faster
+than they complete). Run each rate well beyond the request latency.
+
+gunicorn and waitress are optional; install the one to test
+(``pip install gunicorn`` / ``pip install waitress``).
+
+Usage:
+    python load_test.py --server dev --rates 1,2,5,10 --duration 20
+    python load_test.py --server gunicorn --workers 4 --threads 8 --mix execute=1 --json load.json
+    python load_test.py --target http://127.0.0.1:5000 --pid 12345  # an already running app
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+import httpx
+
+from metrics import percentile
+from mock_openrouter import add_mock_arguments, mock_from_arguments
+
+logger = logging.getLogger(__name__)
+
+SERVERS = ("dev", "gunicorn", "waitress")
+
+# Endpoint name -> (method, path)
+ENDPOINTS = {
+    "execute": ("POST", "/api/execute"),
+    "status": ("GET", "/api/status"),
+    "jobs": ("POST", "/api/jobs")
+}
+
+# Upper bounds (seconds) of the latency histogram buckets; slower requests fall in a final "+inf" bucket
+HISTOGRAM_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+DEFAULT_TASK = "Draft a one-page plan for a neighbourhood book exchange"
+
+
+def server_command(server: str, host: str, port: int, workers: int, threads: int) -> List[str]:
+    """
+    Command line that serves app:app
+    
+    Raises:
+        RuntimeError: If the requested production server is not installed
+    """
+    if server == "dev":
+        return [sys.executable, "-c",
+                f"from app import app; app.run(host={host!r}, port={port}, threaded=True, debug=False)"]
+    if server == "gunicorn":
+        if shutil.which("gunicorn") is None:
+            raise RuntimeError("gunicorn is not installed (pip install gunicorn)")
+        return ["gunicorn", "--workers", str(workers), "--threads", str(threads), "--timeout", "300",
+                "--bind", f"{host}:{port}", "app:app"]
+    if server == "waitress":
+        if shutil.which("waitress-serve") is None:
+            raise RuntimeError("waitress is not installed (pip install waitress)")
+        return ["waitress-serve", f"--threads={threads}", f"--listen={host}:{port}", "app:app"]
+    raise ValueError(f"Unknown server {server!r}; use one of {', '.join(SERVERS)}")
+
+
+class AppServer:
+    """The app running in a child process"""
+    
+    def __init__(self, command: List[str], env: Dict[str, str]):
+        """
+        Initialize server
+        
+        Args:
+            command: Command line serving the app
+            env: Environment of the child process
+        """
+        self.command = command
+        self.env = env
+        self.process: Optional[subprocess.Popen] = None
+    
+    def start(self, url: str, ready_timeout: float = 30.0):
+        """Start the process and wait until GET /api/status answers"""
+        self.process = subprocess.Popen(
+            self.command, env=self.env, cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        deadline = time.monotonic() + ready_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {self.process.returncode}: {' '.join(self.command)}")
+            try:
+                if httpx.get(f"{url}/api/status", timeout=2).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"Server did not answer within {ready_timeout}s: {' '.join(self.command)}")
+    
+    def stop(self):
+        """Terminate the process (and wait for it)"""
+        if self.process is None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+    
+    @property
+    def pid(self) -> Optional[int]:
+        """Process ID of the running server"""
+        return self.process.pid if self.process else None
+
+
+class ProcessSampler:
+    """Samples thread and socket counts of a process and its children from /proc"""
+    
+    def __init__(self, pid: int, interval: float = 0.5):
+        """
+        Initialize sampler
+        
+        Args:
+            pid: Root process (e.g. the gunicorn master; its workers are included)
+            interval: Seconds between samples
+        """
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[Tuple[int, int]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    @staticmethod
+    def available() -> bool:
+        """Whether /proc can be read on this platform"""
+        return os.path.isdir("/proc/self/fd")
+    
+    def start(self):
+        """Begin sampling on a background thread"""
+        self.samples = []
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="process-sampler", daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> Dict[str, Any]:
+        """
+        Stop sampling
+        
+        Returns:
+            Peak and mean threads and sockets over the samples
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if not self.samples:
+            return {"peak_threads": None, "peak_sockets": None, "mean_threads": None, "mean_sockets": None}
+        threads, sockets = zip(*self.samples)
+        return {
+            "peak_threads": max(threads),
+            "peak_sockets": max(sockets),
+            "mean_threads": round(sum(threads) / len(threads), 1),
+            "mean_sockets": round(sum(sockets) / len(sockets), 1)
+        }
+    
+    def sample(self) -> Optional[Tuple[int, int]]:
+        """Current (threads, sockets) summed over the process tree, or None if it is gone"""
+        threads = sockets = 0
+        pids = self._process_tree()
+        if not pids:
+            return None
+        for pid in pids:
+            try:
+                threads += len(os.listdir(f"/proc/{pid}/task"))
+                for fd in os.listdir(f"/proc/{pid}/fd"):
+                    try:
+                        if os.readlink(f"/proc/{pid}/fd/{fd}").startswith("socket:"):
+                            sockets += 1
+                    except OSError:
+                        continue
+            except OSError:
+                continue
+        return threads, sockets
+    
+    def _process_tree(self) -> List[int]:
+        """The root process and its descendants"""
+        pids, pending = [], [self.pid]
+        while pending:
+            pid = pending.pop()
+            if not os.path.exists(f"/proc/{pid}"):
+                continue
+            pids.append(pid)
+            try:
+                for task in os.listdir(f"/proc/{pid}/task"):
+                    with open(f"/proc/{pid}/task/{task}/children") as f:
+                        pending.extend(int(child) for child in f.read().split())
+            except OSError:
+                continue
+        return pids
+    
+    def _run(self):
+        while not self._stop.is_set():
+            sample = self.sample()
+            if sample is not None:
+                self.samples.append(sample)
+            self._stop.wait(self.interval)
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """Parse "execute=1,status=4" into endpoint weights"""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name!r} in mix; use {', '.join(ENDPOINTS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+async def run_rate(client: httpx.AsyncClient, url: str, rate: float, duration: float, mix: Dict[str, float],
+                   task: str, arrival: str, rng: random.Random, drain_timeout: float) -> List[Dict[str, Any]]:
+    """
+    Offer requests at a fixed rate for a duration, independent of completions
+    
+    Args:
+        client: HTTP client without a connection limit
+        url: Base URL of the app
+        rate: Requests per second
+        duration: Seconds to keep sending
+        mix: Endpoint weights
+        task: Task sent to /api/execute and /api/jobs
+        arrival: "poisson" (exponential gaps) or "constant"
+        rng: Random source for arrival gaps and endpoint choice
+        drain_timeout: Seconds to wait for in-flight requests after the last send
+    
+    Returns:
+        One record per request: endpoint, status (None on a transport error), error,
+        seconds and finished (offset from the first send)
+    """
+    names, weights = list(mix), list(mix.values())
+    records: List[Dict[str, Any]] = []
+    
+    async def send(endpoint: str):
+        method, path = ENDPOINTS[endpoint]
+        record = {"endpoint": endpoint, "status": None, "error": None}
+        started = time.monotonic()
+        try:
+            if method == "POST":
+                response = await client.post(f"{url}{path}", json={"task": task})
+            else:
+                response = await client.get(f"{url}{path}")
+            record["status"] = response.status_code
+        except httpx.HTTPError as e:
+            record["error"] = type(e).__name__
+        finished = time.monotonic()
+        record["seconds"] = finished - started
+        record["finished"] = finished - rate_started
+        records.append(record)
+    
+    pending = set()
+    rate_started = time.monotonic()
+    next_send = 0.0
+    while next_send < duration:
+        delay = rate_started + next_send - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        request = asyncio.create_task(send(rng.choices(names, weights)[0]))
+        pending.add(request)
+        request.add_done_callback(pending.discard)
+        next_send += rng.expovariate(rate) if arrival == "poisson" else 1 / rate
+    
+    if pending:
+        done, unfinished = await asyncio.wait(set(pending), timeout=drain_timeout)
+        for request in unfinished:
+            request.cancel()
+        if unfinished:
+            await asyncio.gather(*unfinished, return_exceptions=True)
+            records.extend({"endpoint": "unfinished", "status": None, "error": "DrainTimeout",
+                            "seconds": drain_timeout, "finished": duration + drain_timeout} for _ in unfinished)
+    return records
+
+
+def histogram(latencies: List[float]) -> Dict[str, int]:
+    """Count latencies per HISTOGRAM_BUCKETS bucket, labelled by upper bound"""
+    counts = {f"<={bound:g}s": 0 for bound in HISTOGRAM_BUCKETS}
+    counts["+inf"] = 0
+    for latency in latencies:
+        bound = next((bound for bound in HISTOGRAM_BUCKETS if latency <= bound), None)
+        counts[f"<={bound:g}s" if bound is not None else "+inf"] += 1
+    return counts
+
+
+def summarize_rate(rate: float, duration: float, records: List[Dict[str, Any]],
+                   usage: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Reduce one rate's request records to throughput, errors, latency and resource usage"""
+    ok = [record for record in records if _succeeded(record)]
+    statuses: Dict[str, int] = {}
+    for record in records:
+        key = str(record["status"]) if record["status"] is not None else record["error"]
+        statuses[key] = statuses.get(key, 0) + 1
+    
+    endpoints = {}
+    for endpoint in sorted({record["endpoint"] for record in records}):
+        latencies = [record["seconds"] for record in ok if record["endpoint"] == endpoint]
+        endpoints[endpoint] = {
+            "requests": sum(1 for record in records if record["endpoint"] == endpoint),
+            "ok": len(latencies),
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(max(latencies), 3) if latencies else 0.0,
+            "histogram": histogram(latencies)
+        }
+    
+    latencies = [record["seconds"] for record in ok]
+    # Completions are counted until the last one, so a backlog drained after the sending window lowers throughput
+    window = max([duration] + [record["finished"] for record in records])
+    return {
+        "drain_seconds": round(window - duration, 3),
+        "offered_rps": rate,
+        "sent_rps": round(len(records) / duration, 3),
+        "requests": len(records),
+        "throughput_rps": round(len(ok) / window, 3),
+        "error_rate": round(1 - len(ok) / len(records), 4) if records else 0.0,
+        "statuses": statuses,
+        "p50": round(percentile(latencies, 50), 3),
+        "p95": round(percentile(latencies, 95), 3),
+        "p99": round(percentile(latencies, 99), 3),
+        "endpoints": endpoints,
+        "process": usage
+    }
+
+
+def _succeeded(record: Dict[str, Any]) -> bool:
+    """Whether a request got a non-error response"""
+    return record["status"] is not None and record["status"] < 400
+
+
+def find_saturation(levels: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    First rate at which the server no longer keeps up
+    
+    Returns:
+        The offered rate and the reason, or None if every rate was sustained
+    """
+    baseline_p95 = levels[0]["p95"] if levels else 0.0
+    for level in levels:
+        if level["error_rate"] > 0.01:
+            return {"offered_rps": level["offered_rps"], "reason": f"error rate {level['error_rate']:.1%}"}
+        if baseline_p95 and level["p95"] > 3 * baseline_p95:
+            return {"offered_rps": level["offered_rps"], "reason": f"p95 {level['p95']}s, over 3x the lowest rate's"}
+        if level["drain_seconds"] > max(2 * baseline_p95, 1.0):
+            return {"offered_rps": level["offered_rps"], "reason": f"backlog took {level['drain_seconds']}s to drain"}
+    return None
+
+
+def print_report(server: str, levels: List[Dict[str, Any]], saturation: Optional[Dict[str, Any]]):
+    """Print the per-rate summary, per-endpoint latency and histograms"""
+    print(f"\nServer: {server}")
+    print(f"{'offered':>8} {'sent/s':>8} {'tput/s':>8} {'errors':>7} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} "
+          f"{'drain s':>8} {'threads':>8} {'sockets':>8}")
+    for level in levels:
+        process = level["process"] or {}
+        print(f"{level['offered_rps']:>8g} {level['sent_rps']:>8.2f} {level['throughput_rps']:>8.2f} "
+              f"{level['error_rate']:>7.1%} {level['p50']:>8.3f} {level['p95']:>8.3f} {level['p99']:>8.3f} "
+              f"{level['drain_seconds']:>8.2f} "
+              f"{str(process.get('peak_threads', '-')):>8} {str(process.get('peak_sockets', '-')):>8}")
+    
+    for level in levels:
+        print(f"\nAt {level['offered_rps']:g} req/s: statuses {level['statuses']}")
+        for endpoint, stats in level["endpoints"].items():
+            print(f"  {endpoint:<10} {stats['ok']}/{stats['requests']} ok, "
+                  f"p50 {stats['p50']}s p95 {stats['p95']}s p99 {stats['p99']}s max {stats['max']}s")
+            buckets = [f"{bound} {count}" for bound, count in stats["histogram"].items() if count]
+            if buckets:
+                print(f"    {' | '.join(buckets)}")
+    
+    if saturation:
+        print(f"\nSaturation at {saturation['offered_rps']:g} req/s: {saturation['reason']}")
+    else:
+        print("\nNo saturation up to the highest offered rate")
+
+
+async def run_rates(url: str, rates: List[float], args: argparse.Namespace,
+                    sampler: Optional[ProcessSampler]) -> List[Dict[str, Any]]:
+    """Run every offered rate in turn against a started app"""
+    mix = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    levels = []
+    async with httpx.AsyncClient(limits=limits, timeout=args.timeout) as client:
+        for rate in rates:
+            print(f"  {rate:g} req/s for {args.duration:g}s...", flush=True)
+            if sampler:
+                sampler.start()
+            records = await run_rate(client, url, rate, args.duration, mix, args.task, args.arrival, rng,
+                                     args.drain_timeout)
+            usage = sampler.stop() if sampler else None
+            levels.append(summarize_rate(rate, args.duration, records, usage))
+            await asyncio.sleep(args.cooldown)
+    return levels
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Open-loop load test of the Flask API with a mocked LLM")
+    parser.add_argument("--server", choices=SERVERS, default="dev", help="Server running the app (default: dev)")
+    parser.add_argument("--target", help="Test an already running app at this URL instead of starting one")
+    parser.add_argument("--pid", type=int, help="Process ID of the --target app, for thread/socket sampling")
+    parser.add_argument("--port", type=int, default=5055, help="Port for the started app (default: 5055)")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes (default: 2)")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn/waitress threads (default: 8)")
+    parser.add_argument("--rates", default="1,2,5,10", help="Comma-separated offered rates in req/s")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per rate (default: 20)")
+    parser.add_argument("--arrival", choices=("poisson", "constant"), default="poisson", help="Arrival process")
+    parser.add_argument("--mix", default="execute=1,status=1,jobs=1", help="Endpoint weights, e.g. execute=1,status=4")
+    parser.add_argument("--task", default=DEFAULT_TASK, help="Task sent to /api/execute and /api/jobs")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--drain-timeout", type=float, default=60.0,
+                        help="Seconds to wait for in-flight requests after each rate")
+    parser.add_argument("--cooldown", type=float, default=2.0, help="Pause between rates in seconds")
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this JSON file")
+    add_mock_arguments(parser)
+    parser.set_defaults(latency_mean=0.2)
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    rates = [float(rate) for rate in args.rates.split(",") if rate.strip()]
+    
+    mock = None
+    app_server = None
+    if args.target:
+        url = args.target.rstrip("/")
+        server_name = f"external ({url})"
+        pid = args.pid
+    else:
+        mock = mock_from_arguments(args)
+        env = dict(os.environ)
+        env.update({
+            "OPENROUTER_BASE_URL": mock.start(),
+            "OPENROUTER_API_KEY": "sk-or-mock",
+            "LLM_CACHE_ENABLED": "false",
+            "CHECKPOINT_ENABLED": "false",
+            "TASK_INDEX_ENABLED": "false",
+            "LOG_LEVEL": "WARNING"
+        })
+        url = f"http://127.0.0.1:{args.port}"
+        server_name = args.server
+        app_server = AppServer(server_command(args.server, "127.0.0.1", args.port, args.workers, args.threads), env)
+        app_server.start(url)
+        pid = app_server.pid
+    
+    sampler = ProcessSampler(pid) if pid and ProcessSampler.available() else None
+    print(f"Load testing {server_name} with mix {args.mix} ({args.arrival} arrivals)")
+    try:
+        levels = asyncio.run(run_rates(url, rates, args, sampler))
+    finally:
+        if app_server is not None:
+            app_server.stop()
+        if mock is not None:
+            mock.stop()
+    
+    saturation = find_saturation(levels)
+    print_report(server_name, levels, saturation)
+    report = {"server": server_name, "mix": args.mix, "arrival": args.arrival, "levels": levels,
+              "saturation": saturation}
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json_path}")
+    return report
+
+
+if __name__ == '__main__':
+    main()
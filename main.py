@@ -3,6 +3,8 @@ Main entry point for AI Agent Workflow
 """
 import os
 import sys
+import asyncio
+import argparse
 import logging
 from dotenv import load_dotenv
 from config import Config
@@ -18,6 +20,77 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def print_stream_event(event: str, data: dict):
+    """Print streamed workflow events to the terminal as they arrive"""
+    if event == "step_start":
+        print(f"\n\n▶ {data['step']} ({data['agent']})\n" + "-" * 50)
+    elif event == "token":
+        print(data["text"], end="", flush=True)
+    elif event == "step_complete":
+        print()
+
+
+def batch_main(argv: list):
+    """Run the batch subcommand: python main.py batch INPUT [--output OUT] [--workers N]"""
+    from batch import run_batch
+    
+    parser = argparse.ArgumentParser(prog="main.py batch", description="Run tasks from a JSONL file")
+    parser.add_argument("input", help="JSONL file with one task per line")
+    parser.add_argument("--output", "-o", help="Output JSONL file (default: <input>.results.jsonl)")
+    parser.add_argument("--workers", "-w", type=int, default=Config.BATCH_WORKERS,
+                        help=f"Concurrent workflows (default: {Config.BATCH_WORKERS})")
+    args = parser.parse_args(argv)
+    
+    output = args.output or f"{os.path.splitext(args.input)[0]}.results.jsonl"
+    print(f"\n📦 Batch: {args.input} → {output} ({args.workers} workers)\n")
+    
+    def report(record: dict):
+        icon = "✅" if record["status"] == "completed" else "❌"
+        print(f"{icon} {record['request_id']} ({record['duration_seconds']}s)")
+    
+    counts = asyncio.run(run_batch(args.input, output, args.workers, on_result=report))
+    print(f"\nCompleted: {counts['completed']}  Failed: {counts['failed']}  "
+          f"Skipped (already done): {counts['skipped']}  Elapsed: {counts['elapsed_seconds']}s")
+    return counts
+
+
+def save_to_store(results: dict):
+    """Save a workflow result to the configured results store under its run ID"""
+    from datetime import datetime
+    from results_store import get_results_store
+    from result_format import format_results
+    
+    store = get_results_store()
+    request_id = results['run_id']
+    now = datetime.now().isoformat()
+    store.save_result(request_id, {
+        'success': results['status'] == 'completed',
+        'request_id': request_id,
+        'completed_at': now,
+        'results': format_results(results)
+    })
+    store.save_status(request_id, results['status'], task=results.get('task'), completed_at=now)
+    print(f"Results saved to the {Config.RESULTS_BACKEND} results store as {request_id}")
+
+
+def offer_reuse(orchestrator: WorkflowOrchestrator, task: str) -> str:
+    """
+    Offer to reuse a completed run with a near-duplicate task
+    
+    Returns:
+        The chosen reuse mode for execute_workflow ("result", "seed" or "off")
+    """
+    matches = orchestrator.find_similar_tasks(task, limit=1)
+    if not matches:
+        return "off"
+    
+    match = matches[0]
+    print(f"\n♻️  A similar task was completed before ({match['similarity']:.0%} similar, run {match['run_id']}):")
+    print(f"   {match['task'][:200]}")
+    choice = input("Reuse its [r]esults, [s]eed this run with its plan and research, or [n]o? ").strip().lower()
+    return {"r": "result", "s": "seed"}.get(choice[:1], "off")
+
+
 def main():
     """Main entry point"""
     # Validate configuration
@@ -32,15 +105,28 @@ def main():
         print("  export OPENROUTER_API_KEY='your-api-key-here'")
         sys.exit(1)
     
+    if sys.argv[1:2] == ["batch"]:
+        return batch_main(sys.argv[2:])
+    
     # Initialize orchestrator
     orchestrator = WorkflowOrchestrator()
     
+    # --stream prints model output token by token as each step runs
+    args = sys.argv[1:]
+    stream = "--stream" in args
+    args = [arg for arg in args if arg != "--stream"]
+    on_event = print_stream_event if stream else None
+    
     # Example usage
-    if len(sys.argv) > 1:
+    if len(args) == 2 and args[0] == "--resume":
+        # Continue a failed run from its last completed step
+        logger.info(f"Resuming run: {args[1]}")
+        results = orchestrator.resume_workflow(args[1], on_event=on_event)
+    elif args:
         # Task provided as command line argument
-        task = " ".join(sys.argv[1:])
+        task = " ".join(args)
         logger.info(f"Executing task from command line: {task}")
-        results = orchestrator.execute_workflow(task)
+        results = orchestrator.execute_workflow(task, on_event=on_event)
     else:
         # Interactive mode
         print("\n🤖 AI Agent Workflow System")
@@ -63,10 +149,12 @@ def main():
                 print("No task provided. Exiting.")
                 sys.exit(0)
             
+            reuse = offer_reuse(orchestrator, task)
+            
             logger.info(f"Executing task: {task}")
             print(f"\n🔄 Processing task: {task}\n")
             
-            results = orchestrator.execute_workflow(task)
+            results = orchestrator.execute_workflow(task, on_event=on_event, reuse=reuse)
             
             # Display results
             print("\n" + "=" * 50)
@@ -83,15 +171,20 @@ def main():
                 print("\nDetailed results are available in the workflow output.")
                 
                 # Option to save results
-                save = input("\nSave results to file? (y/n): ").strip().lower()
+                save = input("\nSave results? (y/n): ").strip().lower()
                 if save == 'y':
-                    filename = input("Enter filename (default: results.json): ").strip() or "results.json"
-                    import json
-                    with open(filename, 'w') as f:
-                        json.dump(results, f, indent=2)
-                    print(f"Results saved to {filename}")
+                    filename = input(f"Enter filename (default: save to the {Config.RESULTS_BACKEND} results store): ").strip()
+                    if filename:
+                        import json
+                        with open(filename, 'w') as f:
+                            json.dump(results, f, indent=2)
+                        print(f"Results saved to {filename}")
+                    else:
+                        save_to_store(results)
             else:
                 print(f"❌ Workflow failed: {results.get('error', 'Unknown error')}")
+                if results.get('resumable'):
+                    print(f"Resume from the last completed step with: python main.py --resume {results['run_id']}")
                 
         except KeyboardInterrupt:
             print("\n\nExiting...")
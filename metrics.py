@@ -0,0 +1,138 @@
+"""
+Per-call latency and token usage metrics for LLM calls
+
+Every call_llm/acall_llm invocation produces one call record (start time,
+wall time, time queued in the rate limiter, prompt/completion/cached tokens,
+model and retries). Records are delivered to every collector active in the current
+context, so an agent can report the calls behind one step while the
+orchestrator collects the whole run. Collectors live in a ContextVar, which
+asyncio tasks and asyncio.to_thread workers inherit.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Iterator
+
+_collectors: contextvars.ContextVar = contextvars.ContextVar("llm_call_collectors", default=())
+
+
+@contextmanager
+def collect_calls() -> Iterator[List[Dict[str, Any]]]:
+    """
+    Collect the call records produced inside the block
+    
+    Yields:
+        List that receives each call record as it finishes
+    """
+    calls: List[Dict[str, Any]] = []
+    token = _collectors.set(_collectors.get() + (calls,))
+    try:
+        yield calls
+    finally:
+        _collectors.reset(token)
+
+
+def start_call(agent: str, model: str, streamed: bool = False) -> Dict[str, Any]:
+    """
+    Begin a call record
+    
+    Args:
+        agent: Name of the calling agent
+        model: Requested model
+        streamed: Whether the response is streamed
+    
+    Returns:
+        Mutable record; callers add queue_seconds and retries while the call runs
+    """
+    return {
+        "agent": agent,
+        "model": model,
+        "streamed": streamed,
+        "cache_hit": False,
+        "retries": 0,
+        "queue_seconds": 0.0,
+        "started_at": time.time(),
+        "_start": time.monotonic()
+    }
+
+
+def finish_call(call: Dict[str, Any], result: Optional[Dict[str, Any]] = None,
+                cache_hit: bool = False, error: Optional[str] = None):
+    """
+    Complete a call record and deliver it to the active collectors
+    
+    Args:
+        call: Record from start_call
+        result: Response body (or the final stream chunk data) with usage and model
+        cache_hit: Whether the response was served from the LLM cache
+        error: Error message if the call failed
+    """
+    call["wall_seconds"] = round(time.monotonic() - call.pop("_start"), 3)
+    call["queue_seconds"] = round(call["queue_seconds"], 3)
+    call["cache_hit"] = cache_hit
+    
+    usage = (result or {}).get("usage") or {}
+    call["model"] = (result or {}).get("model") or call["model"]
+    call["prompt_tokens"] = usage.get("prompt_tokens", 0)
+    call["completion_tokens"] = usage.get("completion_tokens", 0)
+    call["cached_tokens"] = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+    if "cost" in usage:
+        call["cost"] = usage["cost"]
+    if error is not None:
+        call["error"] = error
+    
+    for calls in _collectors.get():
+        calls.append(call)
+
+
+def summarize_calls(calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Total a list of call records
+    
+    Returns:
+        Call count, summed times, tokens and retries, cache hits, errors and
+        models used. busy_seconds is the time at least one call was in flight,
+        which is less than wall_seconds when calls overlap
+    """
+    totals = {
+        "calls": len(calls),
+        "wall_seconds": round(sum(call["wall_seconds"] for call in calls), 3),
+        "busy_seconds": round(_busy_seconds(calls), 3),
+        "queue_seconds": round(sum(call["queue_seconds"] for call in calls), 3),
+        "prompt_tokens": sum(call["prompt_tokens"] for call in calls),
+        "completion_tokens": sum(call["completion_tokens"] for call in calls),
+        "cached_tokens": sum(call["cached_tokens"] for call in calls),
+        "retries": sum(call["retries"] for call in calls),
+        "cache_hits": sum(1 for call in calls if call["cache_hit"]),
+        "errors": sum(1 for call in calls if "error" in call),
+        "models": sorted({call["model"] for call in calls if call.get("model")})
+    }
+    costs = [call["cost"] for call in calls if "cost" in call]
+    if costs:
+        totals["cost"] = sum(costs)
+    return totals
+
+
+def _busy_seconds(calls: List[Dict[str, Any]]) -> float:
+    """Length of the union of the calls' [start, end] intervals"""
+    if any("started_at" not in call for call in calls):
+        return sum(call["wall_seconds"] for call in calls)
+    
+    busy = 0.0
+    covered_until = float("-inf")
+    for start, end in sorted((call["started_at"], call["started_at"] + call["wall_seconds"]) for call in calls):
+        if end > covered_until:
+            busy += end - max(start, covered_until)
+            covered_until = end
+    return busy
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Linearly interpolated percentile of a list of values (0 for an empty list)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
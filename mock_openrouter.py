@@ -0,0 +1,460 @@
+"""
+Local stand-in for the OpenRouter chat completions API
+
+Serves OpenAI/OpenRouter-compatible ``/api/v1/chat/completions`` responses
+(plain and streamed) without spending tokens, so the orchestrator can be
+benchmarked and exercised offline:
+
+- Latency before the first token is drawn from a configurable distribution,
+  and generation is paced at a configurable tokens/second.
+- Responses carry usage blocks with estimated prompt/completion tokens and
+  respect max_tokens (finish_reason "length").
+- A share of requests fails with 429 (with Retry-After, answered at once)
+  or 500/502/503 (after the sampled latency).
+- Content comes from canned responses: a JSON file of
+  [{"match": regex, "content": text}] checked in order against the request's
+  messages, falling back to built-in replies (a QA review with a passing
+  verdict block, or a generic plan-shaped document).
+
+Usage:
+    python mock_openrouter.py --port 8765 --latency lognormal --latency-mean 1.5 --error-rate-5xx 0.02
+    OPENROUTER_BASE_URL=http://127.0.0.1:8765/api/v1 OPENROUTER_API_KEY=sk-or-mock python main.py "task"
+
+GET /stats reports request counts by status, tokens served and the peak
+number of requests in flight.
+"""
+import argparse
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional, Tuple
+
+from tokens import estimate_tokens, estimate_message_tokens
+
+logger = logging.getLogger(__name__)
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+_QA_REPLY = """## Review
+
+The deliverables address the objectives in the plan and meet the success criteria.
+
+- Structure is clear and complete
+- Claims are supported by the research
+
+```json
+{"ready": true, "issues": {"critical": 0, "major": 0, "minor": 0}}
+```"""
+
+_DEFAULT_REPLY = """## 1. Clear Objectives
+- Deliver a complete, well-structured response to the task
+
+## 2. Key Steps
+1. Review the requirements
+2. Draft the deliverable
+3. Check it against the success criteria
+
+## 3. Success Criteria
+- All parts of the task are addressed
+
+## 4. Information Needs
+- Background on the subject
+- Constraints and stakeholders
+- Comparable examples
+"""
+
+_FILLER = "Further detail elaborates on each point with supporting context and examples. "
+
+
+class _Server(ThreadingHTTPServer):
+    """One thread per connection, with a listen backlog sized for load tests"""
+    
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class MockOpenRouter:
+    """Threaded HTTP server imitating the OpenRouter chat completions API"""
+    
+    def __init__(self, latency: str = "fixed", latency_mean: float = 0.0, latency_sigma: float = 0.5,
+                 tokens_per_second: float = 0.0, completion_tokens: int = 300,
+                 error_rate_429: float = 0.0, error_rate_5xx: float = 0.0, retry_after: float = 1.0,
+                 responses_file: Optional[str] = None, seed: Optional[int] = None):
+        """
+        Initialize mock server settings
+        
+        Args:
+            latency: Distribution of the time to first token, one of LATENCY_DISTRIBUTIONS
+            latency_mean: Mean time to first token in seconds
+            latency_sigma: Spread: the standard deviation relative to the mean
+                (normal) or the sigma of the underlying normal (lognormal)
+            tokens_per_second: Generation speed; 0 sends the whole completion at once
+            completion_tokens: Approximate length the built-in replies are padded to
+            error_rate_429: Share of requests rejected with 429
+            error_rate_5xx: Share of requests failing with 500, 502 or 503
+            retry_after: Retry-After seconds sent with 429 responses
+            responses_file: Optional JSON file of canned responses
+            seed: Random seed for repeatable latency and error sequences
+        """
+        if latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution {latency!r}; use one of {', '.join(LATENCY_DISTRIBUTIONS)}")
+        self.latency = latency
+        self.latency_mean = latency_mean
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_rate_429 = error_rate_429
+        self.error_rate_5xx = error_rate_5xx
+        self.retry_after = retry_after
+        self.canned = self._load_responses(responses_file) if responses_file else []
+        
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self.reset_stats()
+    
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        Serve on a background thread
+        
+        Args:
+            host: Interface to bind
+            port: Port to bind; 0 picks a free one
+        
+        Returns:
+            Base URL to use as OPENROUTER_BASE_URL
+        """
+        self._server = self._create_server(host, port)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-openrouter", daemon=True)
+        self._thread.start()
+        return self.base_url
+    
+    def serve_forever(self, host: str = "127.0.0.1", port: int = 8765):
+        """Serve on the calling thread until interrupted"""
+        self._server = self._create_server(host, port)
+        logger.info(f"Mock OpenRouter listening on {self.base_url}")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+    
+    def stop(self):
+        """Stop a server started with start()"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    @property
+    def base_url(self) -> str:
+        """Base URL of the running server"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v1"
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get request counts by status, tokens served and peak concurrency"""
+        with self._lock:
+            return dict(self._stats, statuses=dict(self._stats["statuses"]))
+    
+    def reset_stats(self):
+        """Zero the counters"""
+        with self._lock:
+            self._stats: Dict[str, Any] = {
+                "requests": 0,
+                "streamed": 0,
+                "statuses": {},
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "in_flight": 0,
+                "peak_in_flight": 0
+            }
+    
+    def sample_latency(self) -> float:
+        """Draw a time to first token from the configured distribution"""
+        mean = self.latency_mean
+        if mean <= 0:
+            return 0.0
+        with self._lock:
+            if self.latency == "uniform":
+                return self._random.uniform(0, 2 * mean)
+            if self.latency == "normal":
+                return max(0.0, self._random.gauss(mean, self.latency_sigma * mean))
+            if self.latency == "lognormal":
+                # mu chosen so that the distribution's mean is latency_mean
+                return self._random.lognormvariate(math.log(mean) - self.latency_sigma ** 2 / 2, self.latency_sigma)
+            if self.latency == "exponential":
+                return self._random.expovariate(1 / mean)
+            return mean
+    
+    def sample_error(self) -> Optional[int]:
+        """Pick the injected error status for a request, if any"""
+        with self._lock:
+            draw = self._random.random()
+            if draw < self.error_rate_429:
+                return 429
+            if draw < self.error_rate_429 + self.error_rate_5xx:
+                return self._random.choice((500, 502, 503))
+        return None
+    
+    def reply_for(self, messages: List[Dict[str, Any]]) -> str:
+        """Choose the response content for a request's messages"""
+        text = "\n".join(str(message.get("content", "")) for message in messages)
+        for response in self.canned:
+            if re.search(response["match"], text):
+                return response["content"]
+        
+        reply = _QA_REPLY if '"ready"' in text else _DEFAULT_REPLY
+        missing = self.completion_tokens - estimate_tokens(reply)
+        if missing > 0:
+            reply += "\n" + _FILLER * math.ceil(missing / estimate_tokens(_FILLER))
+        return reply
+    
+    def complete(self, payload: Dict[str, Any]) -> Tuple[str, str, Dict[str, int]]:
+        """
+        Build the completion for a request
+        
+        Returns:
+            Tuple of (content, finish_reason, usage)
+        """
+        messages = payload.get("messages") or []
+        content = self.reply_for(messages)
+        finish_reason = "stop"
+        
+        completion_tokens = estimate_tokens(content)
+        max_tokens = payload.get("max_tokens")
+        if max_tokens and completion_tokens > max_tokens:
+            content = content[:int(len(content) * max_tokens / completion_tokens)]
+            completion_tokens = max_tokens
+            finish_reason = "length"
+        
+        prompt_tokens = estimate_message_tokens(messages)
+        return content, finish_reason, {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    
+    def generation_seconds(self, completion_tokens: int) -> float:
+        """Time to generate a completion at tokens_per_second"""
+        return completion_tokens / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+    
+    def _record(self, status: int, streamed: bool = False, usage: Optional[Dict[str, int]] = None):
+        """Count a finished request"""
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["streamed"] += int(streamed)
+            self._stats["statuses"][str(status)] = self._stats["statuses"].get(str(status), 0) + 1
+            if usage:
+                self._stats["prompt_tokens"] += usage["prompt_tokens"]
+                self._stats["completion_tokens"] += usage["completion_tokens"]
+    
+    def _enter(self):
+        """Track a request entering the server"""
+        with self._lock:
+            self._stats["in_flight"] += 1
+            self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._stats["in_flight"])
+    
+    def _leave(self):
+        """Track a request leaving the server"""
+        with self._lock:
+            self._stats["in_flight"] -= 1
+    
+    def _create_server(self, host: str, port: int) -> ThreadingHTTPServer:
+        """Create the HTTP server bound to this mock"""
+        return _Server((host, port), _make_handler(self))
+    
+    @staticmethod
+    def _load_responses(path: str) -> List[Dict[str, str]]:
+        """Read and validate a canned responses file"""
+        with open(path, "r", encoding="utf-8") as f:
+            responses = json.load(f)
+        for response in responses:
+            if "match" not in response or "content" not in response:
+                raise ValueError(f"Canned responses need 'match' and 'content': {json.dumps(response)[:200]}")
+        return responses
+
+
+def _make_handler(mock: MockOpenRouter) -> type:
+    """Build a request handler class serving from a MockOpenRouter"""
+    
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        
+        def log_message(self, format: str, *args: Any):
+            logger.debug(f"{self.address_string()} {format % args}")
+        
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/models"):
+                self._send_json(200, {"data": [{"id": "mock/model", "name": "Mock model"}]})
+            elif self.path.rstrip("/") == "/stats":
+                self._send_json(200, mock.stats())
+            else:
+                self._send_json(404, {"error": {"message": f"No route for {self.path}", "code": 404}})
+        
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": f"No route for {self.path}", "code": 404}})
+                return
+            if not self.headers.get("Authorization", "").startswith("Bearer "):
+                mock._record(401)
+                self._send_json(401, {"error": {"message": "Missing API key", "code": 401}})
+                return
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                mock._record(400)
+                self._send_json(400, {"error": {"message": "Request body is not JSON", "code": 400}})
+                return
+            
+            mock._enter()
+            try:
+                self._complete(payload)
+            finally:
+                mock._leave()
+        
+        def _complete(self, payload: Dict[str, Any]):
+            error = mock.sample_error()
+            if error == 429:
+                mock._record(429)
+                self._send_json(429, {"error": {"message": "Rate limit exceeded", "code": 429}},
+                                {"Retry-After": f"{mock.retry_after:g}"})
+                return
+            
+            time.sleep(mock.sample_latency())
+            if error is not None:
+                mock._record(error)
+                self._send_json(error, {"error": {"message": f"Injected upstream error {error}", "code": error}})
+                return
+            
+            content, finish_reason, usage = mock.complete(payload)
+            model = payload.get("model") or "mock/model"
+            completion_id = f"gen-{uuid.uuid4().hex[:24]}"
+            
+            if payload.get("stream"):
+                self._stream(completion_id, model, content, finish_reason, usage)
+                mock._record(200, streamed=True, usage=usage)
+                return
+            
+            time.sleep(mock.generation_seconds(usage["completion_tokens"]))
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": finish_reason
+                }],
+                "usage": usage
+            })
+            mock._record(200, usage=usage)
+        
+        def _stream(self, completion_id: str, model: str, content: str, finish_reason: str,
+                    usage: Dict[str, int]):
+            """Send the completion as Server-Sent Events over chunked transfer encoding"""
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            
+            pieces = re.findall(r"\S+\s*|\s+", content) or [""]
+            pause = mock.generation_seconds(usage["completion_tokens"]) / len(pieces)
+            
+            def chunk(choices: List[Dict[str, Any]], **extra: Any) -> Dict[str, Any]:
+                return dict({"id": completion_id, "object": "chat.completion.chunk",
+                             "created": int(time.time()), "model": model, "choices": choices}, **extra)
+            
+            for piece in pieces:
+                self._write_event(chunk([{"index": 0, "delta": {"content": piece}, "finish_reason": None}]))
+                if pause:
+                    time.sleep(pause)
+            self._write_event(chunk([{"index": 0, "delta": {}, "finish_reason": finish_reason}], usage=usage))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        
+        def _write_event(self, data: Dict[str, Any]):
+            self._write_chunk(f"data: {json.dumps(data)}\n\n".encode("utf-8"))
+        
+        def _write_chunk(self, data: bytes):
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+        
+        def _send_json(self, status: int, data: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+            encoded = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(encoded)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(encoded)
+    
+    return Handler
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser):
+    """Add the mock server settings to an argument parser (shared with benchmark.py)"""
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="lognormal",
+                        help="Time-to-first-token distribution (default: lognormal)")
+    parser.add_argument("--latency-mean", type=float, default=0.5, help="Mean time to first token in seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Latency spread (see MockOpenRouter)")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0,
+                        help="Generation speed; 0 sends completions at once")
+    parser.add_argument("--completion-tokens", type=int, default=300, help="Length of the built-in replies")
+    parser.add_argument("--error-rate-429", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--error-rate-5xx", type=float, default=0.0, help="Share of requests failing with 5xx")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on 429")
+    parser.add_argument("--responses", help="JSON file of canned responses [{\"match\", \"content\"}]")
+    parser.add_argument("--seed", type=int, help="Random seed for repeatable runs")
+
+
+def mock_from_arguments(args: argparse.Namespace) -> MockOpenRouter:
+    """Create a MockOpenRouter from parsed add_mock_arguments options"""
+    return MockOpenRouter(
+        latency=args.latency,
+        latency_mean=args.latency_mean,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate_429=args.error_rate_429,
+        error_rate_5xx=args.error_rate_5xx,
+        retry_after=args.retry_after,
+        responses_file=args.responses,
+        seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the OpenRouter chat completions API")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port to bind (default: 8765)")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    mock = mock_from_arguments(args)
+    print(f"Mock OpenRouter on http://{args.host}:{args.port}/api/v1 "
+          f"({args.latency} latency, mean {args.latency_mean}s)")
+    print(f"  export OPENROUTER_BASE_URL=http://{args.host}:{args.port}/api/v1 OPENROUTER_API_KEY=sk-or-mock")
+    try:
+        mock.serve_forever(args.host, args.port)
+    except KeyboardInterrupt:
+        print(f"\nStopped. {json.dumps(mock.stats())}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""
+Prompt budgeting for agents that build on earlier step outputs
+
+Later steps used to paste the full plan, research and deliverables into
+every prompt. The helpers here unwrap step outputs to their text, extract
+only the sections a step needs (e.g. the plan's SUCCESS CRITERIA for QA)
+and trim what is left to fit a per-agent token budget, reporting how much
+was cut.
+"""
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+from tokens import estimate_tokens
+
+# Markdown heading ("## 4. Success Criteria"), numbered caps heading ("4. SUCCESS CRITERIA:")
+# or a line that is entirely bold ("**Success Criteria**")
+_MARKDOWN_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.+?)\s*#*\s*$")
+_NUMBERED_HEADING = re.compile(r"^\s{0,3}(?:\*\*)?\d+[.)]\s+(.+?)\s*$")
+_BOLD_HEADING = re.compile(r"^\s{0,3}\*\*(.+?)\*\*:?\s*$")
+_LIST_ITEM = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+(.+?)\s*$")
+
+
+def output_text(value: Any, *keys: str) -> str:
+    """
+    Get the text of a step output
+    
+    Accepts the agent's format_output dict, the bare result dict or plain
+    text, so callers can pass workflow context values as they are.
+    
+    Args:
+        value: Step output
+        keys: Result keys that may hold the text (e.g. "plan", "review")
+    
+    Returns:
+        The output text, or "" when there is none
+    """
+    if not value:
+        return ""
+    if isinstance(value, dict):
+        result = value.get("result", value)
+        for key in keys:
+            if isinstance(result, dict) and key in result:
+                return str(result[key])
+            if key in value:
+                return str(value[key])
+    return str(value)
+
+
+def extract_section(markdown: str, *titles: str) -> str:
+    """
+    Extract the sections of a markdown document whose heading matches a title
+    
+    A section runs from its heading to the next heading of the same or a
+    higher level. Matching is case-insensitive on a substring of the
+    heading text.
+    
+    Args:
+        markdown: Document to search
+        titles: Heading titles to look for, e.g. "SUCCESS CRITERIA"
+    
+    Returns:
+        The matching sections joined in document order, or "" if none match
+    """
+    lines = markdown.splitlines()
+    wanted = [title.lower() for title in titles]
+    sections: List[str] = []
+    
+    index = 0
+    while index < len(lines):
+        heading = _parse_heading(lines[index])
+        if heading is None or not any(title in heading[1].lower() for title in wanted):
+            index += 1
+            continue
+        
+        end = index + 1
+        while end < len(lines):
+            following = _parse_heading(lines[end])
+            if following is not None and following[0] <= heading[0]:
+                break
+            end += 1
+        sections.append("\n".join(lines[index:end]).strip())
+        index = end
+    
+    return "\n\n".join(sections)
+
+
+def list_headings(markdown: str) -> List[str]:
+    """Get the heading titles of a markdown document in order"""
+    headings = []
+    for line in markdown.splitlines():
+        heading = _parse_heading(line)
+        if heading is not None:
+            headings.append(heading[1].strip("*:# "))
+    return headings
+
+
+def list_items(markdown: str) -> List[str]:
+    """
+    Split the top-level list items out of a markdown fragment
+    
+    Bulleted and numbered items at the shallowest indentation each become one
+    entry; deeper lines (sub-bullets, continuations) stay with their item.
+    Headings and text outside lists are ignored.
+    
+    Returns:
+        Item texts in document order
+    """
+    lines = markdown.splitlines()
+    indents = [len(line) - len(line.lstrip()) for line in lines if _LIST_ITEM.match(line) and _parse_heading(line) is None]
+    if not indents:
+        return []
+    top = min(indents)
+    
+    items: List[List[str]] = []
+    for line in lines:
+        indent = len(line) - len(line.lstrip())
+        if _parse_heading(line) is not None and indent <= top:
+            items.append([])
+            continue
+        match = _LIST_ITEM.match(line)
+        if match and indent == top:
+            items.append([match.group(1)])
+        elif items and items[-1] and line.strip():
+            items[-1].append(match.group(1) if match else line.strip())
+    return [" ".join(item) for item in items if item]
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> Tuple[str, int]:
+    """
+    Shorten text to about max_tokens, keeping its beginning and end
+    
+    Args:
+        text: Text to shorten
+        max_tokens: Token allowance
+    
+    Returns:
+        Tuple of (possibly shortened text, estimated tokens removed)
+    """
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text, 0
+    if max_tokens <= 0:
+        return "", tokens
+    
+    keep_chars = int(len(text) * max_tokens / tokens)
+    head = text[:keep_chars * 2 // 3]
+    tail = text[len(text) - keep_chars // 3:]
+    # Cut on line boundaries so markdown structure survives
+    if "\n" in head:
+        head = head[:head.rfind("\n")]
+    if "\n" in tail:
+        tail = tail[tail.find("\n") + 1:]
+    
+    trimmed = tokens - estimate_tokens(head) - estimate_tokens(tail)
+    return f"{head}\n\n[... ~{trimmed} tokens trimmed ...]\n\n{tail}", trimmed
+
+
+class PromptBudget:
+    """Fits the variable sections of a prompt into a token budget"""
+    
+    def __init__(self, max_tokens: int):
+        """
+        Initialize budget
+        
+        Args:
+            max_tokens: Total prompt allowance, including instructions and template
+        """
+        self.max_tokens = max_tokens
+    
+    def fit(self, sections: Dict[str, str], reserved_tokens: int) -> Tuple[Dict[str, str], Dict[str, Any]]:
+        """
+        Trim sections so that they fit next to the fixed part of the prompt
+        
+        Sections smaller than an even share keep their full text and the
+        remainder is split between the larger ones.
+        
+        Args:
+            sections: Section name to text
+            reserved_tokens: Tokens of the fixed part (instructions, template, task)
+        
+        Returns:
+            Tuple of (fitted sections, report with per-section sizes and trimmed tokens)
+        """
+        sizes = {name: estimate_tokens(text) for name, text in sections.items()}
+        available = max(0, self.max_tokens - reserved_tokens)
+        
+        allowances = dict(sizes)
+        if sum(sizes.values()) > available:
+            remaining = available
+            ordered = sorted(sizes, key=sizes.get)
+            for position, name in enumerate(ordered):
+                share = remaining // (len(ordered) - position)
+                allowances[name] = min(sizes[name], share)
+                remaining -= allowances[name]
+        
+        fitted = {}
+        report_sections = {}
+        for name, text in sections.items():
+            fitted[name], trimmed = trim_to_tokens(text, allowances[name])
+            report_sections[name] = {"tokens": sizes[name], "trimmed_tokens": trimmed}
+        
+        return fitted, {
+            "budget_tokens": self.max_tokens,
+            "sections": report_sections,
+            "trimmed_tokens": sum(section["trimmed_tokens"] for section in report_sections.values())
+        }
+
+
+def _parse_heading(line: str) -> Optional[Tuple[int, str]]:
+    """
+    Recognize a heading line
+    
+    Returns:
+        Tuple of (level, title), or None if the line is not a heading.
+        Numbered and bold headings rank below all '#' headings.
+    """
+    match = _MARKDOWN_HEADING.match(line)
+    if match:
+        return len(match.group(1)), match.group(2)
+    
+    match = _NUMBERED_HEADING.match(line) or _BOLD_HEADING.match(line)
+    if match:
+        title = match.group(1).strip("*: ")
+        letters = [char for char in title if char.isalpha()]
+        # Numbered lines are only headings when written in caps, not ordinary list items
+        if match.re is _BOLD_HEADING or (letters and sum(char.isupper() for char in letters) >= 0.8 * len(letters)):
+            return 7, title
+    return None
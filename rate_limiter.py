@@ -0,0 +1,348 @@
+"""
+Client-side rate limiting for OpenRouter API calls
+
+Two token buckets, requests per minute and tokens per minute, are kept in a
+small SQLite file so that every agent, thread and worker process on the
+machine draws from the same budget. Buckets refill continuously and are
+tightened from the provider's x-ratelimit-* response headers, so concurrent
+workflows slow down before the provider starts answering with 429s. The
+headers do not say which window their limit covers, so they only ever lower
+a bucket's capacity below the configured budget; the refill rate always stays
+at the configured per-minute rate, and the reset headers decide how long an
+exhausted bucket stays blocked.
+"""
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Iterator, Mapping
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_limiter: Optional["RateLimiter"] = None
+_limiter_lock = threading.Lock()
+
+# Longest single sleep while waiting, so header updates from other callers are picked up
+MAX_POLL_SECONDS = 1.0
+
+# Header name variants, OpenAI style first and plain (OpenRouter) style as fallback
+HEADER_NAMES = {
+    "requests": {
+        "limit": ("x-ratelimit-limit-requests", "x-ratelimit-limit"),
+        "remaining": ("x-ratelimit-remaining-requests", "x-ratelimit-remaining"),
+        "reset": ("x-ratelimit-reset-requests", "x-ratelimit-reset")
+    },
+    "tokens": {
+        "limit": ("x-ratelimit-limit-tokens",),
+        "remaining": ("x-ratelimit-remaining-tokens",),
+        "reset": ("x-ratelimit-reset-tokens",)
+    }
+}
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+class RateLimiter:
+    """Shared requests-per-minute and tokens-per-minute token buckets"""
+    
+    def __init__(self, path: str, requests_per_minute: int, tokens_per_minute: int):
+        """
+        Initialize rate limiter
+        
+        Args:
+            path: SQLite file holding the shared bucket state
+            requests_per_minute: Request budget; 0 disables the request bucket
+            tokens_per_minute: Token budget; 0 disables the token bucket
+        """
+        self.path = path
+        self.capacities = {"requests": float(requests_per_minute), "tokens": float(tokens_per_minute)}
+        self.rates = {name: capacity / 60.0 for name, capacity in self.capacities.items()}
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self._counter_lock = threading.Lock()
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._transaction() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS buckets (
+                    name TEXT PRIMARY KEY,
+                    capacity REAL NOT NULL,
+                    level REAL NOT NULL,
+                    blocked_until REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            now = time.time()
+            for name, capacity in self.capacities.items():
+                conn.execute(
+                    "INSERT INTO buckets (name, capacity, level, blocked_until, updated_at) "
+                    "VALUES (?, ?, ?, 0, ?) ON CONFLICT(name) DO UPDATE SET capacity = excluded.capacity",
+                    (name, capacity, capacity, now)
+                )
+    
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Block until one request and ``tokens`` tokens are available, then take them
+        
+        Args:
+            tokens: Estimated tokens the request will consume
+        
+        Returns:
+            Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            wait = self._try_acquire(tokens)
+            if wait <= 0:
+                break
+            sleep = min(wait, MAX_POLL_SECONDS)
+            time.sleep(sleep)
+            waited += sleep
+        self._record_wait(waited)
+        return waited
+    
+    async def aacquire(self, tokens: int = 0) -> float:
+        """Async variant of acquire that sleeps without blocking the event loop"""
+        waited = 0.0
+        while True:
+            wait = await asyncio.to_thread(self._try_acquire, tokens)
+            if wait <= 0:
+                break
+            sleep = min(wait, MAX_POLL_SECONDS)
+            await asyncio.sleep(sleep)
+            waited += sleep
+        self._record_wait(waited)
+        return waited
+    
+    def adjust_tokens(self, delta: int):
+        """
+        Correct the token bucket once the real usage of a request is known
+        
+        Args:
+            delta: Actual tokens minus the estimate taken at acquire time
+        """
+        if not delta:
+            return
+        with self._transaction() as conn:
+            bucket = self._load(conn, "tokens", time.time())
+            if bucket["capacity"] > 0:
+                # May go negative, which makes later callers wait off the debt
+                bucket["level"] = min(bucket["capacity"], bucket["level"] - delta)
+                self._save(conn, "tokens", bucket)
+    
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """
+        Tighten the buckets from x-ratelimit-* response headers
+        
+        An advertised limit below the configured budget lowers the bucket
+        capacity (it never raises it, since the header's window is unknown),
+        a lower remaining count drains the bucket, and an exhausted bucket is
+        blocked until the advertised reset time.
+        
+        Args:
+            headers: Response headers (case-insensitive mapping)
+        """
+        updates = {}
+        for name, fields in HEADER_NAMES.items():
+            values = {field: _first_header(headers, candidates) for field, candidates in fields.items()}
+            if any(value is not None for value in values.values()):
+                updates[name] = values
+        if not updates:
+            return
+        
+        now = time.time()
+        with self._transaction() as conn:
+            for name, values in updates.items():
+                bucket = self._load(conn, name, now)
+                limit = _parse_number(values["limit"])
+                remaining = _parse_number(values["remaining"])
+                reset = parse_reset(values["reset"], now)
+                
+                if limit is not None and limit > 0 and self.capacities[name] > 0:
+                    bucket["capacity"] = min(self.capacities[name], limit)
+                    bucket["level"] = min(bucket["level"], bucket["capacity"])
+                if remaining is not None:
+                    bucket["level"] = min(bucket["level"], remaining)
+                    if remaining < 1 and reset is not None:
+                        bucket["blocked_until"] = max(bucket["blocked_until"], now + reset)
+                self._save(conn, name, bucket)
+    
+    def block_for(self, seconds: float):
+        """Hold back all requests for a number of seconds, e.g. after a 429 with Retry-After"""
+        until = time.time() + seconds
+        with self._transaction() as conn:
+            conn.execute("UPDATE buckets SET blocked_until = MAX(blocked_until, ?) WHERE name = 'requests'", (until,))
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get current bucket levels and how long callers have waited"""
+        now = time.time()
+        with self._transaction() as conn:
+            buckets = {name: self._load(conn, name, now) for name in self.capacities}
+        return {
+            "buckets": {
+                name: {
+                    "capacity": bucket["capacity"],
+                    "available": round(bucket["level"], 2),
+                    "blocked_seconds": round(max(0.0, bucket["blocked_until"] - now), 2)
+                }
+                for name, bucket in buckets.items()
+            },
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 3)
+        }
+    
+    def _try_acquire(self, tokens: int) -> float:
+        """
+        Take one request and ``tokens`` tokens if available
+        
+        Returns:
+            0 on success, otherwise seconds until the request could fit
+        """
+        needs = {"requests": 1.0, "tokens": float(tokens)}
+        now = time.time()
+        with self._transaction() as conn:
+            buckets = {name: self._load(conn, name, now) for name in needs}
+            
+            wait = 0.0
+            for name, bucket in buckets.items():
+                capacity = bucket["capacity"]
+                if capacity <= 0:
+                    continue
+                # A request larger than the whole bucket waits for a full bucket only
+                need = min(needs[name], capacity)
+                wait = max(wait, bucket["blocked_until"] - now)
+                if bucket["level"] < need:
+                    wait = max(wait, (need - bucket["level"]) / self.rates[name])
+            
+            if wait <= 0:
+                for name, bucket in buckets.items():
+                    if bucket["capacity"] > 0:
+                        bucket["level"] -= min(needs[name], bucket["capacity"])
+            for name, bucket in buckets.items():
+                self._save(conn, name, bucket)
+        return wait
+    
+    def _load(self, conn: sqlite3.Connection, name: str, now: float) -> Dict[str, float]:
+        """Read a bucket and refill it at the configured rate for the time elapsed since its last update"""
+        capacity, level, blocked_until, updated_at = conn.execute(
+            "SELECT capacity, level, blocked_until, updated_at FROM buckets WHERE name = ?", (name,)
+        ).fetchone()
+        elapsed = max(0.0, now - updated_at)
+        return {
+            "capacity": capacity,
+            "level": min(capacity, level + elapsed * self.rates[name]),
+            "blocked_until": blocked_until,
+            "updated_at": now
+        }
+    
+    @staticmethod
+    def _save(conn: sqlite3.Connection, name: str, bucket: Dict[str, float]):
+        """Write a bucket back"""
+        conn.execute(
+            "UPDATE buckets SET capacity = ?, level = ?, blocked_until = ?, updated_at = ? WHERE name = ?",
+            (bucket["capacity"], bucket["level"], bucket["blocked_until"], bucket["updated_at"], name)
+        )
+    
+    def _record_wait(self, waited: float):
+        """Count a throttled acquire"""
+        if waited <= 0:
+            return
+        logger.debug(f"Rate limiter delayed a request by {waited:.2f}s")
+        with self._counter_lock:
+            self.waits += 1
+            self.wait_seconds += waited
+    
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection holding the write lock, so read-modify-write is atomic across processes"""
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+
+def parse_reset(value: Optional[str], now: float) -> Optional[float]:
+    """
+    Parse a rate limit reset header into seconds from now
+    
+    Accepts durations such as "1s", "6m0s" or "250ms", plain seconds, and
+    absolute Unix timestamps in seconds or milliseconds.
+    
+    Returns:
+        Seconds until the limit resets, or None if absent or unparseable
+    """
+    if not value:
+        return None
+    value = value.strip()
+    number = _parse_number(value)
+    if number is not None:
+        if number > 1e12:
+            return max(0.0, number / 1000.0 - now)
+        if number > 1e9:
+            return max(0.0, number - now)
+        return max(0.0, number)
+    
+    parts = _DURATION_PART.findall(value)
+    if not parts or "".join(amount + unit for amount, unit in parts) != value:
+        return None
+    scale = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    return sum(float(amount) * scale[unit] for amount, unit in parts)
+
+
+def _parse_number(value: Optional[str]) -> Optional[float]:
+    """Parse a numeric header value"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _first_header(headers: Mapping[str, str], names: tuple) -> Optional[str]:
+    """Get the first present header among alternative names"""
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            return value
+    return None
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """
+    Get the process-wide rate limiter
+    
+    Returns:
+        Shared RateLimiter, or None when RATE_LIMIT_ENABLED is off
+    """
+    global _limiter
+    if not Config.RATE_LIMIT_ENABLED:
+        return None
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter(
+                    Config.RATE_LIMIT_STATE_PATH,
+                    requests_per_minute=Config.RATE_LIMIT_RPM,
+                    tokens_per_minute=Config.RATE_LIMIT_TPM
+                )
+                logger.info(
+                    f"Rate limiter enabled: {Config.RATE_LIMIT_RPM} requests/min, "
+                    f"{Config.RATE_LIMIT_TPM or 'unlimited'} tokens/min"
+                )
+    return _limiter
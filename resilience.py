@@ -0,0 +1,154 @@
+"""
+Retry, backoff and hedging helpers for OpenRouter API calls
+"""
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from config import Config
+
+# Statuses worth retrying: timeouts, rate limits and transient upstream failures
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class LLMAPIError(Exception):
+    """An OpenRouter API call failed at the HTTP or transport level"""
+    
+    def __init__(self, message: str, status_code: Optional[int] = None,
+                 retry_after: Optional[float] = None, retryable: bool = False):
+        """
+        Initialize error
+        
+        Args:
+            message: Error description
+            status_code: HTTP status, or None for transport errors (timeouts, resets)
+            retry_after: Server-requested delay in seconds, if any
+            retryable: Whether repeating the request may succeed
+        """
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.retryable = retryable
+    
+    @classmethod
+    def from_status(cls, message: str, status_code: int, retry_after_header: Optional[str] = None) -> "LLMAPIError":
+        """Build an error for an HTTP error status"""
+        return cls(
+            message,
+            status_code=status_code,
+            retry_after=parse_retry_after(retry_after_header),
+            retryable=status_code in RETRYABLE_STATUS_CODES or status_code >= 520
+        )
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header value
+    
+    Args:
+        value: Delay in seconds or an HTTP date
+    
+    Returns:
+        Seconds to wait, or None if absent or unparseable
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter that honours Retry-After"""
+    
+    def __init__(self, max_retries: int, base_delay: float, max_delay: float, max_retry_after: float):
+        """
+        Initialize policy
+        
+        Args:
+            max_retries: Retries after the first attempt
+            base_delay: Backoff base in seconds (doubled per attempt)
+            max_delay: Cap on the computed backoff
+            max_retry_after: Cap on server-requested Retry-After delays
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+    
+    @classmethod
+    def from_config(cls) -> "RetryPolicy":
+        """Build the policy from Config"""
+        return cls(
+            max_retries=Config.MAX_RETRIES,
+            base_delay=Config.RETRY_BACKOFF_BASE,
+            max_delay=Config.RETRY_BACKOFF_MAX,
+            max_retry_after=Config.RETRY_AFTER_MAX
+        )
+    
+    def should_retry(self, error: Exception, attempt: int) -> bool:
+        """Whether a failed attempt (0-based) should be retried"""
+        return attempt < self.max_retries and isinstance(error, LLMAPIError) and error.retryable
+    
+    def delay(self, error: Exception, attempt: int) -> float:
+        """Seconds to wait before retrying a failed attempt (0-based)"""
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class LatencyTracker:
+    """Sliding window of recent call latencies for deriving hedge delays"""
+    
+    def __init__(self, window: int = 200):
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+    
+    def record(self, seconds: float):
+        """Record one successful call latency"""
+        with self._lock:
+            self._samples.append(seconds)
+    
+    def percentile(self, percentile: float, min_samples: int = 1) -> Optional[float]:
+        """
+        Get a latency percentile
+        
+        Returns:
+            The percentile in seconds, or None with fewer than min_samples samples
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < max(1, min_samples):
+            return None
+        index = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+        return samples[index]
+
+
+# Shared by all agents so hedge delays reflect the whole process's traffic
+latency_tracker = LatencyTracker()
+
+
+def hedge_delay() -> Optional[float]:
+    """
+    Delay after which a duplicate (hedged) request should be fired
+    
+    Returns:
+        Seconds to wait for the primary request, or None when hedging is
+        disabled or there are not yet enough latency samples
+    """
+    if not Config.HEDGE_ENABLED:
+        return None
+    delay = latency_tracker.percentile(Config.HEDGE_PERCENTILE, Config.HEDGE_MIN_SAMPLES)
+    if delay is None:
+        return None
+    return max(delay, Config.HEDGE_MIN_DELAY)
@@ -0,0 +1,154 @@
+"""
+Compact serialization of workflow results
+
+In memory the results of execute_workflow share their step outputs: the
+same object appears under "steps", in "workflow_context" (the inner
+"result" of each step) and in every "history" entry. Serialized as JSON
+each of those references becomes a full copy, roughly tripling the size of
+what the API returns and what is stored under results/.
+
+The compact format stores every distinct step output once in "bodies" and
+replaces the other occurrences by references:
+
+- "steps": step name -> body ID
+- "workflow_context": values that are a body's inner result become
+  {"$ref": body ID, "$path": "result"}
+- "history": each entry's "result" is replaced by "ref": body ID
+
+expand_results rebuilds the original shape; static/js/app.js and the
+GitHub Pages scripts carry the same expander as expandResults().
+"""
+import hashlib
+import json
+import re
+from typing import Dict, Any, Optional
+
+from config import Config
+
+COMPACT_FORMAT = "compact/1"
+
+
+def compact_results(results: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert workflow results to the compact format
+    
+    Bodies are matched by content, so results restored from a checkpoint
+    (where the copies are no longer shared objects) compact just as well.
+    
+    Args:
+        results: Results as returned by execute_workflow
+    
+    Returns:
+        Compact results; other top-level keys are kept as they are
+    """
+    if results.get("format") == COMPACT_FORMAT:
+        return results
+    
+    bodies: Dict[str, Any] = {}
+    body_ids: Dict[str, str] = {}
+    result_ids: Dict[str, str] = {}
+    
+    def add_body(preferred_id: str, body: Any) -> str:
+        fingerprint = _fingerprint(body)
+        if fingerprint in body_ids:
+            return body_ids[fingerprint]
+        body_id = preferred_id
+        suffix = 2
+        while body_id in bodies:
+            body_id = f"{preferred_id}_{suffix}"
+            suffix += 1
+        bodies[body_id] = body
+        body_ids[fingerprint] = body_id
+        if isinstance(body, dict) and "result" in body:
+            result_ids.setdefault(_fingerprint(body["result"]), body_id)
+        return body_id
+    
+    compact = {key: value for key, value in results.items() if key not in ("steps", "workflow_context", "history")}
+    compact["format"] = COMPACT_FORMAT
+    
+    if "steps" in results:
+        compact["steps"] = {name: add_body(name, output) for name, output in results["steps"].items()}
+    
+    if "history" in results:
+        compact["history"] = []
+        for entry in results["history"]:
+            entry = dict(entry)
+            entry["ref"] = add_body(_slug(entry.get("step", "step")), entry.pop("result", None))
+            compact["history"].append(entry)
+    
+    if "workflow_context" in results:
+        context = {}
+        for key, value in results["workflow_context"].items():
+            body_id = result_ids.get(_fingerprint(value)) if isinstance(value, (dict, list, str)) and value else None
+            context[key] = {"$ref": body_id, "$path": "result"} if body_id else value
+        compact["workflow_context"] = context
+    
+    compact["bodies"] = bodies
+    return compact
+
+
+def expand_results(results: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rebuild the original results shape from the compact format
+    
+    Args:
+        results: Compact results (other results are returned unchanged)
+    
+    Returns:
+        Results with steps, workflow_context and history holding the step outputs
+    """
+    if results.get("format") != COMPACT_FORMAT:
+        return results
+    
+    bodies = results.get("bodies", {})
+    expanded = {key: value for key, value in results.items() if key not in ("format", "bodies")}
+    
+    if "steps" in results:
+        expanded["steps"] = {name: bodies.get(body_id) for name, body_id in results["steps"].items()}
+    
+    if "history" in results:
+        expanded["history"] = []
+        for entry in results["history"]:
+            entry = dict(entry)
+            entry["result"] = bodies.get(entry.pop("ref", None))
+            expanded["history"].append(entry)
+    
+    if "workflow_context" in results:
+        expanded["workflow_context"] = {
+            key: _resolve(value, bodies) for key, value in results["workflow_context"].items()
+        }
+    
+    return expanded
+
+
+def format_results(results: Optional[Dict[str, Any]], result_format: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Prepare results for serialization
+    
+    Args:
+        results: Results as returned by execute_workflow
+        result_format: "compact" or "full" (default RESULT_FORMAT, the format stored on disk)
+    """
+    if results is None or (result_format or Config.RESULT_FORMAT).lower() != "compact":
+        return results
+    return compact_results(results)
+
+
+def _resolve(value: Any, bodies: Dict[str, Any]) -> Any:
+    """Replace a {"$ref", "$path"} reference by the value it points to"""
+    if not (isinstance(value, dict) and "$ref" in value):
+        return value
+    target = bodies.get(value["$ref"])
+    path = value.get("$path")
+    return target.get(path) if path and isinstance(target, dict) else target
+
+
+def _fingerprint(value: Any) -> str:
+    """Content hash of a JSON value"""
+    encoded = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def _slug(label: str) -> str:
+    """Body ID for a history label, e.g. "Final Review" -> "final_review" """
+    return re.sub(r"[^a-z0-9]+", "_", str(label).lower()).strip("_") or "step"
@@ -0,0 +1,465 @@
+"""
+Indexed storage for workflow results
+
+Results used to be loose ``results/<id>.json`` and ``<id>.status.json``
+files, so finding runs by status, date or task meant parsing every file.
+A ResultsStore keeps an index of request_id, status, timestamps and task
+hash next to the result bodies. Two backends share the interface:
+
+- FilesystemResultsStore keeps the per-request JSON files (the GitHub Pages
+  frontend fetches them directly) plus an ``index.json`` with one entry per
+  finished request, so listings read a single file, and a small
+  ``manifest.json`` (request ID to status, size, digest and updated_at of the
+  most recent requests) that the frontend polls instead of the result files.
+  Both are derived from the per-request files and only rewritten when a
+  request reaches a terminal status, so progress updates stay O(1)
+- SQLiteResultsStore keeps everything in one SQLite file with indexed
+  columns and zlib-compressed bodies, for tens of thousands of runs
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Iterator
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Index fields kept for every request
+INDEX_FIELDS = ("request_id", "status", "task_hash", "created_at", "updated_at", "size", "digest")
+
+# Index fields published per request in the filesystem manifest
+MANIFEST_FIELDS = ("status", "size", "digest", "updated_at")
+
+# Statuses after which a request's result no longer changes
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+def task_hash(task: str) -> str:
+    """Hash a task description, ignoring case and whitespace differences"""
+    normalized = " ".join(task.lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def body_digest(encoded: bytes) -> str:
+    """Short content digest of a serialized result body"""
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+class ResultsStore(ABC):
+    """Interface of a workflow results store"""
+    
+    @abstractmethod
+    def save_status(self, request_id: str, status: str, task: Optional[str] = None, **fields: Any):
+        """
+        Record the status of a request
+        
+        Args:
+            request_id: Request identifier
+            status: "running", "completed" or "failed"
+            task: Task description; indexed by hash when given
+            fields: Further status fields (started_at, completed_at, error, ...)
+        """
+        raise NotImplementedError
+    
+    @abstractmethod
+    def save_result(self, request_id: str, result: Dict[str, Any]):
+        """
+        Store the result body of a request
+        
+        Args:
+            request_id: Request identifier
+            result: JSON-serializable result record
+        """
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_status(self, request_id: str) -> Optional[Dict[str, Any]]:
+        """Get the status record of a request, or None if unknown"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get_result(self, request_id: str) -> Optional[Dict[str, Any]]:
+        """Get the result body of a request, or None if there is none"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def list_results(self, status: Optional[str] = None, since: Optional[str] = None,
+                     until: Optional[str] = None, task: Optional[str] = None,
+                     limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        List index entries, most recently updated first
+        
+        Args:
+            status: Only requests with this status
+            since: Only requests updated at or after this ISO timestamp
+            until: Only requests updated before this ISO timestamp
+            task: Only requests for this task (matched by task hash)
+            limit: Maximum number of entries
+        
+        Returns:
+            Index entries with request_id, status, task_hash, created_at,
+            updated_at, and size (in bytes) and digest of the stored result body
+        """
+        raise NotImplementedError
+    
+    @abstractmethod
+    def delete(self, request_id: str):
+        """Remove a request's status and result, if present"""
+        raise NotImplementedError
+
+
+class FilesystemResultsStore(ResultsStore):
+    """Per-request JSON files plus a single index file and a polling manifest"""
+    
+    INDEX_FILE = "index.json"
+    MANIFEST_FILE = "manifest.json"
+    
+    def __init__(self, directory: str):
+        """
+        Initialize store
+        
+        Args:
+            directory: Directory holding <id>.json, <id>.status.json, index.json
+                and manifest.json
+        """
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(os.path.join(directory, self.INDEX_FILE)):
+            self.rebuild_index()
+    
+    def save_status(self, request_id: str, status: str, task: Optional[str] = None, **fields: Any):
+        """Write <id>.status.json, and update the index once the request reaches a terminal status"""
+        # Keep the task and start time of an earlier status, so the index can be rebuilt from this file alone
+        previous = self.get_status(request_id) or {}
+        record = {field: previous[field] for field in ("task", "started_at") if field in previous}
+        record.update(fields, status=status, request_id=request_id)
+        if task is not None:
+            record["task"] = task
+        task = record.get("task")
+        with self._lock:
+            self._write_json(self._path(request_id, ".status.json"), record)
+            if status in TERMINAL_STATUSES:
+                size, digest = self._result_digest(request_id)
+                self._update_index(request_id, status=status, task=task, size=size, digest=digest,
+                                   created_at=record.get("started_at"))
+    
+    def save_result(self, request_id: str, result: Dict[str, Any]):
+        """Write <id>.json, and update the index if the request has already finished"""
+        with self._lock:
+            encoded = self._write_json(self._path(request_id, ".json"), result)
+            status = (self.get_status(request_id) or {}).get("status")
+            if status in TERMINAL_STATUSES:
+                self._update_index(request_id, status=status, size=len(encoded), digest=body_digest(encoded))
+    
+    def get_status(self, request_id: str) -> Optional[Dict[str, Any]]:
+        return self._read_json(self._path(request_id, ".status.json"))
+    
+    def get_result(self, request_id: str) -> Optional[Dict[str, Any]]:
+        return self._read_json(self._path(request_id, ".json"))
+    
+    def list_results(self, status: Optional[str] = None, since: Optional[str] = None,
+                     until: Optional[str] = None, task: Optional[str] = None,
+                     limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        wanted_hash = task_hash(task) if task is not None else None
+        entries = [
+            entry for entry in self._load_index().values()
+            if (status is None or entry["status"] == status)
+            and (since is None or entry["updated_at"] >= since)
+            and (until is None or entry["updated_at"] < until)
+            and (wanted_hash is None or entry["task_hash"] == wanted_hash)
+        ]
+        entries.sort(key=lambda entry: entry["updated_at"], reverse=True)
+        return entries[:limit] if limit is not None else entries
+    
+    def delete(self, request_id: str):
+        with self._lock:
+            for suffix in (".json", ".status.json"):
+                path = self._path(request_id, suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+            index = self._load_index()
+            if index.pop(request_id, None) is not None:
+                self._write_index(index)
+    
+    def rebuild_index(self):
+        """Rebuild index.json and manifest.json from the status and result files in the directory"""
+        index: Dict[str, Dict[str, Any]] = {}
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".status.json") or name.startswith("."):
+                continue
+            request_id = name[:-len(".status.json")]
+            try:
+                record = self._read_json(os.path.join(self.directory, name)) or {}
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable status file {name}: {str(e)}")
+                continue
+            if record.get("status") not in TERMINAL_STATUSES:
+                continue
+            result_path = os.path.join(self.directory, f"{request_id}.json")
+            encoded = None
+            if os.path.exists(result_path):
+                with open(result_path, "rb") as f:
+                    encoded = f.read()
+            modified = datetime.fromtimestamp(os.path.getmtime(os.path.join(self.directory, name))).isoformat()
+            index[request_id] = {
+                "request_id": request_id,
+                "status": record["status"],
+                "task_hash": task_hash(record["task"]) if record.get("task") else None,
+                "created_at": record.get("started_at") or modified,
+                "updated_at": record.get("completed_at") or modified,
+                "size": len(encoded) if encoded is not None else None,
+                "digest": body_digest(encoded) if encoded is not None else None
+            }
+        with self._lock:
+            self._write_index(index)
+        logger.info(f"Indexed {len(index)} results in {self.directory}")
+    
+    def _result_digest(self, request_id: str):
+        """
+        Size and digest of a stored result body
+        
+        Returns:
+            Tuple of (size in bytes, digest), or (None, None) if there is no result
+        """
+        path = self._path(request_id, ".json")
+        if not os.path.exists(path):
+            return None, None
+        with open(path, "rb") as f:
+            encoded = f.read()
+        return len(encoded), body_digest(encoded)
+    
+    def _update_index(self, request_id: str, status: Optional[str] = None, task: Optional[str] = None,
+                      size: Optional[int] = None, digest: Optional[str] = None,
+                      created_at: Optional[str] = None):
+        """Create or update a request's index entry (caller holds the lock)"""
+        now = datetime.now().isoformat()
+        index = self._load_index()
+        entry = index.setdefault(request_id, {
+            "request_id": request_id,
+            "status": "unknown",
+            "task_hash": None,
+            "created_at": created_at or now,
+            "updated_at": now,
+            "size": None,
+            "digest": None
+        })
+        entry["updated_at"] = now
+        if status is not None:
+            entry["status"] = status
+        if task is not None:
+            entry["task_hash"] = task_hash(task)
+        if size is not None:
+            entry["size"] = size
+        if digest is not None:
+            entry["digest"] = digest
+        self._write_index(index)
+    
+    def _write_index(self, index: Dict[str, Dict[str, Any]]):
+        """
+        Write index.json and the manifest derived from it (caller holds the lock)
+        
+        The manifest lists the RESULTS_MANIFEST_MAX_ENTRIES most recently
+        updated requests, so it stays small however many runs are stored.
+        """
+        self._write_json(os.path.join(self.directory, self.INDEX_FILE), index)
+        recent = sorted(index.values(), key=lambda entry: entry["updated_at"], reverse=True)
+        self._write_json(os.path.join(self.directory, self.MANIFEST_FILE), {
+            "updated_at": datetime.now().isoformat(),
+            "results": {
+                entry["request_id"]: {field: entry.get(field) for field in MANIFEST_FIELDS}
+                for entry in recent[:Config.RESULTS_MANIFEST_MAX_ENTRIES]
+            }
+        })
+    
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        """Read the index, request_id to entry"""
+        return self._read_json(os.path.join(self.directory, self.INDEX_FILE)) or {}
+    
+    def _write_json(self, path: str, data: Any) -> bytes:
+        """
+        Atomically write compact JSON
+        
+        Returns:
+            The bytes written
+        """
+        encoded = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".results.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(encoded)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return encoded
+    
+    @staticmethod
+    def _read_json(path: str) -> Optional[Any]:
+        """Read a JSON file, or None if it does not exist"""
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    
+    def _path(self, request_id: str, suffix: str) -> str:
+        """File path for a request"""
+        if (os.sep in request_id or (os.altsep and os.altsep in request_id) or request_id.startswith(".")
+                or f"{request_id}{suffix}" in (self.INDEX_FILE, self.MANIFEST_FILE)):
+            raise ValueError(f"Invalid request_id: {request_id}")
+        return os.path.join(self.directory, f"{request_id}{suffix}")
+
+
+class SQLiteResultsStore(ResultsStore):
+    """Single SQLite file with indexed columns and zlib-compressed bodies"""
+    
+    def __init__(self, path: str):
+        """
+        Initialize store
+        
+        Args:
+            path: SQLite database file
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS results (
+                    request_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    task_hash TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    size INTEGER,
+                    digest TEXT,
+                    status_record BLOB,
+                    body BLOB
+                )"""
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(results)")}
+            if "digest" not in columns:
+                conn.execute("ALTER TABLE results ADD COLUMN digest TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_status ON results (status, updated_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_updated ON results (updated_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_task ON results (task_hash)")
+    
+    def save_status(self, request_id: str, status: str, task: Optional[str] = None, **fields: Any):
+        record = dict(fields, status=status, request_id=request_id)
+        if task is not None:
+            record["task"] = task
+        now = datetime.now().isoformat()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO results (request_id, status, task_hash, created_at, updated_at, status_record) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(request_id) DO UPDATE SET status = excluded.status, "
+                "task_hash = COALESCE(excluded.task_hash, results.task_hash), "
+                "updated_at = excluded.updated_at, status_record = excluded.status_record",
+                (request_id, status, task_hash(task) if task is not None else None, now, now, self._pack(record))
+            )
+    
+    def save_result(self, request_id: str, result: Dict[str, Any]):
+        encoded = json.dumps(result, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        now = datetime.now().isoformat()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO results (request_id, status, created_at, updated_at, size, digest, body) "
+                "VALUES (?, 'unknown', ?, ?, ?, ?, ?) "
+                "ON CONFLICT(request_id) DO UPDATE SET updated_at = excluded.updated_at, "
+                "size = excluded.size, digest = excluded.digest, body = excluded.body",
+                (request_id, now, now, len(encoded), body_digest(encoded), zlib.compress(encoded))
+            )
+    
+    def get_status(self, request_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT status_record FROM results WHERE request_id = ?", (request_id,)).fetchone()
+        return self._unpack(row[0]) if row and row[0] is not None else None
+    
+    def get_result(self, request_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT body FROM results WHERE request_id = ?", (request_id,)).fetchone()
+        return self._unpack(row[0]) if row and row[0] is not None else None
+    
+    def list_results(self, status: Optional[str] = None, since: Optional[str] = None,
+                     until: Optional[str] = None, task: Optional[str] = None,
+                     limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        clauses, params = [], []
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if since is not None:
+            clauses.append("updated_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("updated_at < ?")
+            params.append(until)
+        if task is not None:
+            clauses.append("task_hash = ?")
+            params.append(task_hash(task))
+        
+        query = f"SELECT {', '.join(INDEX_FIELDS)} FROM results"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY updated_at DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [dict(zip(INDEX_FIELDS, row)) for row in rows]
+    
+    def delete(self, request_id: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM results WHERE request_id = ?", (request_id,))
+    
+    @staticmethod
+    def _pack(data: Any) -> bytes:
+        """Serialize and compress a record"""
+        return zlib.compress(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    
+    @staticmethod
+    def _unpack(blob: bytes) -> Any:
+        """Decompress and parse a record"""
+        return json.loads(zlib.decompress(blob).decode("utf-8"))
+    
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection that commits on success and is always closed"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+def get_results_store(backend: Optional[str] = None) -> ResultsStore:
+    """
+    Create the configured results store
+    
+    Args:
+        backend: "filesystem" or "sqlite" (default RESULTS_BACKEND)
+    
+    Returns:
+        Store rooted at RESULTS_DIR or RESULTS_DB_PATH
+    """
+    backend = (backend or Config.RESULTS_BACKEND).lower()
+    if backend == "sqlite":
+        return SQLiteResultsStore(Config.RESULTS_DB_PATH)
+    if backend == "filesystem":
+        return FilesystemResultsStore(Config.RESULTS_DIR)
+    raise ValueError(f"Unknown results backend: {backend} (expected 'filesystem' or 'sqlite')")
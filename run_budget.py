@@ -0,0 +1,184 @@
+"""
+Wall-clock and token budgets for a whole workflow run
+
+Config.TIMEOUT and Config.MAX_TOKENS apply to each call on its own, so a run
+of seven calls can take seven times as long. A RunBudget bounds the run as a
+whole: while it is active, every call gets an HTTP timeout and a max_tokens
+taken from what remains, calls fail fast with BudgetExhaustedError once the
+budget is spent, and the orchestrator skips or degrades optional steps it
+can no longer afford. The budget lives in a ContextVar, which asyncio tasks
+and asyncio.to_thread workers inherit.
+
+Token usage is charged when calls finish, so calls running concurrently
+(e.g. research fan-out) can overshoot the token budget by their own size.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Iterator
+
+from config import Config
+from metrics import collect_calls
+from resilience import LLMAPIError
+
+_current_budget: contextvars.ContextVar = contextvars.ContextVar("run_budget", default=None)
+
+
+class BudgetExhaustedError(LLMAPIError):
+    """The run's deadline passed or its token budget ran out; never retried"""
+    
+    def __init__(self, message: str):
+        super().__init__(message, retryable=False)
+
+
+class RunBudget:
+    """Deadline and token allowance shared by all calls of one run"""
+    
+    def __init__(self, deadline_seconds: Optional[float] = None, max_tokens: Optional[int] = None,
+                 min_completion_tokens: Optional[int] = None):
+        """
+        Initialize budget; the clock starts now
+        
+        Args:
+            deadline_seconds: Wall-clock allowance for the run, or None for no deadline
+            max_tokens: Prompt plus completion tokens for the run, or None for no limit
+            min_completion_tokens: Smallest max_tokens worth sending; calls that
+                cannot get this many fail instead
+        """
+        self.deadline_seconds = deadline_seconds
+        self.max_tokens = max_tokens
+        self.min_completion_tokens = min_completion_tokens or Config.RUN_BUDGET_MIN_COMPLETION_TOKENS
+        self.skipped: List[Dict[str, str]] = []
+        self.degraded: List[Dict[str, str]] = []
+        self._started = time.monotonic()
+        self._calls: List[Dict[str, Any]] = []
+    
+    @classmethod
+    def from_limits(cls, deadline_seconds: Optional[float] = None,
+                    max_tokens: Optional[int] = None) -> Optional["RunBudget"]:
+        """
+        Build a budget from explicit limits, falling back to Config
+        
+        Returns:
+            The budget, or None when neither a deadline nor a token limit applies
+        """
+        deadline_seconds = deadline_seconds or Config.RUN_DEADLINE_SECONDS or None
+        max_tokens = max_tokens or Config.RUN_MAX_TOKENS or None
+        if deadline_seconds is None and max_tokens is None:
+            return None
+        return cls(deadline_seconds, max_tokens)
+    
+    @contextmanager
+    def activate(self) -> Iterator["RunBudget"]:
+        """Make this the budget of the calls made inside the block and charge their usage to it"""
+        with collect_calls() as calls:
+            self._calls = calls
+            token = _current_budget.set(self)
+            try:
+                yield self
+            finally:
+                _current_budget.reset(token)
+    
+    def elapsed_seconds(self) -> float:
+        """Seconds since the budget was created"""
+        return time.monotonic() - self._started
+    
+    def remaining_seconds(self) -> Optional[float]:
+        """Seconds left before the deadline, or None without a deadline"""
+        if self.deadline_seconds is None:
+            return None
+        return self.deadline_seconds - self.elapsed_seconds()
+    
+    def used_tokens(self) -> int:
+        """Tokens used by the calls finished so far"""
+        return sum(call["prompt_tokens"] + call["completion_tokens"] for call in self._calls)
+    
+    def remaining_tokens(self) -> Optional[int]:
+        """Tokens left, or None without a token limit"""
+        if self.max_tokens is None:
+            return None
+        return self.max_tokens - self.used_tokens()
+    
+    def request_timeout(self, default: float) -> float:
+        """
+        HTTP timeout for the next request
+        
+        Args:
+            default: Per-call timeout without a budget
+        
+        Returns:
+            The smaller of default and the time left
+        
+        Raises:
+            BudgetExhaustedError: If the deadline has passed
+        """
+        remaining = self.remaining_seconds()
+        if remaining is None:
+            return default
+        if remaining <= 0:
+            raise BudgetExhaustedError(f"Run deadline of {self.deadline_seconds}s exceeded")
+        return min(default, remaining)
+    
+    def completion_tokens(self, default: int, prompt_tokens: int) -> int:
+        """
+        max_tokens for the next request
+        
+        Args:
+            default: Per-call max_tokens without a budget
+            prompt_tokens: Estimated tokens of the request's prompt
+        
+        Returns:
+            The smaller of default and the tokens left after the prompt
+        
+        Raises:
+            BudgetExhaustedError: If fewer than min_completion_tokens are left
+        """
+        remaining = self.remaining_tokens()
+        if remaining is None:
+            return default
+        available = remaining - prompt_tokens
+        if available < self.min_completion_tokens:
+            raise BudgetExhaustedError(
+                f"Run token budget of {self.max_tokens} exhausted "
+                f"({self.used_tokens()} used, prompt needs ~{prompt_tokens})"
+            )
+        return min(default, available)
+    
+    def shortfall(self, expected_seconds: float, expected_tokens: int) -> Optional[str]:
+        """
+        Check whether a step of the expected cost still fits
+        
+        Returns:
+            Why the step does not fit, or None if it does
+        """
+        remaining_seconds = self.remaining_seconds()
+        if remaining_seconds is not None and remaining_seconds < expected_seconds:
+            return f"needs ~{expected_seconds:.1f}s, {max(0.0, remaining_seconds):.1f}s left"
+        remaining_tokens = self.remaining_tokens()
+        if remaining_tokens is not None and remaining_tokens < max(expected_tokens, self.min_completion_tokens):
+            return f"needs ~{expected_tokens} tokens, {max(0, remaining_tokens)} left"
+        return None
+    
+    def record_skip(self, step: str, reason: str):
+        """Record a step left out because of the budget"""
+        self.skipped.append({"step": step, "reason": reason})
+    
+    def record_degraded(self, step: str, reason: str):
+        """Record a step replaced by a cheaper fallback because of the budget"""
+        self.degraded.append({"step": step, "reason": reason})
+    
+    def report(self) -> Dict[str, Any]:
+        """Limits, usage and the steps skipped or degraded"""
+        return {
+            "deadline_seconds": self.deadline_seconds,
+            "max_tokens": self.max_tokens,
+            "elapsed_seconds": round(self.elapsed_seconds(), 3),
+            "used_tokens": self.used_tokens(),
+            "skipped": self.skipped,
+            "degraded": self.degraded
+        }
+
+
+def get_run_budget() -> Optional[RunBudget]:
+    """Get the budget active in the current context, if any"""
+    return _current_budget.get()
@@ -81,8 +81,8 @@ async function handleFormSubmit(e) {
     submitBtn.querySelector('.btn-spinner').style.display = 'inline';
     
     try {
-        // Execute workflow
-        const response = await fetch(`${API_BASE}/execute`, {
+        // Execute workflow, streaming progress as Server-Sent Events
+        const response = await fetch(`${API_BASE}/execute/stream?format=compact`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -93,13 +93,19 @@ async function handleFormSubmit(e) {
             })
         });
         
-        const data = await response.json();
+        if (!response.ok || !response.body) {
+            const data = await response.json();
+            showError(data.error || 'An error occurred while executing the workflow');
+            return;
+        }
         
-        if (data.success) {
-            currentResults = data.results;
-            displayResults(data.results);
+        const data = await readWorkflowStream(response);
+        
+        if (data && data.success) {
+            currentResults = expandResults(data.results);
+            displayResults(currentResults);
         } else {
-            showError(data.error || 'An error occurred while executing the workflow');
+            showError((data && data.error) || 'An error occurred while executing the workflow');
         }
     } catch (error) {
         console.error('Error:', error);
@@ -112,6 +118,121 @@ async function handleFormSubmit(e) {
     }
 }
 
+// Read the SSE stream from /execute/stream, updating progress live.
+// Resolves with the payload of the final complete/error event.
+async function readWorkflowStream(response) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    const liveOutput = document.getElementById('live-output');
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+            return null;
+        }
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let eventName = 'message';
+            let dataText = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    eventName = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    dataText += line.slice(5).trim();
+                }
+            });
+            if (!dataText) {
+                continue;
+            }
+            
+            const payload = JSON.parse(dataText);
+            const stepNumber = stepNumberFromName(payload.step);
+            
+            if (eventName === 'step_start') {
+                if (stepNumber) {
+                    setStepActive(stepNumber);
+                }
+                liveOutput.style.display = 'block';
+                liveOutput.textContent = '';
+            } else if (eventName === 'token') {
+                liveOutput.textContent += payload.text;
+                liveOutput.scrollTop = liveOutput.scrollHeight;
+            } else if (eventName === 'step_complete') {
+                if (stepNumber) {
+                    setStepCompleted(stepNumber);
+                }
+            } else if (eventName === 'complete' || eventName === 'error') {
+                liveOutput.style.display = 'none';
+                return payload;
+            }
+        }
+    }
+}
+
+// Map streamed step names ("Step 3", "Final Review") to progress step numbers
+function stepNumberFromName(stepName) {
+    if (!stepName) {
+        return null;
+    }
+    if (stepName === 'Final Review') {
+        return 4;
+    }
+    const match = stepName.match(/^Step (\d)$/);
+    return match ? parseInt(match[1], 10) : null;
+}
+
+// Rebuild the full results shape from the compact format ("compact/1"), where
+// each step output is stored once in results.bodies and referenced by ID from
+// steps, workflow_context and history. Other results are returned unchanged.
+function expandResults(results) {
+    if (!results || results.format !== 'compact/1') {
+        return results;
+    }
+    
+    const bodies = results.bodies || {};
+    const expanded = Object.assign({}, results);
+    delete expanded.format;
+    delete expanded.bodies;
+    
+    if (results.steps) {
+        expanded.steps = {};
+        Object.keys(results.steps).forEach(name => {
+            expanded.steps[name] = bodies[results.steps[name]];
+        });
+    }
+    
+    if (results.history) {
+        expanded.history = results.history.map(entry => {
+            const copy = Object.assign({}, entry);
+            copy.result = bodies[entry.ref];
+            delete copy.ref;
+            return copy;
+        });
+    }
+    
+    if (results.workflow_context) {
+        expanded.workflow_context = {};
+        Object.keys(results.workflow_context).forEach(key => {
+            const value = results.workflow_context[key];
+            if (value && typeof value === 'object' && '$ref' in value) {
+                const target = bodies[value.$ref];
+                expanded.workflow_context[key] = value.$path && target ? target[value.$path] : target;
+            } else {
+                expanded.workflow_context[key] = value;
+            }
+        });
+    }
+    
+    return expanded;
+}
+
 // Display results
 function displayResults(results) {
     // Mark all steps as completed
@@ -1391,8 +1512,9 @@ function clearForm() {
 
 // Reset UI
 function resetUI() {
-    // Hide results and errors
+    // Hide results, errors and live output
     document.getElementById('results-section').style.display = 'none';
+    document.getElementById('live-output').style.display = 'none';
     document.getElementById('error-section').style.display = 'none';
     
     // Reset workflow steps
@@ -0,0 +1,293 @@
+"""
+Near-duplicate index over past workflow tasks
+
+Many submitted tasks are small rewordings of earlier ones (the same proposal
+for another council, a changed date). Each completed run is indexed by a
+MinHash signature of its task's word shingles, so a new task can be matched
+against every past task locally and without network calls:
+
+- Tasks are normalized (lower-case words) and split into overlapping
+  word shingles; the Jaccard similarity of two shingle sets is estimated by
+  the share of equal MinHash values in their signatures.
+- Signatures are split into bands that are stored as LSH buckets, so a
+  lookup only compares tasks sharing at least one band, not the whole index.
+- Runs are only matched when their initial context is identical (compared by
+  hash), since the same task with different context is a different request.
+
+The index keeps each run's results (compact format, zlib-compressed) in a
+SQLite file, so a match can be returned as it is or its plan and research can
+seed a new run.
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Set, Iterator
+
+from config import Config
+from result_format import compact_results, expand_results
+
+logger = logging.getLogger(__name__)
+
+# Universal hashing modulus (a Mersenne prime above the 32-bit shingle hashes)
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_index: Optional["TaskIndex"] = None
+_index_lock = threading.Lock()
+
+
+def context_hash(context: Optional[Dict[str, Any]]) -> str:
+    """Hash a run's initial context (no context and an empty one hash alike)"""
+    encoded = json.dumps(context or {}, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def shingles(text: str, size: int = 3) -> Set[int]:
+    """
+    Hash the word shingles of a text
+    
+    Args:
+        text: Text to shingle; case, punctuation and spacing are ignored
+        size: Words per shingle; texts shorter than this are one shingle
+    
+    Returns:
+        32-bit hashes of the distinct shingles
+    """
+    words = re.findall(r"\w+", text.lower())
+    grams = [" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))]
+    return {
+        int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=4).digest(), "big")
+        for gram in grams if gram
+    }
+
+
+class MinHasher:
+    """Fixed family of hash permutations turning shingle sets into signatures"""
+    
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        """
+        Initialize hash family
+        
+        Args:
+            num_perm: Signature length; the similarity estimate's error shrinks with its square root
+            seed: Seed of the permutation coefficients; signatures are only comparable for equal seeds
+        """
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._coefficients = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+    
+    def signature(self, shingle_hashes: Set[int]) -> List[int]:
+        """MinHash signature of a shingle set (all maxima for an empty set)"""
+        if not shingle_hashes:
+            return [_MAX_HASH] * self.num_perm
+        return [
+            min((a * value + b) % _PRIME for value in shingle_hashes) & _MAX_HASH
+            for a, b in self._coefficients
+        ]
+    
+    @staticmethod
+    def similarity(first: List[int], second: List[int]) -> float:
+        """Estimated Jaccard similarity of the sets behind two signatures"""
+        return sum(a == b for a, b in zip(first, second)) / len(first)
+
+
+class TaskIndex:
+    """SQLite-backed MinHash/LSH index of completed workflow runs"""
+    
+    def __init__(self, path: str, num_perm: int = 128, bands: int = 32, max_entries: int = 10000):
+        """
+        Initialize index
+        
+        Args:
+            path: SQLite database file
+            num_perm: MinHash signature length
+            bands: LSH bands; num_perm must be divisible by it. More bands find
+                candidates at lower similarity but compare more of them
+            max_entries: Runs kept; the oldest are dropped beyond this
+        """
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.path = path
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        self.hasher = MinHasher(num_perm)
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS tasks (
+                    run_id TEXT PRIMARY KEY,
+                    task TEXT NOT NULL,
+                    context_hash TEXT NOT NULL DEFAULT '',
+                    signature BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    results BLOB NOT NULL
+                )"""
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}
+            if "context_hash" not in columns:
+                # Runs indexed before contexts were recorded never match
+                conn.execute("ALTER TABLE tasks ADD COLUMN context_hash TEXT NOT NULL DEFAULT ''")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS buckets (
+                    band INTEGER NOT NULL,
+                    bucket TEXT NOT NULL,
+                    run_id TEXT NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_buckets ON buckets (band, bucket)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_buckets_run ON buckets (run_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_created ON tasks (created_at)")
+    
+    def add(self, run_id: str, task: str, results: Dict[str, Any], context: Optional[Dict[str, Any]] = None):
+        """
+        Index a completed run
+        
+        Args:
+            run_id: Run ID (replaces an earlier entry with the same ID)
+            task: The run's task
+            results: The run's results as returned by execute_workflow
+            context: The run's initial context
+        """
+        signature = self.hasher.signature(shingles(task))
+        encoded = json.dumps(compact_results(results), ensure_ascii=False, separators=(",", ":"), default=str)
+        with self._connect() as conn:
+            conn.execute("DELETE FROM buckets WHERE run_id = ?", (run_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO tasks (run_id, task, context_hash, signature, created_at, results) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, task, context_hash(context), self._pack(signature), time.time(),
+                 zlib.compress(encoded.encode("utf-8")))
+            )
+            conn.executemany(
+                "INSERT INTO buckets (band, bucket, run_id) VALUES (?, ?, ?)",
+                [(band, bucket, run_id) for band, bucket in enumerate(self._buckets(signature))]
+            )
+            self._evict(conn)
+    
+    def find_similar(self, task: str, threshold: float = 0.0, limit: int = 5,
+                     context: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Find indexed runs whose tasks are near-duplicates of a task
+        
+        Args:
+            task: Task to match
+            threshold: Minimum estimated Jaccard similarity of the word shingles
+            limit: Maximum number of matches
+            context: Initial context; only runs with the same context match
+        
+        Returns:
+            Matches with run_id, task, similarity and created_at, most similar first
+        """
+        signature = self.hasher.signature(shingles(task))
+        clauses = " OR ".join(["(band = ? AND bucket = ?)"] * self.bands)
+        params = [value for band, bucket in enumerate(self._buckets(signature)) for value in (band, bucket)]
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT run_id, task, signature, created_at FROM tasks WHERE context_hash = ? AND run_id IN "
+                f"(SELECT DISTINCT run_id FROM buckets WHERE {clauses})",
+                [context_hash(context)] + params
+            ).fetchall()
+        
+        matches = []
+        for run_id, matched_task, packed, created_at in rows:
+            similarity = self.hasher.similarity(signature, self._unpack(packed))
+            if similarity >= threshold:
+                matches.append({
+                    "run_id": run_id,
+                    "task": matched_task,
+                    "similarity": round(similarity, 3),
+                    "created_at": created_at
+                })
+        matches.sort(key=lambda match: (match["similarity"], match["created_at"]), reverse=True)
+        return matches[:limit]
+    
+    def get_results(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Get an indexed run's results in the full format, or None if not indexed"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT results FROM tasks WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            return None
+        return expand_results(json.loads(zlib.decompress(row[0]).decode("utf-8")))
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of indexed runs and their stored size"""
+        with self._connect() as conn:
+            entries, total_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(results)), 0) FROM tasks"
+            ).fetchone()
+        return {"entries": entries, "total_bytes": total_bytes, "max_entries": self.max_entries}
+    
+    def _buckets(self, signature: List[int]) -> List[str]:
+        """LSH bucket key of each band of a signature"""
+        return [
+            hashlib.sha1(self._pack(signature[band * self.rows:(band + 1) * self.rows])).hexdigest()[:16]
+            for band in range(self.bands)
+        ]
+    
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop the oldest runs beyond max_entries"""
+        stale = [row[0] for row in conn.execute(
+            "SELECT run_id FROM tasks ORDER BY created_at DESC LIMIT -1 OFFSET ?", (self.max_entries,)
+        ).fetchall()]
+        for run_id in stale:
+            conn.execute("DELETE FROM tasks WHERE run_id = ?", (run_id,))
+            conn.execute("DELETE FROM buckets WHERE run_id = ?", (run_id,))
+        if stale:
+            logger.debug(f"Task index evicted {len(stale)} runs to stay under {self.max_entries}")
+    
+    @staticmethod
+    def _pack(values: List[int]) -> bytes:
+        """Serialize signature values"""
+        return struct.pack(f">{len(values)}I", *values)
+    
+    @staticmethod
+    def _unpack(data: bytes) -> List[int]:
+        """Deserialize signature values"""
+        return list(struct.unpack(f">{len(data) // 4}I", data))
+    
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection that commits on success and is always closed"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+def get_task_index() -> Optional[TaskIndex]:
+    """
+    Get the process-wide task index
+    
+    Returns:
+        Shared TaskIndex, or None when TASK_INDEX_ENABLED is off
+    """
+    global _index
+    if not Config.TASK_INDEX_ENABLED:
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = TaskIndex(
+                    Config.TASK_INDEX_PATH,
+                    num_perm=Config.TASK_INDEX_NUM_PERM,
+                    bands=Config.TASK_INDEX_BANDS,
+                    max_entries=Config.TASK_INDEX_MAX_ENTRIES
+                )
+                logger.info(f"Task index enabled at {Config.TASK_INDEX_PATH}")
+    return _index
@@ -0,0 +1,10 @@
+"""
+Shared test setup
+
+The modules under test live at the repository root, so it is put on the
+import path for ``python -m pytest`` and plain ``pytest`` alike.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
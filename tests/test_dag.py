@@ -0,0 +1,122 @@
+"""Tests for the dependency-graph scheduler"""
+import asyncio
+
+import pytest
+
+from dag import DagNode, DagScheduler
+
+
+def make_node(name, log, delay=0.0, inputs=(), outputs=(), **kwargs):
+    """Node that records when it starts and finishes and returns its name"""
+    async def run():
+        log.append(("start", name))
+        await asyncio.sleep(delay)
+        log.append(("end", name))
+        return name
+    return DagNode(name, run, inputs=inputs, outputs=outputs, **kwargs)
+
+
+def test_nodes_start_after_their_dependencies():
+    log = []
+    nodes = [
+        make_node("review", log, inputs=("draft",), outputs=("review",)),
+        make_node("plan", log, inputs=("task",), outputs=("plan",)),
+        make_node("draft", log, inputs=("plan", "research"), outputs=("draft",)),
+        make_node("research", log, inputs=("plan",), outputs=("research",)),
+    ]
+    
+    run = asyncio.run(DagScheduler(nodes, initial_artifacts=("task",)).run())
+    
+    for node, dependencies in {"research": ["plan"], "draft": ["plan", "research"], "review": ["draft"]}.items():
+        for dependency in dependencies:
+            assert log.index(("end", dependency)) < log.index(("start", node))
+    assert run["results"] == {"plan": "plan", "research": "research", "draft": "draft", "review": "review"}
+
+
+def test_independent_nodes_run_concurrently():
+    log = []
+    nodes = [
+        make_node("left", log, delay=0.05, inputs=("task",), outputs=("left",)),
+        make_node("right", log, delay=0.05, inputs=("task",), outputs=("right",)),
+    ]
+    
+    asyncio.run(DagScheduler(nodes, initial_artifacts=("task",)).run())
+    
+    # Both started before either finished
+    assert [kind for kind, _ in log] == ["start", "start", "end", "end"]
+
+
+def test_critical_path_follows_the_longest_chain():
+    log = []
+    nodes = [
+        make_node("plan", log, delay=0.02, outputs=("plan",)),
+        make_node("slow", log, delay=0.15, inputs=("plan",), outputs=("slow",)),
+        make_node("fast", log, delay=0.01, inputs=("plan",), outputs=("fast",)),
+        make_node("merge", log, delay=0.02, inputs=("slow", "fast"), outputs=("merge",)),
+    ]
+    
+    schedule = asyncio.run(DagScheduler(nodes).run())["schedule"]
+    
+    assert schedule["critical_path"] == ["plan", "slow", "merge"]
+    assert schedule["critical_path_seconds"] <= schedule["wall_seconds"] + 0.01
+    assert schedule["sum_seconds"] > schedule["critical_path_seconds"]
+    assert set(schedule["nodes"]) == {"plan", "slow", "fast", "merge"}
+
+
+def test_skipped_node_runs_its_skip_handler():
+    log = []
+    
+    async def placeholder():
+        return "skipped"
+    
+    nodes = [
+        make_node("plan", log, outputs=("plan",)),
+        make_node("refine", log, inputs=("plan",), condition=lambda: False, skip=placeholder),
+    ]
+    
+    run = asyncio.run(DagScheduler(nodes).run())
+    
+    assert run["results"]["refine"] == "skipped"
+    assert run["schedule"]["nodes"]["refine"]["status"] == "skipped"
+    assert ("start", "refine") not in log
+
+
+def test_failure_cancels_running_nodes():
+    log = []
+    
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+    
+    nodes = [
+        DagNode("fail", fail, outputs=("fail",)),
+        make_node("slow", log, delay=1.0, outputs=("slow",)),
+    ]
+    
+    with pytest.raises(RuntimeError, match="boom"):
+        asyncio.run(DagScheduler(nodes).run())
+    assert ("end", "slow") not in log
+
+
+def test_cycle_is_rejected():
+    log = []
+    nodes = [
+        make_node("a", log, inputs=("c",), outputs=("a",)),
+        make_node("b", log, inputs=("a",), outputs=("b",)),
+        make_node("c", log, inputs=("b",), outputs=("c",)),
+        make_node("d", log, outputs=("d",)),
+    ]
+    
+    with pytest.raises(ValueError, match="cycle among: a, b, c"):
+        DagScheduler(nodes)
+
+
+def test_missing_input_is_rejected():
+    with pytest.raises(ValueError, match="needs inputs nobody produces: plan"):
+        DagScheduler([make_node("draft", [], inputs=("plan",))])
+
+
+def test_duplicate_producers_are_rejected():
+    nodes = [make_node("a", [], outputs=("plan",)), make_node("b", [], outputs=("plan",))]
+    with pytest.raises(ValueError, match="produced by both a and b"):
+        DagScheduler(nodes)
@@ -0,0 +1,85 @@
+"""Tests for the compact results format"""
+import copy
+import json
+import os
+
+from result_format import COMPACT_FORMAT, compact_results, expand_results
+
+SAMPLE_RESULTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test")
+
+
+def shared_results():
+    """Results shaped like execute_workflow's, with step outputs shared by reference"""
+    plan = {"agent": "Planning", "result": {"goals": ["a", "b"]}, "usage": {"tokens": 10}}
+    research = {"agent": "Research", "result": "notes", "usage": {"tokens": 20}}
+    review = {"agent": "QA", "result": {"approved": True}}
+    return {
+        "task": "Write a proposal",
+        "status": "completed",
+        "run_id": "abc123",
+        "steps": {"step1_plan": plan, "step2_research": research, "step4_review": review},
+        "workflow_context": {
+            "task": "Write a proposal",
+            "initial_context": {},
+            "iteration": 1,
+            "plan": plan["result"],
+            "research": research["result"],
+            "review": review["result"]
+        },
+        "history": [
+            {"step": "Planning", "timestamp": "t1", "result": plan},
+            {"step": "Research", "timestamp": "t2", "result": research},
+            {"step": "Final Review", "timestamp": "t3", "result": review}
+        ]
+    }
+
+
+def test_round_trip_is_exact():
+    results = shared_results()
+    original = copy.deepcopy(results)
+    
+    compact = compact_results(results)
+    
+    assert compact["format"] == COMPACT_FORMAT
+    assert expand_results(json.loads(json.dumps(compact))) == original
+    assert results == original
+
+
+def test_round_trip_of_stored_results_is_exact():
+    with open(SAMPLE_RESULTS, "r", encoding="utf-8") as f:
+        results = json.load(f)
+    
+    compact = compact_results(results)
+    
+    assert expand_results(json.loads(json.dumps(compact))) == results
+    assert len(json.dumps(compact)) < len(json.dumps(results)) * 0.6
+
+
+def test_each_step_output_is_stored_once():
+    compact = compact_results(shared_results())
+    
+    assert sorted(compact["bodies"]) == ["step1_plan", "step2_research", "step4_review"]
+    assert [entry["ref"] for entry in compact["history"]] == ["step1_plan", "step2_research", "step4_review"]
+    assert compact["workflow_context"]["plan"] == {"$ref": "step1_plan", "$path": "result"}
+    # Values that are no step's result stay inline
+    assert compact["workflow_context"]["iteration"] == 1
+    assert compact["workflow_context"]["task"] == "Write a proposal"
+
+
+def test_outputs_that_only_appear_in_history_get_their_own_body():
+    results = shared_results()
+    results["history"].append({"step": "Final Review", "timestamp": "t4", "result": {"agent": "QA", "result": "again"}})
+    original = copy.deepcopy(results)
+    
+    compact = compact_results(results)
+    
+    assert compact["history"][-1]["ref"] == "final_review"
+    assert expand_results(compact) == original
+
+
+def test_compact_and_expand_are_idempotent():
+    results = shared_results()
+    compact = compact_results(results)
+    
+    assert compact_results(compact) is compact
+    assert expand_results(results) is results
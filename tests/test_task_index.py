@@ -0,0 +1,82 @@
+"""Tests for the near-duplicate task index"""
+import pytest
+
+from task_index import MinHasher, TaskIndex, context_hash, shingles
+
+TASK = "Write a business proposal to supply gas to the city council of Leeds next spring"
+REWORDED = "Write a business proposal to supply gas to the city council of York next spring"
+UNRELATED = "Summarize recent research on protein folding with graph neural networks"
+
+RESULTS = {
+    "task": TASK,
+    "status": "completed",
+    "steps": {"step1_plan": {"agent": "Planning", "result": "plan"}},
+    "workflow_context": {"task": TASK, "plan": "plan"},
+    "history": [{"step": "Planning", "result": {"agent": "Planning", "result": "plan"}}]
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    return TaskIndex(str(tmp_path / "tasks.sqlite3"))
+
+
+def exact_jaccard(first, second):
+    first, second = shingles(first), shingles(second)
+    return len(first & second) / len(first | second)
+
+
+def test_shingles_ignore_case_punctuation_and_spacing():
+    assert shingles("Write a  PROPOSAL, now!") == shingles("write a proposal now")
+
+
+def test_minhash_estimates_jaccard_similarity():
+    hasher = MinHasher(num_perm=256)
+    estimate = hasher.similarity(hasher.signature(shingles(TASK)), hasher.signature(shingles(REWORDED)))
+    
+    assert estimate == pytest.approx(exact_jaccard(TASK, REWORDED), abs=0.1)
+    assert hasher.similarity(hasher.signature(shingles(TASK)), hasher.signature(shingles(TASK))) == 1.0
+
+
+def test_threshold_separates_rewordings_from_unrelated_tasks(index):
+    index.add("original", TASK, RESULTS)
+    index.add("unrelated", UNRELATED, RESULTS)
+    
+    assert [match["run_id"] for match in index.find_similar(TASK, threshold=0.99)] == ["original"]
+    reworded = index.find_similar(REWORDED, threshold=0.4)
+    assert [match["run_id"] for match in reworded] == ["original"]
+    assert reworded[0]["similarity"] < 1.0
+    assert index.find_similar(REWORDED, threshold=0.95) == []
+    assert index.find_similar(UNRELATED + " please", threshold=0.5)[0]["run_id"] == "unrelated"
+
+
+def test_lookup_misses_when_context_differs(index):
+    index.add("leeds", TASK, RESULTS, context={"council": "Leeds", "budget": 100})
+    
+    assert index.find_similar(TASK, threshold=0.9) == []
+    assert index.find_similar(TASK, threshold=0.9, context={"council": "York", "budget": 100}) == []
+    matches = index.find_similar(TASK, threshold=0.9, context={"budget": 100, "council": "Leeds"})
+    assert [match["run_id"] for match in matches] == ["leeds"]
+
+
+def test_context_hash_treats_missing_and_empty_alike():
+    assert context_hash(None) == context_hash({})
+    assert context_hash({"a": 1, "b": 2}) == context_hash({"b": 2, "a": 1})
+    assert context_hash({"a": 1}) != context_hash({"a": 2})
+
+
+def test_results_round_trip(index):
+    index.add("original", TASK, RESULTS)
+    
+    assert index.get_results("original") == RESULTS
+    assert index.get_results("missing") is None
+
+
+def test_oldest_runs_are_evicted(tmp_path):
+    index = TaskIndex(str(tmp_path / "tasks.sqlite3"), max_entries=2)
+    for number in range(3):
+        index.add(f"run{number}", f"{TASK} item {number}", RESULTS)
+    
+    assert index.stats()["entries"] == 2
+    assert index.get_results("run0") is None
+    assert {match["run_id"] for match in index.find_similar(TASK, threshold=0.5)} == {"run1", "run2"}
@@ -0,0 +1,43 @@
+"""
+Local token estimation for prompts and messages
+
+OpenRouter models use different tokenizers, so counts here are a cheap
+approximation (about four characters per token for English text and code)
+used for rate limiting and prompt budgeting, not for billing.
+"""
+import math
+from typing import Dict, List
+
+# Average characters per token across common BPE tokenizers
+CHARS_PER_TOKEN = 4.0
+
+# Per-message overhead for role markers and separators in chat formats
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in a piece of text
+    
+    Args:
+        text: Text to measure
+    
+    Returns:
+        Approximate token count
+    """
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def estimate_message_tokens(messages: List[Dict[str, str]]) -> int:
+    """
+    Estimate the prompt tokens of a chat message list
+    
+    Args:
+        messages: Chat messages with role and content
+    
+    Returns:
+        Approximate token count including per-message overhead
+    """
+    return sum(estimate_tokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS for message in messages)
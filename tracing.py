@@ -0,0 +1,428 @@
+"""
+Hierarchical tracing of workflow runs
+
+A run is recorded as a tree of spans: the workflow, its steps, the agent
+calls of each step and, inside every LLM call, the prompt/payload build,
+the rate limiter wait, each HTTP attempt (or the stream), retry backoff and
+response parsing. Spans are timed with a monotonic clock and exported when
+the run finishes:
+
+- "chrome": Chrome trace-event JSON, one file per run, to open in
+  chrome://tracing or https://ui.perfetto.dev
+- "otlp": OTLP/HTTP JSON posted to a collector (Jaeger, Tempo, the
+  OpenTelemetry Collector, ...)
+
+Further exporters plug in through register_exporter. The active trace and
+the current span live in ContextVars, which asyncio tasks and
+asyncio.to_thread workers inherit, so spans opened on worker threads nest
+under the step that started them. Each asyncio task or thread gets its own
+row (tid) in the Chrome view so overlapping steps do not interleave.
+
+With TRACE_ENABLED off no trace is active and span() is a no-op.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Callable, Iterator, Tuple
+
+from config import Config
+from http_client import get_session
+
+logger = logging.getLogger(__name__)
+
+# Trace of the run executing in this context, and the innermost open span
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("trace", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("trace_span", default=None)
+
+
+class _NoopSpan:
+    """Stand-in yielded when no trace is active; attributes are dropped"""
+    
+    span_id = None
+    
+    def set(self, **attributes: Any):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """One timed operation of a trace"""
+    
+    def __init__(self, trace: "Trace", name: str, category: str, parent: Optional["Span"],
+                 attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.category = category
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.tid = trace.lane()
+        self.start = time.monotonic()
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+    
+    def set(self, **attributes: Any):
+        """Add or overwrite attributes of the span"""
+        self.attributes.update(attributes)
+    
+    @property
+    def seconds(self) -> float:
+        """Duration of the span (so far, while it is open)"""
+        return (self.end if self.end is not None else time.monotonic()) - self.start
+    
+    def finish(self, error: Optional[str] = None):
+        """End the span and record it in its trace; later calls are ignored"""
+        if self.end is not None:
+            return
+        self.end = time.monotonic()
+        if error is not None:
+            self.error = error
+        self.trace.record(self)
+
+
+class Trace:
+    """The spans of one workflow run"""
+    
+    def __init__(self):
+        """Initialize an empty trace starting now"""
+        self.trace_id = uuid.uuid4().hex
+        self.started_at = time.time()
+        self.start = time.monotonic()
+        self.spans: List[Span] = []
+        self.root: Optional[Span] = None
+        self._lanes: Dict[Tuple[str, int], Tuple[int, str]] = {}
+        self._lock = threading.Lock()
+    
+    def record(self, span: Span):
+        """Add a finished span"""
+        with self._lock:
+            self.spans.append(span)
+    
+    def lane(self) -> int:
+        """Row (Chrome tid) of the calling asyncio task or thread"""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is not None:
+            key, label = ("task", id(task)), f"task {task.get_name()}"
+        else:
+            key, label = ("thread", threading.get_ident()), f"thread {threading.current_thread().name}"
+        with self._lock:
+            if key not in self._lanes:
+                self._lanes[key] = (len(self._lanes) + 1, label)
+            return self._lanes[key][0]
+    
+    @property
+    def run_id(self) -> str:
+        """Run ID recorded on the root span, or the trace ID before it is known"""
+        if self.root is not None and self.root.attributes.get("run_id"):
+            return self.root.attributes["run_id"]
+        return self.trace_id
+    
+    def summary(self) -> Dict[str, Any]:
+        """Trace ID, span count and total seconds per span category"""
+        by_category: Dict[str, float] = {}
+        for span in self.spans:
+            by_category[span.category] = by_category.get(span.category, 0.0) + span.seconds
+        return {
+            "trace_id": self.trace_id,
+            "spans": len(self.spans),
+            "seconds_by_category": {name: round(seconds, 3) for name, seconds in sorted(by_category.items())}
+        }
+    
+    def to_chrome(self) -> Dict[str, Any]:
+        """
+        Render the trace as Chrome trace-event JSON
+        
+        Returns:
+            {"traceEvents": [...]} with one complete ("X") event per span,
+            timestamps in microseconds since the trace started, plus
+            process and thread name metadata
+        """
+        pid = os.getpid()
+        events: List[Dict[str, Any]] = [
+            {"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": f"workflow {self.run_id}"}}
+        ]
+        for tid, label in sorted(self._lanes.values()):
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": label}})
+        
+        # Parents before children that start at the same instant
+        for span in sorted(self.spans, key=lambda span: (span.start, -span.seconds)):
+            args = dict(span.attributes, span_id=span.span_id)
+            if span.parent_id:
+                args["parent_id"] = span.parent_id
+            if span.error is not None:
+                args["error"] = span.error
+            events.append({
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": round((span.start - self.start) * 1e6, 3),
+                "dur": round(span.seconds * 1e6, 3),
+                "pid": pid,
+                "tid": span.tid,
+                "args": args
+            })
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"trace_id": self.trace_id, "run_id": self.run_id, "started_at": self.started_at}
+        }
+    
+    def to_otlp(self, service_name: str) -> Dict[str, Any]:
+        """
+        Render the trace as an OTLP/HTTP JSON ExportTraceServiceRequest
+        
+        Args:
+            service_name: service.name resource attribute
+        """
+        def nanos(offset: float) -> str:
+            return str(int((self.started_at + offset - self.start) * 1e9))
+        
+        spans = []
+        for span in self.spans:
+            otlp_span = {
+                "traceId": self.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": nanos(span.start),
+                "endTimeUnixNano": nanos(span.end if span.end is not None else span.start),
+                "attributes": [_otlp_attribute(key, value)
+                               for key, value in dict(span.attributes, category=span.category).items()],
+                "status": {"code": 2, "message": span.error} if span.error is not None else {"code": 1}
+            }
+            if span.parent_id:
+                otlp_span["parentSpanId"] = span.parent_id
+            spans.append(otlp_span)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", service_name)]},
+                "scopeSpans": [{"scope": {"name": "tracing"}, "spans": spans}]
+            }]
+        }
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    """Encode one attribute as an OTLP KeyValue"""
+    if isinstance(value, bool):
+        encoded = {"boolValue": value}
+    elif isinstance(value, int):
+        encoded = {"intValue": str(value)}
+    elif isinstance(value, float):
+        encoded = {"doubleValue": value}
+    else:
+        encoded = {"stringValue": str(value)}
+    return {"key": key, "value": encoded}
+
+
+def current_trace() -> Optional[Trace]:
+    """Get the trace active in this context, if any"""
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_run(name: str, category: str = "workflow", **attributes: Any) -> Iterator[Optional[Trace]]:
+    """
+    Trace the block as the root span of a new trace
+    
+    Args:
+        name: Root span name
+        category: Root span category
+        attributes: Root span attributes
+    
+    Yields:
+        The Trace (its root span finishes when the block exits), or None
+        when TRACE_ENABLED is off
+    """
+    if not Config.TRACE_ENABLED:
+        yield None
+        return
+    
+    trace = Trace()
+    trace_token = _current_trace.set(trace)
+    try:
+        with span(name, category, parent=None, **attributes) as root:
+            trace.root = root
+            yield trace
+    finally:
+        _current_trace.reset(trace_token)
+
+
+@contextmanager
+def span(name: str, category: str = "", parent: Any = NOOP_SPAN, **attributes: Any) -> Iterator[Any]:
+    """
+    Time the block as a child of the current span
+    
+    Must open and close within one step of a generator; for spans that
+    stay open across yields use start_span.
+    
+    Args:
+        name: Span name
+        category: Span category (Chrome "cat"), e.g. "step", "agent", "llm", "http"
+        parent: Parent span; defaults to the current span
+        attributes: Span attributes; more can be added with set()
+    
+    Yields:
+        The Span, or a no-op stand-in when no trace is active
+    """
+    opened = start_span(name, category, parent, **attributes)
+    if opened is NOOP_SPAN:
+        yield opened
+        return
+    
+    span_token = _current_span.set(opened)
+    try:
+        yield opened
+    except BaseException as e:
+        opened.finish(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current_span.reset(span_token)
+        opened.finish()
+
+
+def start_span(name: str, category: str = "", parent: Any = NOOP_SPAN, **attributes: Any) -> Any:
+    """
+    Open a span without making it the current span
+    
+    Used where a span outlives one generator step (streamed responses);
+    finish it with Span.finish(). Arguments are as for span().
+    
+    Returns:
+        The Span, or a no-op stand-in when no trace is active
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return NOOP_SPAN
+    if parent is NOOP_SPAN:
+        parent = _current_span.get()
+    return Span(trace, name, category, parent, attributes)
+
+
+def finish_span(opened: Any, error: Optional[str] = None):
+    """Finish a span from start_span (no-op for the stand-in)"""
+    if opened is not NOOP_SPAN:
+        opened.finish(error=error)
+
+
+class SpanExporter(ABC):
+    """Destination for finished traces; subclasses implement export()"""
+    
+    @abstractmethod
+    def export(self, trace: Trace) -> str:
+        """
+        Export a finished trace
+        
+        Returns:
+            Where the trace went (file path or URL)
+        """
+        raise NotImplementedError("Subclasses must implement export")
+
+
+class ChromeTraceExporter(SpanExporter):
+    """Write each trace to <directory>/<run_id>.json in Chrome trace-event format"""
+    
+    def __init__(self, directory: str):
+        """
+        Initialize exporter
+        
+        Args:
+            directory: Directory receiving the trace files
+        """
+        self.directory = directory
+    
+    def export(self, trace: Trace) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{trace.run_id}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(trace.to_chrome(), f, default=str)
+        os.replace(tmp_path, path)
+        return path
+
+
+class OTLPJsonExporter(SpanExporter):
+    """Post each trace to an OTLP/HTTP collector as JSON"""
+    
+    def __init__(self, endpoint: str, service_name: str, headers: Optional[Dict[str, str]] = None,
+                 timeout: float = 10.0):
+        """
+        Initialize exporter
+        
+        Args:
+            endpoint: Collector traces URL, e.g. http://localhost:4318/v1/traces
+            service_name: service.name resource attribute
+            headers: Extra request headers (e.g. authentication)
+            timeout: Request timeout in seconds
+        """
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.headers = headers or {}
+        self.timeout = timeout
+    
+    def export(self, trace: Trace) -> str:
+        response = get_session().post(
+            self.endpoint,
+            data=json.dumps(trace.to_otlp(self.service_name), default=str),
+            headers=dict(self.headers, **{"Content-Type": "application/json"}),
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return self.endpoint
+
+
+# Exporter name (as listed in TRACE_EXPORTERS) -> factory
+_exporters: Dict[str, Callable[[], SpanExporter]] = {
+    "chrome": lambda: ChromeTraceExporter(Config.TRACE_DIR),
+    "otlp": lambda: OTLPJsonExporter(Config.TRACE_OTLP_ENDPOINT, Config.TRACE_SERVICE_NAME)
+}
+
+
+def register_exporter(name: str, factory: Callable[[], SpanExporter]):
+    """
+    Make an exporter selectable in TRACE_EXPORTERS
+    
+    Args:
+        name: Name to list in TRACE_EXPORTERS (replaces a built-in of the same name)
+        factory: Called once per exported trace to create the exporter
+    """
+    _exporters[name] = factory
+
+
+def export_trace(trace: Trace, exporters: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Export a finished trace to the configured exporters
+    
+    Failures are logged and reported rather than raised, so tracing never
+    fails a run.
+    
+    Args:
+        trace: Finished trace
+        exporters: Comma-separated exporter names (default TRACE_EXPORTERS)
+    
+    Returns:
+        The trace summary with "exported" mapping each exporter to where
+        the trace went, and "errors" for the exporters that failed
+    """
+    report = trace.summary()
+    report["exported"] = {}
+    for name in [name.strip() for name in (exporters or Config.TRACE_EXPORTERS).split(",") if name.strip()]:
+        try:
+            if name not in _exporters:
+                raise ValueError(f"Unknown trace exporter: {name} (expected one of {', '.join(_exporters)})")
+            report["exported"][name] = _exporters[name]().export(trace)
+        except Exception as e:
+            logger.warning(f"Failed to export trace {trace.trace_id} with {name}: {str(e)}")
+            report.setdefault("errors", {})[name] = str(e)
+    return report
@@ -1,8 +1,22 @@
 """
 Workflow Orchestrator - Coordinates agents through the 5-step workflow
 """
+import asyncio
 import logging
-from typing import Dict, Any, Optional, List
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from typing import Dict, Any, Optional, List, Callable, Awaitable
+from config import Config
+from http_client import aclose_async_client
+from checkpoint import CheckpointStore
+from dag import DagNode, DagScheduler
+from digest import WorkflowDigest
+from metrics import collect_calls, summarize_calls
+from run_budget import RunBudget, BudgetExhaustedError
+from task_index import get_task_index
+from tracing import trace_run, span, export_trace
 from agents import (
     OrchestratorAgent,
     PlanningAgent,
@@ -16,9 +30,29 @@ from agents import (
 logger = logging.getLogger(__name__)
 
 
+class WorkflowCancelled(Exception):
+    """Raised inside a run once WorkflowOrchestrator.cancel() has been called"""
+
+
 class WorkflowOrchestrator:
     """Orchestrates the 5-step AI agent workflow"""
     
+    STEP_TITLES = {
+        "step1_plan": "Plan and Define Objectives",
+        "step2_research": "Gather and Analyze Information",
+        "step3_execution": "Execute the Task",
+        "step4_review": "Review and Validate",
+        "step5_refinement": "Refine and Complete",
+        "final_review": "Re-reviewing after refinement"
+    }
+    
+    # Steps a near-duplicate run can seed: step key -> (history label, workflow_context key)
+    SEEDABLE_STEPS = {
+        "step1_plan": ("Step 1", "plan"),
+        "step2_research": ("Step 2", "research"),
+        "step3_execution": ("Step 3", "deliverables")
+    }
+    
     def __init__(self):
         """Initialize orchestrator with all agents"""
         self.orchestrator = OrchestratorAgent()
@@ -31,112 +65,598 @@ class WorkflowOrchestrator:
         
         self.workflow_context: Dict[str, Any] = {}
         self.workflow_history: List[Dict[str, Any]] = []
+        self._native_async = False
+        self._on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None
+        
+        self.checkpoint_store = CheckpointStore(Config.CHECKPOINT_DIR) if Config.CHECKPOINT_ENABLED else None
+        self.run_id: Optional[str] = None
+        self._step_results: Dict[str, Dict[str, Any]] = {}
+        self.digest: Optional[WorkflowDigest] = None
+        self._step_metrics: Dict[str, Dict[str, Any]] = {}
+        self._schedule: Optional[Dict[str, Any]] = None
+        self._checkpoint_lock: Optional[asyncio.Lock] = None
+        self.budget: Optional[RunBudget] = None
+        self._seeded_steps: List[str] = []
+        self._cancelled = threading.Event()
     
-    def execute_workflow(self, task: str, initial_context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    def execute_workflow(self, task: str, initial_context: Optional[Dict[str, Any]] = None,
+                         on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                         deadline_seconds: Optional[float] = None,
+                         max_tokens: Optional[int] = None,
+                         reuse: Optional[str] = None) -> Dict[str, Any]:
         """
         Execute the complete 5-step workflow
         
+        Synchronous wrapper around the async workflow; agent calls run on
+        worker threads through the shared blocking HTTP session. Must not be
+        called from inside a running event loop (use execute_workflow_async).
+        
+        Args:
+            task: Task description from user
+            initial_context: Optional initial context
+            on_event: Optional callback receiving (event, data) for
+                step_start, token and step_complete events; when given,
+                every LLM call is streamed. In sync mode it is invoked from
+                worker threads.
+            deadline_seconds: Optional wall-clock limit for the whole run
+                (default RUN_DEADLINE_SECONDS); calls time out by it, optional
+                steps are skipped or degraded when it runs low
+            max_tokens: Optional token limit for the whole run (default
+                RUN_MAX_TOKENS), applied the same way
+            reuse: How to reuse a near-duplicate completed run (default
+                TASK_REUSE_MODE): "off", "seed" (take its plan and research,
+                see TASK_REUSE_SEED_STEPS) or "result" (return its results
+                when near-identical, else seed)
+            
+        Returns:
+            Complete workflow results; with a budget, "budget" records the
+            usage and the steps skipped or degraded; "reused" names the run
+            whose results or steps were reused
+        """
+        return self._run_sync(self._run_workflow(
+            task, initial_context, native_async=False, on_event=on_event,
+            budget=RunBudget.from_limits(deadline_seconds, max_tokens), reuse=reuse
+        ))
+    
+    async def execute_workflow_async(self, task: str, initial_context: Optional[Dict[str, Any]] = None,
+                                     on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                                     deadline_seconds: Optional[float] = None,
+                                     max_tokens: Optional[int] = None,
+                                     reuse: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Execute the complete 5-step workflow on the running event loop
+        
         Args:
             task: Task description from user
             initial_context: Optional initial context
+            on_event: Optional streaming event callback (see execute_workflow)
+            deadline_seconds: Optional run deadline (see execute_workflow)
+            max_tokens: Optional run token limit (see execute_workflow)
+            reuse: Optional near-duplicate reuse mode (see execute_workflow)
             
         Returns:
             Complete workflow results
         """
-        logger.info(f"Starting workflow execution for task: {task}")
+        return await self._run_workflow(
+            task, initial_context, native_async=True, on_event=on_event,
+            budget=RunBudget.from_limits(deadline_seconds, max_tokens), reuse=reuse
+        )
+    
+    def resume_workflow(self, run_id: str,
+                        on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Resume a checkpointed run from its last completed step
         
-        # Initialize workflow context
-        self.workflow_context = {
-            "task": task,
-            "initial_context": initial_context or {},
-            "step": 0,
-            "iteration": 0
+        Args:
+            run_id: ID of the run to resume (returned as ``run_id`` in results)
+            on_event: Optional streaming event callback (see execute_workflow)
+            
+        Returns:
+            Complete workflow results
+        """
+        return self._run_sync(self.resume_workflow_async(run_id, on_event=on_event, native_async=False))
+    
+    def cancel(self):
+        """
+        Ask the running workflow to stop
+        
+        Safe to call from any thread. The run stops before its next step,
+        or at the next streamed token of the current call, and returns with
+        status "cancelled"; a run not yet started is cancelled as soon as it starts.
+        """
+        self._cancelled.set()
+    
+    def _check_cancelled(self):
+        """Raise WorkflowCancelled if cancel() was called"""
+        if self._cancelled.is_set():
+            raise WorkflowCancelled("Workflow cancelled")
+    
+    @staticmethod
+    def _run_sync(run: Awaitable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Run a workflow coroutine on a new event loop
+        
+        The loop's pooled async HTTP client is closed (and dropped from the
+        per-loop cache) before the loop ends, so repeated blocking calls do
+        not leak connections.
+        """
+        async def run_and_close() -> Dict[str, Any]:
+            try:
+                return await run
+            finally:
+                await aclose_async_client()
+        
+        return asyncio.run(run_and_close())
+    
+    async def resume_workflow_async(self, run_id: str,
+                                    on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                                    native_async: bool = True) -> Dict[str, Any]:
+        """Async variant of resume_workflow"""
+        state = self.checkpoint_store.load(run_id) if self.checkpoint_store else None
+        if state is None:
+            raise ValueError(f"No checkpoint found for run {run_id}")
+        
+        logger.info(f"Resuming run {run_id} after steps: {', '.join(state.get('completed_steps', [])) or 'none'}")
+        return await self._run_workflow(
+            state["task"], state["workflow_context"].get("initial_context"), native_async,
+            on_event=on_event, resume_state=state, budget=RunBudget.from_limits()
+        )
+    
+    async def _run_workflow(self, task: str, initial_context: Optional[Dict[str, Any]], native_async: bool,
+                            on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                            resume_state: Optional[Dict[str, Any]] = None,
+                            budget: Optional[RunBudget] = None,
+                            reuse: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Run the workflow steps, awaiting agents natively or on worker threads
+        
+        With TRACE_ENABLED the run is traced and exported (see tracing.py);
+        "trace" in the results then names the files or endpoints it went to.
+        """
+        with trace_run("execute_workflow", mode="async" if native_async else "sync",
+                       resumed=resume_state is not None) as trace:
+            results = await self._run_measured(task, initial_context, native_async, on_event, resume_state, budget, reuse)
+            if trace is not None:
+                trace.root.set(run_id=results.get("run_id"), status=results.get("status"))
+        if trace is not None:
+            # Exporters write files or post over HTTP, so keep them off the event loop
+            results["trace"] = await asyncio.to_thread(export_trace, trace)
+        return results
+    
+    async def _run_measured(self, task: str, initial_context: Optional[Dict[str, Any]], native_async: bool,
+                            on_event: Optional[Callable[[str, Dict[str, Any]], None]],
+                            resume_state: Optional[Dict[str, Any]],
+                            budget: Optional[RunBudget],
+                            reuse: Optional[str]) -> Dict[str, Any]:
+        """Run the workflow and attach the budget, reuse and metrics reports (see _run_workflow)"""
+        self.budget = budget
+        started = time.monotonic()
+        prior = None
+        if resume_state is None:
+            with span("find_prior_run", "index"):
+                # SQLite lookup and decompression, kept off the event loop
+                prior = await asyncio.to_thread(self._find_prior_run, task, initial_context, reuse)
+        if prior is not None and prior["mode"] == "result":
+            return self._reuse_results(task, prior, started)
+        
+        with collect_calls() as calls, budget.activate() if budget else nullcontext():
+            results = await self._run_steps(task, initial_context, native_async, on_event, resume_state, prior)
+        
+        if budget is not None:
+            results["budget"] = budget.report()
+        if self._seeded_steps:
+            results["reused"] = {
+                "mode": "seed",
+                "run_id": prior["run_id"],
+                "task": prior["task"],
+                "similarity": prior["similarity"],
+                "steps": self._seeded_steps
+            }
+        results["metrics"] = {
+            "wall_seconds": round(time.monotonic() - started, 3),
+            "totals": summarize_calls(calls),
+            "by_step": self._step_metrics,
+            "schedule": self._schedule
         }
+        await asyncio.to_thread(self._index_run, results, initial_context)
+        return results
+    
+    def find_similar_tasks(self, task: str, limit: int = 5,
+                           initial_context: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Find completed runs whose tasks are near-duplicates of a task
+        
+        Lets callers offer reuse before running; pass the chosen mode as
+        execute_workflow's ``reuse``. Only runs started with the same initial
+        context match.
+        
+        Returns:
+            Matches at TASK_REUSE_SEED_THRESHOLD or above with run_id, task,
+            similarity and created_at, most similar first (none without an index)
+        """
+        index = get_task_index()
+        if index is None:
+            return []
+        return index.find_similar(task, Config.TASK_REUSE_SEED_THRESHOLD, limit, context=initial_context)
+    
+    def _find_prior_run(self, task: str, initial_context: Optional[Dict[str, Any]],
+                        reuse: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Look up the completed run closest to a task, with the same initial context, for reuse
+        
+        Returns:
+            The best match with its results and the "mode" it qualifies for
+            ("result" or "seed"), or None when reuse is off or nothing is close enough
+        """
+        mode = (reuse or Config.TASK_REUSE_MODE).lower()
+        index = get_task_index()
+        if mode not in ("result", "seed") or index is None:
+            return None
         
         try:
-            # Step 1: Plan and Define Objectives
-            logger.info("Step 1: Plan and Define Objectives")
-            step1_result = self._step1_plan()
-            self.workflow_context["plan"] = step1_result["result"]
-            self._add_to_history("Step 1", step1_result)
-            
-            # Step 2: Gather and Analyze Information
-            logger.info("Step 2: Gather and Analyze Information")
-            step2_result = self._step2_gather()
-            self.workflow_context["research"] = step2_result["result"]
-            self._add_to_history("Step 2", step2_result)
-            
-            # Step 3: Execute the Task
-            logger.info("Step 3: Execute the Task")
-            step3_result = self._step3_execute()
-            self.workflow_context["deliverables"] = step3_result["result"]
-            self._add_to_history("Step 3", step3_result)
-            
-            # Step 4: Review and Validate
-            logger.info("Step 4: Review and Validate")
-            step4_result = self._step4_review()
-            self.workflow_context["review"] = step4_result["result"]
-            self._add_to_history("Step 4", step4_result)
-            
-            # Check if refinement is needed
-            issues_found = self._check_for_issues(step4_result)
-            
-            if issues_found:
-                # Step 5: Refine and Complete
-                logger.info("Step 5: Refine and Complete")
-                step5_result = self._step5_refine()
-                self.workflow_context["refined_deliverables"] = step5_result["result"]
-                self._add_to_history("Step 5", step5_result)
-                
-                # Re-review after refinement
-                logger.info("Re-reviewing after refinement")
-                final_review = self._step4_review()
-                self._add_to_history("Final Review", final_review)
-            else:
-                logger.info("No issues found, proceeding to completion")
-                step5_result = {"result": "No refinement needed", "status": "complete"}
-                self._add_to_history("Step 5", step5_result)
+            matches = index.find_similar(task, Config.TASK_REUSE_SEED_THRESHOLD, limit=1, context=initial_context)
+            prior = dict(matches[0], results=index.get_results(matches[0]["run_id"])) if matches else None
+        except Exception as e:
+            logger.warning(f"Task index lookup failed: {str(e)}")
+            return None
+        if prior is None or prior["results"] is None:
+            return None
+        
+        near_identical = prior["similarity"] >= Config.TASK_REUSE_RESULT_THRESHOLD
+        prior["mode"] = "result" if mode == "result" and near_identical else "seed"
+        logger.info(
+            f"Task matches run {prior['run_id']} at similarity {prior['similarity']}; "
+            f"{'returning its results' if prior['mode'] == 'result' else 'seeding from its steps'}"
+        )
+        return prior
+    
+    def _reuse_results(self, task: str, prior: Dict[str, Any], started: float) -> Dict[str, Any]:
+        """
+        Return a near-identical run's results as this run's, without calling any agent
+        
+        The task (top level and in workflow_context) becomes this run's; the
+        step outputs, the rest of workflow_context and the history stay the
+        matched run's, which "reused" names.
+        """
+        self.run_id = uuid.uuid4().hex
+        results = prior["results"]
+        if isinstance(results.get("workflow_context"), dict):
+            results["workflow_context"]["task"] = task
+        results.update({
+            "task": task,
+            "run_id": self.run_id,
+            "reused": {
+                "mode": "result",
+                "run_id": prior["run_id"],
+                "task": prior["task"],
+                "similarity": prior["similarity"],
+                "outputs": "steps, workflow_context and history are the reused run's outputs"
+            },
+            "metrics": {
+                "wall_seconds": round(time.monotonic() - started, 3),
+                "totals": summarize_calls([]),
+                "by_step": {},
+                "schedule": None
+            }
+        })
+        results.pop("budget", None)
+        return results
+    
+    def _seed_from_prior_run(self, prior: Dict[str, Any]):
+        """
+        Take the TASK_REUSE_SEED_STEPS results of a near-duplicate run as this run's
+        
+        Seeded steps are marked completed, so the step graph skips them like
+        steps restored from a checkpoint and later steps build on their output.
+        """
+        prior_steps = prior["results"].get("steps") or {}
+        for key in (key.strip() for key in Config.TASK_REUSE_SEED_STEPS.split(",")):
+            result = prior_steps.get(key)
+            if key not in self.SEEDABLE_STEPS or not isinstance(result, dict):
+                continue
+            step_name, context_key = self.SEEDABLE_STEPS[key]
+            self.workflow_context[context_key] = result.get("result")
+            self._add_to_history(step_name, result)
+            self._step_results[key] = result
+            self._seeded_steps.append(key)
+        logger.info(f"Seeded {', '.join(self._seeded_steps) or 'no steps'} from run {prior['run_id']}")
+    
+    def _index_run(self, results: Dict[str, Any], initial_context: Optional[Dict[str, Any]]):
+        """Add a completed run to the task index so later near-duplicates can reuse it"""
+        index = get_task_index()
+        if index is None or results.get("status") != "completed":
+            return
+        try:
+            with span("index_run", "index"):
+                index.add(self.run_id, results["task"], results, context=initial_context)
+        except Exception as e:
+            logger.warning(f"Failed to index run {self.run_id}: {str(e)}")
+    
+    async def _run_steps(self, task: str, initial_context: Optional[Dict[str, Any]], native_async: bool,
+                         on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                         resume_state: Optional[Dict[str, Any]] = None,
+                         prior: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Execute the step sequence and compile the results (see _run_workflow)"""
+        self._native_async = native_async
+        self._on_event = on_event
+        self._checkpoint_lock = asyncio.Lock()  # created per run: the lock binds to the running loop
+        self._step_metrics = {}
+        self._schedule = None
+        self._seeded_steps = []
+        
+        if resume_state:
+            # Restore the run as of its last checkpoint; completed steps are skipped
+            self.run_id = resume_state["run_id"]
+            self.workflow_context = resume_state["workflow_context"]
+            self.workflow_history = resume_state["workflow_history"]
+            self._step_results = resume_state["step_results"]
+        else:
+            logger.info(f"Starting workflow execution for task: {task}")
             
-            # Create summary
-            summary = self.communication_agent.create_summary(self.workflow_context)
+            # Initialize workflow context
+            self.run_id = uuid.uuid4().hex
+            self.workflow_context = {
+                "run_id": self.run_id,
+                "task": task,
+                "initial_context": initial_context or {},
+                "step": 0,
+                "iteration": 0
+            }
+            self.workflow_history = []
+            self._step_results = {}
+            if prior is not None:
+                self._seed_from_prior_run(prior)
+        
+        # Filled in as steps finish (or at the end) and used as the summary input
+        self.digest = WorkflowDigest(task)
+        
+        try:
+            # Run the step graph; independent steps (e.g. the summary and the re-review) overlap
+            run = await DagScheduler(self.build_graph(), initial_artifacts=("task", "initial_context")).run()
+            steps = run["results"]
+            self._schedule = run["schedule"]
+            logger.info(
+                f"Workflow critical path {' -> '.join(self._schedule['critical_path'])}: "
+                f"{self._schedule['critical_path_seconds']}s of {self._schedule['sum_seconds']}s step time"
+            )
             
             # Compile final results
             results = {
                 "task": task,
+                "run_id": self.run_id,
                 "status": "completed",
-                "summary": summary,
-                "steps": {
-                    "step1_plan": step1_result,
-                    "step2_research": step2_result,
-                    "step3_execution": step3_result,
-                    "step4_review": step4_result,
-                    "step5_refinement": step5_result
-                },
+                "summary": steps.get("summary"),
+                "steps": {name: result for name, result in steps.items() if name not in ("final_review", "summary")},
                 "workflow_context": self.workflow_context,
                 "history": self.workflow_history
             }
             
+            await self._finish_checkpoint()
             logger.info("Workflow execution completed successfully")
             return results
-            
+        
+        except WorkflowCancelled as e:
+            logger.info(f"Workflow {self.run_id} cancelled")
+            await self._save_checkpoint(status="cancelled", error=str(e))
+            return {
+                "task": task,
+                "run_id": self.run_id,
+                "status": "cancelled",
+                "error": str(e),
+                "resumable": self.checkpoint_store is not None,
+                "workflow_context": self.workflow_context,
+                "history": self.workflow_history
+            }
+        
         except Exception as e:
             logger.error(f"Workflow execution failed: {str(e)}", exc_info=True)
+            await self._save_checkpoint(status="failed", error=str(e))
             return {
                 "task": task,
+                "run_id": self.run_id,
                 "status": "failed",
                 "error": str(e),
+                "resumable": self.checkpoint_store is not None,
                 "workflow_context": self.workflow_context,
                 "history": self.workflow_history
             }
     
-    def _step1_plan(self) -> Dict[str, Any]:
+    def build_graph(self) -> List[DagNode]:
+        """
+        Declare the workflow as a graph of steps with their inputs and outputs
+        
+        Artifacts are workflow_context keys. Refinement and the re-review only
+        run when the review found issues, and the summary needs the refinement
+        but not the re-review, so the two run side by side. Override to build
+        a custom pipeline; node results are returned under "steps" by node
+        name, except "summary" which becomes the results' summary.
+        
+        Returns:
+            Graph nodes for DagScheduler
+        """
+        return [
+            DagNode(
+                "step1_plan",
+                lambda: self._checkpointed("step1_plan", "Step 1", "plan", self._step1_plan),
+                inputs=("task", "initial_context"), outputs=("plan",)
+            ),
+            DagNode(
+                "step2_research",
+                lambda: self._checkpointed("step2_research", "Step 2", "research", self._step2_gather),
+                inputs=("task", "plan"), outputs=("research",)
+            ),
+            DagNode(
+                "step3_execution",
+                lambda: self._checkpointed("step3_execution", "Step 3", "deliverables", self._step3_execute),
+                inputs=("task", "plan", "research"), outputs=("deliverables",)
+            ),
+            DagNode(
+                "step4_review",
+                lambda: self._checkpointed("step4_review", "Step 4", "review", self._step4_review),
+                inputs=("task", "plan", "deliverables"), outputs=("review",)
+            ),
+            DagNode(
+                "step5_refinement",
+                lambda: self._checkpointed("step5_refinement", "Step 5", "refined_deliverables", self._step5_refine),
+                inputs=("task", "deliverables", "review"), outputs=("refined_deliverables",),
+                condition=lambda: (
+                    self._check_for_issues(self._step_results["step4_review"])
+                    and self._budget_allows("step5_refinement")
+                ),
+                skip=lambda: self._checkpointed("step5_refinement", "Step 5", None, self._skip_refinement)
+            ),
+            DagNode(
+                "final_review",
+                lambda: self._checkpointed("final_review", "Final Review", None, self._step4_review, "Final Review"),
+                inputs=("task", "plan", "refined_deliverables"), outputs=("final_review",),
+                condition=lambda: (
+                    bool(self.workflow_context.get("refined_deliverables"))
+                    and self._budget_allows("final_review")
+                )
+            ),
+            DagNode(
+                "summary",
+                self._summarize,
+                inputs=("plan", "research", "deliverables", "review", "refined_deliverables"), outputs=("summary",)
+            )
+        ]
+    
+    async def _summarize(self) -> str:
+        """
+        Create the summary from the compact digest rather than the full context
+        
+        When the run budget cannot afford another call, or runs out while the
+        summary is being written, the digest itself is returned as a degraded
+        summary, so the completed steps are kept.
+        """
+        self._check_cancelled()
+        with span("summary", "step", label="Summary") as step_span:
+            if not Config.SUMMARY_DIGEST_INCREMENTAL:
+                self.digest = WorkflowDigest.from_steps(self.workflow_context["task"], self._step_results)
+            if not self._budget_allows("summary", degrade=True):
+                step_span.set(degraded=True)
+                return f"Summary shortened to fit the run budget.\n\n{self.digest.render()}"
+            try:
+                return await self._run_step("Summary", self.communication_agent, "create_summary", self.digest)
+            except BudgetExhaustedError as e:
+                logger.warning(f"Run budget ran out during the summary ({str(e)}); degrading it")
+                if self.budget is not None:
+                    self.budget.record_degraded("summary", str(e))
+                step_span.set(degraded=True)
+                return f"Summary shortened to fit the run budget.\n\n{self.digest.render()}"
+    
+    def _budget_allows(self, step: str, degrade: bool = False) -> bool:
+        """
+        Check whether the run budget can afford an optional step
+        
+        The step is expected to cost what an average completed step did.
+        When it does not fit, the skip (or degradation) is recorded.
+        
+        Args:
+            step: Step key
+            degrade: Record the step as degraded rather than skipped
+        """
+        if self.budget is None:
+            return True
+        
+        finished = [metrics for metrics in self._step_metrics.values() if metrics["calls"]]
+        expected_seconds = sum(m["wall_seconds"] for m in finished) / len(finished) if finished else 0.0
+        expected_tokens = sum(m["prompt_tokens"] + m["completion_tokens"] for m in finished) // max(1, len(finished))
+        
+        reason = self.budget.shortfall(expected_seconds, expected_tokens)
+        if reason is None:
+            return True
+        logger.warning(f"Run budget too low for {step} ({reason}); {'degrading' if degrade else 'skipping'} it")
+        if degrade:
+            self.budget.record_degraded(step, reason)
+        else:
+            self.budget.record_skip(step, reason)
+        return False
+    
+    async def _checkpointed(self, key: str, step_name: str, context_key: Optional[str],
+                            step_fn: Callable[..., Any], *args: Any) -> Dict[str, Any]:
+        """
+        Run a step unless a resumed checkpoint or a seeding run already holds its result
+        
+        Args:
+            key: Step key under which the result is checkpointed
+            step_name: History label for the step
+            context_key: workflow_context key receiving the step's result, if any
+            step_fn: Coroutine function executing the step
+            
+        Returns:
+            The step result
+        """
+        self._check_cancelled()
+        with span(key, "step", label=step_name) as step_span:
+            if key in self._step_results:
+                logger.info(f"{step_name}: already completed, reusing its result")
+                step_span.set(reused=True)
+                result = self._step_results[key]
+                self._add_to_digest(key, result)
+                return result
+            
+            logger.info(f"{step_name}: {self.STEP_TITLES.get(key, 'running')}")
+            result = await step_fn(*args)
+            if context_key:
+                self.workflow_context[context_key] = result["result"]
+            self._add_to_history(step_name, result)
+            self._add_to_digest(key, result)
+            
+            self._step_results[key] = result
+            await self._save_checkpoint()
+            return result
+    
+    def _add_to_digest(self, key: str, result: Dict[str, Any]):
+        """Condense a finished step into the summary digest, when building it incrementally"""
+        if Config.SUMMARY_DIGEST_INCREMENTAL and self.digest is not None:
+            self.digest.add_step(key, result)
+    
+    async def _save_checkpoint(self, status: str = "running", error: Optional[str] = None):
+        """
+        Persist the run state so it can be resumed
+        
+        The file is written on a worker thread so the event loop keeps
+        running; saves are serialized so a later state is never overwritten
+        by an earlier one.
+        """
+        if self.checkpoint_store is None:
+            return
+        # Snapshot on the loop; steps finishing meanwhile must not change what is written
+        state = {
+            "task": self.workflow_context.get("task"),
+            "status": status,
+            "error": error,
+            "completed_steps": list(self._step_results),
+            "step_results": dict(self._step_results),
+            "workflow_context": dict(self.workflow_context),
+            "workflow_history": list(self.workflow_history)
+        }
+        try:
+            async with self._checkpoint_lock:
+                with span("save_checkpoint", "checkpoint", status=status):
+                    await asyncio.to_thread(self.checkpoint_store.save, self.run_id, state)
+        except Exception as e:
+            logger.warning(f"Failed to save checkpoint for run {self.run_id}: {str(e)}")
+    
+    async def _finish_checkpoint(self):
+        """Drop or mark the checkpoint of a completed run"""
+        if self.checkpoint_store is None:
+            return
+        if Config.CHECKPOINT_KEEP_COMPLETED:
+            await self._save_checkpoint(status="completed")
+        else:
+            async with self._checkpoint_lock:
+                await asyncio.to_thread(self.checkpoint_store.delete, self.run_id)
+    
+    async def _step1_plan(self) -> Dict[str, Any]:
         """Execute Step 1: Plan and Define Objectives"""
         task = self.workflow_context["task"]
         context = self.workflow_context.get("initial_context", {})
         
-        return self.planning_agent.process(task, context)
+        return await self._run_step("Step 1", self.planning_agent, "process", task, context)
     
-    def _step2_gather(self) -> Dict[str, Any]:
+    async def _step2_gather(self) -> Dict[str, Any]:
         """Execute Step 2: Gather and Analyze Information"""
         task = self.workflow_context["task"]
         context = {
@@ -144,16 +664,9 @@ class WorkflowOrchestrator:
             "task": task
         }
         
-        # Extract information needs from plan
-        plan_result = self.workflow_context.get("plan", {})
-        if isinstance(plan_result, dict) and "plan" in plan_result:
-            context["information_needs"] = plan_result.get("plan", "")
-        else:
-            context["information_needs"] = str(plan_result)
-        
-        return self.research_agent.process(task, context)
+        return await self._run_step("Step 2", self.research_agent, "process", task, context)
     
-    def _step3_execute(self) -> Dict[str, Any]:
+    async def _step3_execute(self) -> Dict[str, Any]:
         """Execute Step 3: Execute the Task"""
         task = self.workflow_context["task"]
         context = {
@@ -161,9 +674,9 @@ class WorkflowOrchestrator:
             "research": self.workflow_context.get("research", {})
         }
         
-        return self.execution_agent.process(task, context)
+        return await self._run_step("Step 3", self.execution_agent, "process", task, context)
     
-    def _step4_review(self) -> Dict[str, Any]:
+    async def _step4_review(self, step_name: str = "Step 4") -> Dict[str, Any]:
         """Execute Step 4: Review and Validate"""
         task = self.workflow_context["task"]
         context = {
@@ -176,16 +689,17 @@ class WorkflowOrchestrator:
         if context.get("refined_deliverables"):
             context["deliverables"] = context["refined_deliverables"]
         
-        # Extract success criteria from plan
-        plan_result = self.workflow_context.get("plan", {})
-        if isinstance(plan_result, dict):
-            context["success_criteria"] = plan_result.get("plan", "")
-        else:
-            context["success_criteria"] = str(plan_result)
-        
-        return self.qa_agent.process(task, context)
+        # The QA agent extracts the success criteria from the plan itself
+        return await self._run_step(step_name, self.qa_agent, "process", task, context)
+    
+    async def _skip_refinement(self) -> Dict[str, Any]:
+        """Step 5 result when the review found nothing to refine or the budget ran low"""
+        if self.budget is not None and any(skip["step"] == "step5_refinement" for skip in self.budget.skipped):
+            return {"result": "Refinement skipped: run budget exhausted", "status": "skipped"}
+        logger.info("No issues found, proceeding to completion")
+        return {"result": "No refinement needed", "status": "complete"}
     
-    def _step5_refine(self) -> Dict[str, Any]:
+    async def _step5_refine(self) -> Dict[str, Any]:
         """Execute Step 5: Refine and Complete"""
         task = self.workflow_context["task"]
         context = {
@@ -193,19 +707,71 @@ class WorkflowOrchestrator:
             "review": self.workflow_context.get("review", {})
         }
         
-        # Extract issues from review
-        review_result = self.workflow_context.get("review", {})
-        if isinstance(review_result, dict) and "review" in review_result:
-            context["issues"] = review_result.get("review", "")
-        else:
-            context["issues"] = str(review_result)
+        # The refinement agent extracts the issues from the review itself
+        return await self._run_step("Step 5", self.refinement_agent, "process", task, context)
+    
+    async def _run_step(self, step_name: str, agent: Any, method: str, *args: Any) -> Any:
+        """Run one agent call, emitting step events and streaming tokens when observed"""
+        self._emit("step_start", step=step_name, agent=agent.name)
+        
+        on_token = None
+        if self._on_event is not None:
+            on_token = lambda text: self._emit("token", step=step_name, text=text)
         
-        return self.refinement_agent.process(task, context)
+        with collect_calls() as calls:
+            result = await self._call_agent(agent, method, *args, on_token)
+        self._step_metrics[step_name] = summarize_calls(calls)
+        self._emit("step_complete", step=step_name, agent=agent.name)
+        return result
+    
+    def _emit(self, event: str, **data: Any):
+        """
+        Deliver a workflow event to the on_event callback, if any
+        
+        Raises WorkflowCancelled once the run is cancelled, which aborts a
+        streamed call at its next token.
+        """
+        if self._on_event is None:
+            return
+        self._check_cancelled()
+        try:
+            self._on_event(event, data)
+        except Exception as e:
+            logger.warning(f"Workflow event callback failed for {event}: {str(e)}")
+    
+    async def _call_agent(self, agent: Any, method: str, *args: Any) -> Any:
+        """
+        Invoke an agent method in the current execution mode
+        
+        Native async runs await the agent's ``a``-prefixed coroutine variant;
+        sync runs execute the blocking method on a worker thread.
+        """
+        if self._native_async:
+            return await getattr(agent, f"a{method}")(*args)
+        return await asyncio.to_thread(getattr(agent, method), *args)
     
     def _check_for_issues(self, review_result: Dict[str, Any]) -> bool:
-        """Check if review identified any issues"""
+        """
+        Check if the review found issues serious enough to refine
+        
+        Uses the QA verdict when present: refinement runs once the issues at
+        QA_REFINE_SEVERITY or worse reach QA_REFINE_MIN_ISSUES. Reviews
+        without a verdict fall back to scanning for issue keywords.
+        """
         result_content = review_result.get("result", {})
         
+        verdict = result_content.get("verdict") if isinstance(result_content, dict) else None
+        if verdict:
+            severities = QualityAssuranceAgent.SEVERITIES
+            threshold = Config.QA_REFINE_SEVERITY.lower()
+            gating = severities[:severities.index(threshold) + 1] if threshold in severities else severities
+            count = sum(verdict["issues"].get(severity, 0) for severity in gating)
+            logger.info(
+                f"QA verdict {verdict['issues']}: {count} issue(s) at {threshold} or worse "
+                f"(refine at {Config.QA_REFINE_MIN_ISSUES})"
+            )
+            return count >= Config.QA_REFINE_MIN_ISSUES
+        
         # Check for common issue indicators in the review
         review_text = str(result_content).lower()
         